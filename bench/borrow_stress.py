@@ -0,0 +1,155 @@
+"""Concurrent borrows of one popular title in lab01.
+
+Creates a book with ``--copies`` copies and ``--members`` members, then lets
+``-c`` virtual users borrow that book at the same time, again and again:
+every successful loan is kept for ``--hold`` seconds and returned, so copies
+keep circulating.
+Oversubscription is checked three ways: the loans granted to the clients and
+not yet returned never outnumber the copies, ``GET /api/books`` (polled
+during the test) never shows a negative availability, and all copies are
+available again at the end. Any failure makes the script exit with code 1.
+
+    python bench/borrow_stress.py --sqlite /tmp/lab01.sqlite3 --reset -c 50 -d 10
+    python bench/borrow_stress.py --url http://127.0.0.1:3000 -c 100 --copies 5
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from loadtest import http_client, in_process_client, percentile
+
+
+async def create_fixture(client, host, copies, members):
+    tag = uuid.uuid4().hex[:8]
+    response = await client.post(f"{host}/api/books", json={
+        "title": f"Stress test {tag}", "author": "Bench", "copies": copies,
+    })
+    response.raise_for_status()
+    book_id = response.json()["id"]
+
+    member_ids = []
+    for index in range(members):
+        response = await client.post(f"{host}/api/members", json={
+            "name": f"Stress {tag} {index}", "email": f"stress.{tag}.{index}@example.com",
+        })
+        response.raise_for_status()
+        member_ids.append(response.json()["id"])
+    return book_id, member_ids
+
+
+async def available_copies(client, host, book_id):
+    response = await client.get(f"{host}/api/books")
+    response.raise_for_status()
+    for book in response.json():
+        if book["id"] == book_id:
+            return book["available"]
+    raise RuntimeError(f"book {book_id} not in /api/books")
+
+
+async def borrower(client, host, book_id, member_id, hold, deadline, stats, latencies, open_loans):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        response = await client.post(f"{host}/api/loans/borrow", json={
+            "member_id": member_id, "book_id": book_id, "days": 7,
+        })
+        latencies.append(time.perf_counter() - started)
+        stats[f"borrow {response.status_code}"] += 1
+        if response.status_code != 201:
+            # Let the holders return their copies
+            await asyncio.sleep(0.001)
+            continue
+
+        # open_loans holds loans that are committed and not yet being returned,
+        # so it can never be larger than the number of copies
+        loan_id = response.json()["id"]
+        open_loans.add(loan_id)
+        stats["max open"] = max(stats["max open"], len(open_loans))
+        await asyncio.sleep(hold)
+        open_loans.discard(loan_id)
+        response = await client.post(f"{host}/api/loans/return", json={"loan_id": loan_id})
+        stats[f"return {response.status_code}"] += 1
+
+
+async def watcher(client, host, book_id, deadline, stats):
+    while time.monotonic() < deadline:
+        available = await available_copies(client, host, book_id)
+        stats["min available"] = min(stats.get("min available", available), available)
+        await asyncio.sleep(0.05)
+
+
+async def main_async(args):
+    host = args.url.rstrip("/") if args.url else "http://testserver"
+    client_cm = http_client(args.concurrency + 1) if args.url else in_process_client("lab01", args.reset)
+
+    async with client_cm as client:
+        book_id, member_ids = await create_fixture(client, host, args.copies, args.members)
+
+        stats = Counter()
+        latencies = []
+        open_loans = set()
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(
+            watcher(client, host, book_id, deadline, stats),
+            *(borrower(client, host, book_id, member_ids[index % len(member_ids)], args.hold, deadline,
+                       stats, latencies, open_loans)
+              for index in range(args.concurrency)),
+        )
+        elapsed = time.monotonic() - started
+        final_available = await available_copies(client, host, book_id)
+
+    latencies.sort()
+    borrowed = stats["borrow 201"]
+    print(f"book {book_id}: {args.copies} copies, {args.concurrency} concurrent borrowers, {elapsed:.1f} s")
+    print(f"borrow: {len(latencies)} requests, {len(latencies) / elapsed:.1f} req/s, "
+          f"p50 {percentile(latencies, 0.50) * 1000:.2f} ms, p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"loans granted: {borrowed} ({borrowed / elapsed:.1f}/s)")
+    print("statuses: " + " ".join(f"{key}x{count}" for key, count in sorted(stats.items())
+                                  if key.startswith(("borrow", "return"))))
+    print(f"max open loans seen by clients: {stats['max open']}, min available seen: {stats.get('min available')}, "
+          f"available at the end: {final_available}")
+
+    problems = []
+    if stats["max open"] > args.copies:
+        problems.append(f"{stats['max open']} loans open at once for {args.copies} copies")
+    if stats.get("min available", 0) < 0:
+        problems.append(f"available dropped to {stats['min available']}")
+    if final_available != args.copies:
+        problems.append(f"{final_available} copies available after all loans were returned, expected {args.copies}")
+    if any(key.startswith(("borrow 5", "return 5")) for key in stats):
+        problems.append("server errors")
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: no oversubscription")
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent borrows of one title in lab01")
+    parser.add_argument("-c", "--concurrency", type=int, default=50, help="concurrent borrowers (default 50)")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds (default 10)")
+    parser.add_argument("--copies", type=int, default=3, help="copies of the contended book (default 3)")
+    parser.add_argument("--hold", type=float, default=0.01, help="seconds a loan is kept before the return (default 0.01)")
+    parser.add_argument("--members", type=int, default=20, help="members created for the test (default 20)")
+    parser.add_argument("--url", help="test a running server instead of importing the app in-process")
+    parser.add_argument("--sqlite", metavar="PATH", help="in-process only: use the SQLite backend with this file")
+    parser.add_argument("--reset", action="store_true", help="in-process only: run reset_db.py before the test")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = os.path.abspath(args.sqlite)
+
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
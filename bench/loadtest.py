@@ -0,0 +1,365 @@
+"""Load test replaying a lab's tests.rest scenario at concurrency.
+
+Every virtual user runs the requests from ``labXX/tests.rest`` in file order,
+again and again, until the test duration is over. Named requests
+(``# @name create_task``) keep their responses per user, so chains such as
+create_task -> move or borrow -> return work exactly as in the REST Client.
+
+The app is either started in-process (default, through httpx's ASGI
+transport) or reached over HTTP with ``--url``.
+
+Examples (from the repository root):
+
+    python bench/loadtest.py lab05 --sqlite /tmp/lab05.sqlite3 --reset -c 20 -d 30
+    python bench/loadtest.py lab01 --url http://127.0.0.1:3000 -c 50 -d 60 -o run.json
+    python bench/loadtest.py lab01 --sqlite /tmp/lab01.sqlite3 --compare run.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import contextlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_VARIABLE = re.compile(r"{{\s*([^}]+?)\s*}}")
+_NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+@dataclass
+class RestRequest:
+    title: str
+    method: str
+    url: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: Optional[str] = None
+    name: Optional[str] = None
+
+
+def parse_rest_file(path):
+    """Parse the subset of the REST Client format used by the labs"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    variables = {}
+    requests = []
+    for index, block in enumerate(re.split(r"(?m)^###", text)):
+        lines = block.split("\n")
+        # Text after "###" is the request title; the part before the first "###" has none
+        title, lines = (lines[0].strip(), lines[1:]) if index else ("", lines)
+        name = None
+        request_line = None
+        headers = {}
+        body_lines = []
+        in_body = False
+
+        for line in lines:
+            stripped = line.strip()
+            if in_body:
+                body_lines.append(line)
+                continue
+            if request_line is None:
+                if stripped.startswith("@") and "=" in stripped:
+                    key, value = stripped[1:].split("=", 1)
+                    variables[key.strip()] = value.strip()
+                elif stripped.startswith("# @name"):
+                    name = stripped.split(None, 2)[2].strip()
+                elif stripped and not stripped.startswith("#"):
+                    request_line = stripped
+                continue
+            if not stripped:
+                in_body = True
+            elif ":" in stripped and not stripped.startswith("#"):
+                key, value = stripped.split(":", 1)
+                headers[key.strip()] = value.strip()
+
+        if request_line is None:
+            continue
+        method, url = request_line.split(None, 1)
+        body = "\n".join(body_lines).strip() or None
+        requests.append(RestRequest(title, method.upper(), url.strip(), headers, body, name))
+
+    return variables, requests
+
+
+def endpoint_key(method, url):
+    """Group URLs such as /api/tasks/17/move as /api/tasks/{id}/move"""
+    path = httpx.URL(url).path or "/"
+    return f"{method} {_NUMERIC_SEGMENT.sub('/{id}', path)}"
+
+
+class Session:
+    """One virtual user: variables plus the responses of its named requests"""
+
+    _unique = itertools.count(1)
+
+    def __init__(self, variables):
+        self.variables = variables
+        self.responses = {}
+
+    def render(self, text):
+        def replace(match):
+            expr = match.group(1)
+            if expr == "$timestamp":
+                # Unique per call so e.g. member e-mails do not collide between users
+                return f"{int(time.time())}{next(self._unique)}"
+            if ".response.body." in expr:
+                name, path = expr.split(".response.body.", 1)
+                value = self.responses.get(name)
+                for part in path.lstrip("$").strip(".").split("."):
+                    value = value.get(part) if isinstance(value, dict) else None
+                if value is None:
+                    raise LookupError(f"No value for {expr}")
+                return str(value)
+            if expr in self.variables:
+                return self.render(self.variables[expr])
+            raise LookupError(f"Unknown variable {expr}")
+        return _VARIABLE.sub(replace, text)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = False
+
+    def add(self, key, seconds, status):
+        if not self.recording:
+            return
+        self.latencies.setdefault(key, []).append(seconds)
+        counts = self.statuses.setdefault(key, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+        if status == "error" or (isinstance(status, int) and status >= 500):
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for key, values in sorted(recorder.latencies.items()):
+        values.sort()
+        endpoints[key] = {
+            "requests": len(values),
+            "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+            "statuses": recorder.statuses.get(key, {}),
+            "errors": recorder.errors.get(key, 0),
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "total_requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "errors": sum(recorder.errors.values()),
+        "endpoints": endpoints,
+    }
+
+
+async def run_scenario(client, variables, requests, recorder, deadline):
+    session = Session(variables)
+    while time.monotonic() < deadline:
+        for request in requests:
+            if time.monotonic() >= deadline:
+                return
+            try:
+                url = session.render(request.url)
+                headers = {k: session.render(v) for k, v in request.headers.items()}
+                body = session.render(request.body) if request.body else None
+            except LookupError:
+                # An earlier request of this iteration failed, skip dependent ones
+                continue
+
+            key = endpoint_key(request.method, url)
+            started = time.perf_counter()
+            try:
+                response = await client.request(request.method, url, headers=headers, content=body)
+                status = response.status_code
+            except httpx.HTTPError:
+                recorder.add(key, time.perf_counter() - started, "error")
+                continue
+            recorder.add(key, time.perf_counter() - started, status)
+
+            if request.name:
+                try:
+                    session.responses[request.name] = response.json()
+                except ValueError:
+                    session.responses[request.name] = None
+
+
+async def seed(client, variables, requests, iterations, concurrency):
+    """Grow the tables by replaying the scenario's write requests"""
+    counter = itertools.count()
+
+    async def worker():
+        while next(counter) < iterations:
+            await _one_write_pass(client, variables, requests)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def _one_write_pass(client, variables, requests):
+    session = Session(variables)
+    for request in requests:
+        if request.method == "GET":
+            continue
+        try:
+            url = session.render(request.url)
+            headers = {k: session.render(v) for k, v in request.headers.items()}
+            body = session.render(request.body) if request.body else None
+        except LookupError:
+            continue
+        response = await client.request(request.method, url, headers=headers, content=body)
+        if request.name:
+            try:
+                session.responses[request.name] = response.json()
+            except ValueError:
+                session.responses[request.name] = None
+
+
+@contextlib.asynccontextmanager
+async def in_process_client(lab, reset):
+    """Import labXX/main.py and talk to it through the ASGI transport"""
+    lab_dir = os.path.join(ROOT, lab)
+    os.chdir(lab_dir)  # the apps use paths relative to their directory
+    sys.path.insert(0, lab_dir)
+
+    if reset:
+        import reset_db
+        reset_db.reset_database()
+
+    import main
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, timeout=30.0) as client:
+            yield client
+
+
+@contextlib.asynccontextmanager
+async def http_client(concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        yield client
+
+
+def compare(current, baseline, threshold):
+    """Return regressions: p95 slower or throughput lower by more than ``threshold``"""
+    regressions = []
+    for key, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(key)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{key}: p95 {before['p95_ms']:.2f} ms -> {now['p95_ms']:.2f} ms")
+        if before["throughput_rps"] and now["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{key}: {before['throughput_rps']:.1f} -> {now['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def print_report(result):
+    print(f"\n{'endpoint':<42} {'req':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+    for key, e in result["endpoints"].items():
+        statuses = " ".join(f"{code}x{count}" for code, count in sorted(e["statuses"].items()))
+        print(f"{key:<42} {e['requests']:>7} {e['throughput_rps']:>9.1f} {e['p50_ms']:>9.2f} "
+              f"{e['p95_ms']:>9.2f} {e['p99_ms']:>9.2f}  {statuses}")
+    print(f"\nTotal: {result['total_requests']} requests, {result['throughput_rps']:.1f} req/s, "
+          f"{result['errors']} errors (5xx or transport)")
+
+
+async def main_async(args):
+    variables, requests = parse_rest_file(os.path.join(ROOT, args.lab, "tests.rest"))
+    if args.url:
+        variables["host"] = args.url.rstrip("/")
+        client_cm = http_client(args.concurrency)
+    else:
+        variables["host"] = "http://testserver"
+        client_cm = in_process_client(args.lab, args.reset)
+
+    async with client_cm as client:
+        if args.scale:
+            print(f"Seeding: {args.scale} write passes of the scenario...")
+            await seed(client, variables, requests, args.scale, args.concurrency)
+
+        recorder = Recorder()
+        if args.warmup:
+            await asyncio.gather(*(run_scenario(client, variables, requests, recorder, time.monotonic() + args.warmup)
+                                   for _ in range(args.concurrency)))
+
+        recorder.recording = True
+        started = time.monotonic()
+        await asyncio.gather(*(run_scenario(client, variables, requests, recorder, started + args.duration)
+                               for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - started
+
+    result = summarize(recorder, elapsed)
+    result["config"] = {
+        "lab": args.lab,
+        "target": args.url or "in-process",
+        "backend": os.getenv("DB_BACKEND", "mssql"),
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "scale": args.scale,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a lab's tests.rest scenario under load")
+    parser.add_argument("lab", help="lab directory, e.g. lab01")
+    parser.add_argument("-c", "--concurrency", type=int, default=10, help="virtual users (default 10)")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="measured seconds (default 10)")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before the run (default 2)")
+    parser.add_argument("--scale", type=int, default=0, help="write passes used to grow the data before the run")
+    parser.add_argument("--url", help="test a running server instead of importing the app in-process")
+    parser.add_argument("--sqlite", metavar="PATH", help="in-process only: use the SQLite backend with this file")
+    parser.add_argument("--reset", action="store_true", help="in-process only: run reset_db.py before the test")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with an earlier JSON result")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed regression, default 0.10 (10%%)")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = os.path.abspath(args.sqlite)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    result = asyncio.run(main_async(args))
+    print_report(result)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results saved to {output}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions above {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"\nNo regressions above {args.threshold:.0%} compared with {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Per-request cost of the security-headers/logging middleware.
+
+Compares three versions of a trivial FastAPI app:
+
+- ``bare``: no middleware,
+- ``http-middleware``: the two ``@app.middleware("http")`` layers the labs
+  used before (headers + two synchronous log calls per request),
+- ``asgi``: common.middleware.SecurityHeadersMiddleware with the queue-backed
+  log handler.
+
+Requests are fed straight into the ASGI app (no sockets, no HTTP client), so
+the difference between the rows is the middleware overhead itself. Logs are
+written to os.devnull.
+
+    python bench/middleware_overhead.py -n 20000
+"""
+import os
+import sys
+import time
+import queue
+import asyncio
+import logging
+import logging.handlers
+import argparse
+import statistics
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.middleware import SecurityHeadersMiddleware, LOG_FORMAT
+
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "Content-Security-Policy": "default-src 'self' 'unsafe-inline'",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+}
+
+
+def devnull_handler():
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def isolated_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return JSONResponse(content={"ok": True})
+
+    return app
+
+
+def bare_app():
+    return make_app()
+
+
+def http_middleware_app():
+    app = make_app()
+    logger = isolated_logger("bench.http", devnull_handler())
+
+    # Same code the labs had in main.py
+    @app.middleware("http")
+    async def add_security_headers(request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["Content-Security-Policy"] = "default-src 'self' 'unsafe-inline'"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        return response
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        logger.info(f"{request.method} {request.url.path}")
+        response = await call_next(request)
+        logger.info(f"Status: {response.status_code}")
+        return response
+
+    return app
+
+
+def asgi_app(sample_rate):
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, devnull_handler())
+    listener.start()
+    isolated_logger("access", logging.handlers.QueueHandler(records))
+
+    app = make_app()
+    app.add_middleware(SecurityHeadersMiddleware, headers=SECURITY_HEADERS, sample_rate=sample_rate)
+    return app
+
+
+async def drive(app, requests):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/ping", "raw_path": b"/api/ping",
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 3000),
+    }
+    never = asyncio.Event()
+
+    async def send(message):
+        pass
+
+    async def request():
+        delivered = False
+
+        async def receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # Like a server: nothing more until the client disconnects
+            await never.wait()
+
+        await app(dict(scope), receive, send)
+
+    # Build the middleware stack and warm up
+    for _ in range(200):
+        await request()
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await request()
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--requests", type=int, default=10000, help="requests per run")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="runs per variant, the median is reported")
+    parser.add_argument("--sample-rate", type=float, default=1.0, help="LOG_SAMPLE_RATE for the asgi variant")
+    args = parser.parse_args()
+
+    variants = [
+        ("bare", bare_app()),
+        ("http-middleware", http_middleware_app()),
+        ("asgi", asgi_app(args.sample_rate)),
+    ]
+
+    results = {}
+    for name, app in variants:
+        runs = [asyncio.run(drive(app, args.requests)) for _ in range(args.runs)]
+        results[name] = statistics.median(runs) * 1e6
+
+    print(f"{'variant':<18}{'us/request':>12}{'overhead us':>14}")
+    for name, _ in variants:
+        print(f"{name:<18}{results[name]:>12.1f}{results[name] - results['bare']:>14.1f}")
+    saved = results["http-middleware"] - results["asgi"]
+    print(f"\nsaved per request: {saved:.1f} us ({saved / results['http-middleware'] * 100:.0f}% of the old total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Flash sale in lab02: concurrent checkouts of a few products with limited stock.
+
+Creates ``--skus`` products with ``--stock`` units each, then lets ``-c``
+virtual shoppers buy them at the same time until everything is sold or the
+time is up. Every attempt uses a new session (cookie): add ``--lines``
+random hot products (1-``--max-qty`` units each) to the cart and check out.
+A checkout either succeeds (201) or is refused for lack of stock (409).
+Requests shed by the server (503) are retried after Retry-After; the
+checkout latency includes those waits.
+
+Overselling is checked at the end: for every product, the units in
+successful orders plus the stock left must equal the initial stock, and
+the stock never goes below zero. Any failure makes the script exit with
+code 1.
+
+    python bench/stock_stress.py --sqlite /tmp/lab02.sqlite3 --reset -c 200 --stock 500
+    python bench/stock_stress.py --url http://127.0.0.1:3000 -c 300 --skus 2
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import secrets
+import asyncio
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from loadtest import http_client, in_process_client, percentile
+
+
+async def create_products(client, host, skus, stock):
+    tag = uuid.uuid4().hex[:8]
+    product_ids = []
+    for index in range(skus):
+        response = await client.post(f"{host}/api/products", json={
+            "name": f"Flash sale {tag} {index}", "price": 9.99, "stock": stock,
+        })
+        response.raise_for_status()
+        product_ids.append(response.json()["id"])
+    return product_ids
+
+
+async def stock_left(client, host, product_ids):
+    wanted = set(product_ids)
+    stock = {}
+    cursor = None
+    while wanted - stock.keys():
+        params = {"limit": 500, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(f"{host}/api/products", params=params)
+        response.raise_for_status()
+        page = response.json()
+        stock.update({item["id"]: item["stock"] for item in page["items"] if item["id"] in wanted})
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    return stock
+
+
+async def post(client, url, headers, stats, **kwargs):
+    """POST, retried after Retry-After while the server sheds load with 503"""
+    while True:
+        response = await client.post(url, headers=headers, **kwargs)
+        if response.status_code != 503:
+            return response
+        stats["shed 503"] += 1
+        retry_after = float(response.headers.get("Retry-After", 1))
+        await asyncio.sleep(retry_after * random.uniform(0.5, 1.0))
+
+
+async def shopper(client, host, product_ids, args, deadline, stats, latencies, sold, sold_out):
+    while time.monotonic() < deadline and not sold_out.is_set():
+        # A new session per attempt, so a refused cart does not carry over
+        headers = {"Cookie": f"session_id={secrets.token_urlsafe(24)}"}
+        lines = {}
+        for product_id in random.sample(product_ids, min(args.lines, len(product_ids))):
+            qty = random.randint(1, args.max_qty)
+            response = await post(client, f"{host}/api/cart/add", headers, stats,
+                                  json={"product_id": product_id, "qty": qty})
+            response.raise_for_status()
+            lines[product_id] = qty
+
+        started = time.perf_counter()
+        response = await post(client, f"{host}/api/checkout", headers, stats)
+        latencies.append(time.perf_counter() - started)
+        stats[f"checkout {response.status_code}"] += 1
+        if response.status_code == 201:
+            sold.update(lines)
+        elif response.status_code == 409:
+            stats["refused"] += 1
+            if stats["refused"] >= args.stop_after_refused:
+                sold_out.set()
+
+
+async def main_async(args):
+    host = args.url.rstrip("/") if args.url else "http://testserver"
+    client_cm = http_client(args.concurrency + 1) if args.url else in_process_client("lab02", args.reset)
+
+    async with client_cm as client:
+        product_ids = await create_products(client, host, args.skus, args.stock)
+
+        stats = Counter()
+        sold = Counter()
+        latencies = []
+        sold_out = asyncio.Event()
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            shopper(client, host, product_ids, args, deadline, stats, latencies, sold, sold_out)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.monotonic() - started
+        left = await stock_left(client, host, product_ids)
+
+    latencies.sort()
+    orders = stats["checkout 201"]
+    print(f"{args.skus} products x {args.stock} units, {args.concurrency} concurrent shoppers, {elapsed:.1f} s")
+    print(f"checkout: {len(latencies)} requests, {len(latencies) / elapsed:.1f} req/s, "
+          f"p50 {percentile(latencies, 0.50) * 1000:.2f} ms, p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"orders: {orders} ({orders / elapsed:.1f}/s), units sold: {sum(sold.values())} of {args.skus * args.stock}")
+    print("statuses: " + " ".join(f"{key}x{count}" for key, count in sorted(stats.items())
+                                  if key.startswith(("checkout", "shed"))))
+
+    problems = []
+    for product_id in product_ids:
+        remaining = left.get(product_id)
+        print(f"product {product_id}: sold {sold[product_id]}, stock left {remaining}")
+        if remaining is None:
+            problems.append(f"product {product_id} not in /api/products")
+        elif remaining < 0:
+            problems.append(f"product {product_id}: stock went negative ({remaining})")
+        elif sold[product_id] + remaining != args.stock:
+            problems.append(f"product {product_id}: sold {sold[product_id]} + left {remaining} != stock {args.stock}")
+    if any(key.startswith("checkout 5") for key in stats):
+        problems.append("server errors")
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: no overselling")
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent checkouts of products with limited stock in lab02")
+    parser.add_argument("-c", "--concurrency", type=int, default=100, help="concurrent shoppers (default 100)")
+    parser.add_argument("-d", "--duration", type=float, default=30.0, help="maximum seconds (default 30)")
+    parser.add_argument("--skus", type=int, default=3, help="hot products (default 3)")
+    parser.add_argument("--stock", type=int, default=300, help="initial stock of each product (default 300)")
+    parser.add_argument("--lines", type=int, default=2, help="products per order (default 2)")
+    parser.add_argument("--max-qty", type=int, default=3, help="maximum units of a product per order (default 3)")
+    parser.add_argument("--stop-after-refused", type=int, default=200,
+                        help="stop after this many refused checkouts, i.e. once sold out (default 200)")
+    parser.add_argument("--url", help="test a running server instead of importing the app in-process")
+    parser.add_argument("--sqlite", metavar="PATH", help="in-process only: use the SQLite backend with this file")
+    parser.add_argument("--reset", action="store_true", help="in-process only: run reset_db.py before the test")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["DB_SQLITE_PATH"] = os.path.abspath(args.sqlite)
+
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
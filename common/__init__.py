@@ -0,0 +1 @@
+"""Helpers shared by the lab01-lab06 FastAPI applications."""
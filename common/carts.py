@@ -0,0 +1,539 @@
+"""Shopping carts, one per session, behind a pluggable backend.
+
+A CartBackend maps a session id to a cart of ``product_id -> qty``. Two
+backends are available, chosen with CART_BACKEND (see backend_from_env()):
+
+- ``memory`` (MemoryCartBackend): carts in the process, the fastest, but
+  lost on restart and not shared between uvicorn workers,
+- ``sqlite`` (SqliteCartBackend): carts in a SQLite file in WAL mode,
+  durable and shared by all worker processes on the machine.
+
+Besides the one-line changes (add / set / remove), ``replace()`` swaps the
+whole cart and ``apply()`` runs a list of changes; both are atomic.
+
+MemoryCartBackend stores a cart as two ``array('i')`` (product ids and
+quantities) instead of a dict of int objects, about 8 bytes per line plus a
+small fixed overhead. Looking a product up in a cart is a linear scan of
+its ids (``array.index``), O(lines); a cart has at most ``max_lines`` lines
+(100 by default), so the scan stays short. A per-cart dict would make it
+O(1) but cost more memory than the arrays themselves.
+
+Memory is bounded two ways:
+
+- a cart not touched for ``ttl`` seconds expires,
+- when the estimated size of all carts exceeds ``max_bytes`` the least
+  recently used carts are evicted.
+
+Carts sit in an OrderedDict in order of last use. Every access moves the
+cart to the end and extends its expiry by the same ``ttl``, so the order of
+use is also the order of expiry: expired and evicted carts are always taken
+from the front. Finding, expiring and evicting carts is O(1) (amortized);
+work inside one cart (lookup, copy) is proportional to its lines.
+
+SqliteCartBackend: see the class docstring.
+"""
+import os
+import sys
+import time
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Session key + entry object + OrderedDict slot, roughly
+_ENTRY_OVERHEAD = 200
+
+
+class CartLimitError(ValueError):
+    """The change would make the cart larger than the store allows"""
+
+
+class CartItemMissing(LookupError):
+    """The change refers to a product that is not in the cart"""
+
+
+class CartBackend:
+    """Interface of the cart stores; every method is safe to call from any thread"""
+
+    def __init__(self, ttl=86400.0, max_lines=100, max_qty=10000):
+        self.ttl = ttl
+        self.max_lines = max_lines
+        self.max_qty = max_qty
+
+    def get(self, session_id):
+        """Snapshot of the cart as a dict ``product_id -> qty`` (empty if there is none)"""
+        raise NotImplementedError
+
+    def add(self, session_id, product_id, qty):
+        """Add ``qty`` of a product; returns the new quantity in the cart"""
+        raise NotImplementedError
+
+    def set(self, session_id, product_id, qty):
+        """Set the quantity of a product already in the cart; False if it is not there"""
+        raise NotImplementedError
+
+    def remove(self, session_id, product_id):
+        """Remove a product from the cart; False if it is not there"""
+        raise NotImplementedError
+
+    def replace(self, session_id, items):
+        """Replace the whole cart with ``items`` (``product_id -> qty``); returns the new cart"""
+        items = dict(items)
+        self._check_cart(items)
+        if not items:
+            self.clear(session_id)
+            return {}
+        return self._modify(session_id, lambda cart: items)
+
+    def apply(self, session_id, ops):
+        """Apply ``ops`` of ``(action, product_id, qty)``, action add / set / remove, all or none.
+
+        Returns the new cart. Set and remove of a product that is not in the
+        cart raise CartItemMissing and a cart over the limits CartLimitError;
+        either way the cart is left as it was.
+        """
+        def change(cart):
+            for action, product_id, qty in ops:
+                if action == "add":
+                    cart[product_id] = cart.get(product_id, 0) + qty
+                elif product_id not in cart:
+                    raise CartItemMissing(f"Product not in cart: {product_id}")
+                elif action == "set":
+                    cart[product_id] = qty
+                else:
+                    del cart[product_id]
+            self._check_cart(cart)
+            return cart
+        return self._modify(session_id, change)
+
+    def clear(self, session_id):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _modify(self, session_id, change):
+        """Atomically replace the cart with ``change(cart_dict)``; returns the new cart"""
+        raise NotImplementedError
+
+    def _check_cart(self, cart):
+        if len(cart) > self.max_lines:
+            raise CartLimitError(f"Cart can hold at most {self.max_lines} products")
+        for qty in cart.values():
+            self._check_qty(qty)
+
+    def _check_qty(self, qty):
+        if qty > self.max_qty:
+            raise CartLimitError(f"Quantity must be at most {self.max_qty}")
+
+    def _check_lines(self, lines):
+        if lines >= self.max_lines:
+            raise CartLimitError(f"Cart can hold at most {self.max_lines} products")
+
+
+def backend_from_env():
+    """Cart backend selected by CART_BACKEND (memory / sqlite) and the CART_* variables"""
+    limits = dict(
+        ttl=float(os.getenv('CART_TTL', 86400)),
+        max_lines=int(os.getenv('CART_MAX_LINES', 100)),
+        max_qty=int(os.getenv('CART_MAX_QTY', 10000)),
+    )
+    backend = os.getenv('CART_BACKEND', 'memory').lower()
+    if backend == 'sqlite':
+        return SqliteCartBackend(os.getenv('CART_SQLITE_PATH', 'carts.sqlite3'), **limits)
+    if backend != 'memory':
+        raise ValueError(f"Unknown CART_BACKEND: {backend}")
+    return MemoryCartBackend(max_bytes=int(os.getenv('CART_MAX_BYTES', 64 * 1024 * 1024)), **limits)
+
+
+class _Cart:
+    __slots__ = ("ids", "qtys", "expires", "size")
+
+    def __init__(self):
+        self.ids = array("i")
+        self.qtys = array("i")
+        self.expires = 0.0
+        self.size = 0
+
+    def measure(self, session_id):
+        self.size = _ENTRY_OVERHEAD + sys.getsizeof(session_id) + sys.getsizeof(self.ids) + sys.getsizeof(self.qtys)
+        return self.size
+
+    def find(self, product_id):
+        # Linear scan, bounded by max_lines
+        try:
+            return self.ids.index(product_id)
+        except ValueError:
+            return -1
+
+
+class MemoryCartBackend(CartBackend):
+    def __init__(self, ttl=86400.0, max_bytes=64 * 1024 * 1024, max_lines=100, max_qty=10000):
+        super().__init__(ttl, max_lines, max_qty)
+        self.max_bytes = max_bytes
+
+        self._carts = OrderedDict()  # session id -> _Cart, least recently used first
+        self._bytes = 0
+        self._lines = 0
+        self._expired = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            cart = self._touch(session_id)
+            if cart is None:
+                return {}
+            return dict(zip(cart.ids, cart.qtys))
+
+    def add(self, session_id, product_id, qty):
+        with self._lock:
+            # Checked before the cart is created, so a refused add leaves no empty cart
+            cart = self._peek(session_id)
+            index = cart.find(product_id) if cart is not None else -1
+            if index < 0:
+                self._check_lines(len(cart.ids) if cart is not None else 0)
+                new_qty = qty
+            else:
+                new_qty = cart.qtys[index] + qty
+            self._check_qty(new_qty)
+
+            cart = self._touch(session_id, create=True)
+            if index < 0:
+                cart.ids.append(product_id)
+                cart.qtys.append(qty)
+                self._lines += 1
+            else:
+                cart.qtys[index] = new_qty
+            self._resized(session_id, cart)
+            return new_qty
+
+    def set(self, session_id, product_id, qty):
+        self._check_qty(qty)
+        with self._lock:
+            cart = self._touch(session_id)
+            index = cart.find(product_id) if cart is not None else -1
+            if index < 0:
+                return False
+            cart.qtys[index] = qty
+            return True
+
+    def remove(self, session_id, product_id):
+        with self._lock:
+            cart = self._touch(session_id)
+            index = cart.find(product_id) if cart is not None else -1
+            if index < 0:
+                return False
+            del cart.ids[index]
+            del cart.qtys[index]
+            self._lines -= 1
+            self._resized(session_id, cart)
+            return True
+
+    def clear(self, session_id):
+        with self._lock:
+            cart = self._carts.pop(session_id, None)
+            if cart is not None:
+                self._forget(cart)
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "carts": len(self._carts),
+                "lines": self._lines,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "expired": self._expired,
+                "evicted": self._evicted,
+            }
+
+    def _modify(self, session_id, change):
+        with self._lock:
+            cart = self._peek(session_id)
+            items = change(dict(zip(cart.ids, cart.qtys)) if cart is not None else {})
+            # Only a change that went through creates or refreshes the cart
+            cart = self._touch(session_id, create=True)
+            self._lines += len(items) - len(cart.ids)
+            cart.ids = array("i", items.keys())
+            cart.qtys = array("i", items.values())
+            self._resized(session_id, cart)
+            return items
+
+    def _peek(self, session_id):
+        """The live cart of ``session_id`` or None, without refreshing its expiry"""
+        self._expire(time.monotonic())
+        return self._carts.get(session_id)
+
+    def _touch(self, session_id, create=False):
+        now = time.monotonic()
+        self._expire(now)
+        cart = self._carts.get(session_id)
+        if cart is None:
+            if not create:
+                return None
+            cart = self._carts[session_id] = _Cart()
+            self._bytes += cart.measure(session_id)
+        else:
+            self._carts.move_to_end(session_id)
+        cart.expires = now + self.ttl
+        return cart
+
+    def _resized(self, session_id, cart):
+        old_size = cart.size
+        self._bytes += cart.measure(session_id) - old_size
+        # Never evict the cart that is being changed
+        while self._bytes > self.max_bytes and len(self._carts) > 1:
+            _, oldest = self._carts.popitem(last=False)
+            self._forget(oldest)
+            self._evicted += 1
+
+    def _expire(self, now):
+        while self._carts:
+            session_id, oldest = next(iter(self._carts.items()))
+            if oldest.expires > now:
+                break
+            del self._carts[session_id]
+            self._forget(oldest)
+            self._expired += 1
+
+    def _forget(self, cart):
+        self._bytes -= cart.size
+        self._lines -= len(cart.ids)
+
+
+_CART_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Carts (
+    SessionId TEXT PRIMARY KEY,
+    Expires   REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS IX_Carts_Expires ON Carts (Expires);
+CREATE TABLE IF NOT EXISTS CartItems (
+    SessionId TEXT NOT NULL REFERENCES Carts (SessionId) ON DELETE CASCADE,
+    ProductId INTEGER NOT NULL,
+    Qty       INTEGER NOT NULL,
+    PRIMARY KEY (SessionId, ProductId)
+) WITHOUT ROWID;
+"""
+
+# Expired carts deleted per write transaction
+_PURGE_BATCH = 100
+
+
+class _Write:
+    __slots__ = ("apply", "done", "result", "error")
+
+    def __init__(self, apply):
+        self.apply = apply
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class SqliteCartBackend(CartBackend):
+    """Carts in a SQLite database file shared by all worker processes.
+
+    The file is in WAL mode: readers never wait for the writer, and each
+    process sees every committed change, so all workers see the same cart.
+    Expiry times are wall-clock (time.time()) because they are compared
+    across processes.
+
+    A cart is read with one query on the (SessionId, ProductId) primary key.
+    Writes are coalesced: a thread queues its change and the thread holding
+    the write lock applies every queued change in one transaction (group
+    commit), so many concurrent "add to cart" calls cost one commit.
+    Reading a cart extends its expiry only when a tenth of the TTL has
+    passed since the last extension, so reads rarely write.
+    """
+
+    def __init__(self, path, ttl=86400.0, max_lines=100, max_qty=10000, timeout=30.0):
+        super().__init__(ttl, max_lines, max_qty)
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._commits = 0
+        self._writes = 0
+        self._expired = 0
+
+        self._connection().executescript(_CART_SCHEMA)
+        logger.info(f"Cart store: SQLite {path}")
+
+    def get(self, session_id):
+        now = time.time()
+        rows = self._connection().execute("""
+            SELECT c.Expires, i.ProductId, i.Qty
+            FROM Carts c LEFT JOIN CartItems i ON i.SessionId = c.SessionId
+            WHERE c.SessionId = ? AND c.Expires > ?
+        """, (session_id, now)).fetchall()
+        if not rows:
+            return {}
+        if rows[0][0] - now < self.ttl * 0.9:
+            self._write(lambda conn: self._touch(conn, session_id, time.time()))
+        return {product_id: qty for _, product_id, qty in rows if product_id is not None}
+
+    def add(self, session_id, product_id, qty):
+        def apply(conn):
+            now = time.time()
+            self._touch(conn, session_id, now, create=True)
+            row = conn.execute(
+                "SELECT Qty FROM CartItems WHERE SessionId = ? AND ProductId = ?", (session_id, product_id)
+            ).fetchone()
+            if row is None:
+                lines = conn.execute("SELECT COUNT(*) FROM CartItems WHERE SessionId = ?", (session_id,)).fetchone()[0]
+                self._check_lines(lines)
+                self._check_qty(qty)
+                conn.execute("INSERT INTO CartItems (SessionId, ProductId, Qty) VALUES (?, ?, ?)",
+                             (session_id, product_id, qty))
+                return qty
+            new_qty = row[0] + qty
+            self._check_qty(new_qty)
+            conn.execute("UPDATE CartItems SET Qty = ? WHERE SessionId = ? AND ProductId = ?",
+                         (new_qty, session_id, product_id))
+            return new_qty
+        return self._write(apply)
+
+    def set(self, session_id, product_id, qty):
+        self._check_qty(qty)
+
+        def apply(conn):
+            if not self._touch(conn, session_id, time.time()):
+                return False
+            return conn.execute("UPDATE CartItems SET Qty = ? WHERE SessionId = ? AND ProductId = ?",
+                                (qty, session_id, product_id)).rowcount == 1
+        return self._write(apply)
+
+    def remove(self, session_id, product_id):
+        def apply(conn):
+            if not self._touch(conn, session_id, time.time()):
+                return False
+            return conn.execute("DELETE FROM CartItems WHERE SessionId = ? AND ProductId = ?",
+                                (session_id, product_id)).rowcount == 1
+        return self._write(apply)
+
+    def clear(self, session_id):
+        self._write(lambda conn: conn.execute("DELETE FROM Carts WHERE SessionId = ?", (session_id,)))
+
+    def _modify(self, session_id, change):
+        def apply(conn):
+            self._touch(conn, session_id, time.time(), create=True)
+            current = dict(conn.execute(
+                "SELECT ProductId, Qty FROM CartItems WHERE SessionId = ?", (session_id,)
+            ).fetchall())
+            items = change(dict(current))
+            # Only the lines that differ are written
+            conn.executemany(
+                "DELETE FROM CartItems WHERE SessionId = ? AND ProductId = ?",
+                [(session_id, product_id) for product_id in current if product_id not in items]
+            )
+            conn.executemany("""
+                INSERT INTO CartItems (SessionId, ProductId, Qty) VALUES (?, ?, ?)
+                ON CONFLICT (SessionId, ProductId) DO UPDATE SET Qty = excluded.Qty
+            """, [(session_id, product_id, qty) for product_id, qty in items.items() if current.get(product_id) != qty])
+            return items
+        return self._write(apply)
+
+    def stats(self):
+        conn = self._connection()
+        carts, lines = conn.execute("""
+            SELECT (SELECT COUNT(*) FROM Carts WHERE Expires > ?), (SELECT COUNT(*) FROM CartItems)
+        """, (time.time(),)).fetchone()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "carts": carts,
+            "lines": lines,
+            "bytes": page_count * page_size,
+            "writes": self._writes,
+            "commits": self._commits,
+            "expired": self._expired,
+        }
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _touch(self, conn, session_id, now, create=False):
+        """Extend the expiry of a live cart (or create it); False if there is no live cart"""
+        expires = now + self.ttl
+        if conn.execute("UPDATE Carts SET Expires = ? WHERE SessionId = ? AND Expires > ?",
+                        (expires, session_id, now)).rowcount:
+            return True
+        if not create:
+            return False
+        # Replaces an expired cart that was not purged yet, together with its items
+        conn.execute("DELETE FROM Carts WHERE SessionId = ?", (session_id,))
+        conn.execute("INSERT INTO Carts (SessionId, Expires) VALUES (?, ?)", (session_id, expires))
+        return True
+
+    def _write(self, apply):
+        write = _Write(apply)
+        with self._pending_lock:
+            self._pending.append(write)
+        with self._write_lock:
+            # Another thread may have committed our change together with its own
+            if not write.done:
+                with self._pending_lock:
+                    batch, self._pending = self._pending, []
+                self._commit(batch)
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _commit(self, batch):
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for write in batch:
+                # A savepoint per change: a rejected change does not undo the others
+                conn.execute("SAVEPOINT change")
+                try:
+                    write.result = write.apply(conn)
+                    conn.execute("RELEASE change")
+                except (CartLimitError, CartItemMissing) as e:
+                    conn.execute("ROLLBACK TO change")
+                    conn.execute("RELEASE change")
+                    write.error = e
+            self._expired += conn.execute("""
+                DELETE FROM Carts WHERE SessionId IN (
+                    SELECT SessionId FROM Carts WHERE Expires <= ? ORDER BY Expires LIMIT ?
+                )
+            """, (time.time(), _PURGE_BATCH)).rowcount
+            conn.execute("COMMIT")
+            self._commits += 1
+            self._writes += len(batch)
+        except Exception as e:
+            logger.error(f"Cart write failed: {str(e)}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Every change of the batch fails with the same error
+            for write in batch:
+                write.result, write.error = None, e
+        finally:
+            for write in batch:
+                write.done = True
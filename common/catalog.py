@@ -0,0 +1,113 @@
+"""Read-through cache of the product catalog (id -> name and price).
+
+ProductCatalog keeps up to ``max_size`` products in memory, least recently
+used first out. It is warmed at startup and updated by the handler that
+creates products, so looking a product up for the cart does not touch the
+database. A product that is not cached is read with ``load(ids)`` (one
+query for all missing ids) and cached.
+
+Every change of a cached entry increases ``version``. ``snapshot(ids)``
+returns the prices of several products together with the version they were
+read at, e.g. for checkout to verify that the prices it charges are still
+the ones in the database.
+
+The cache lives in the process. Products changed behind its back (another
+worker, manual SQL) stay stale until ``refresh(ids)`` reloads them.
+"""
+import threading
+from collections import OrderedDict
+
+
+class ProductCatalog:
+    def __init__(self, load, max_size=10000):
+        self._load = load            # ids -> iterable of (id, name, price)
+        self.max_size = max_size
+        self.version = 0
+        self._entries = OrderedDict()  # id -> (name, price), least recently used first
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+
+    def warm(self, rows):
+        """Fill the cache with ``rows`` of (id, name, price)"""
+        with self._lock:
+            for product_id, name, price in rows:
+                self._put(product_id, name, price)
+            self.version += 1
+
+    def put(self, product_id, name, price):
+        with self._lock:
+            self._put(product_id, name, price)
+            self.version += 1
+
+    def get(self, product_id):
+        """``(name, price)`` of a product, or None if it does not exist"""
+        return self.get_many([product_id]).get(product_id)
+
+    def get_many(self, product_ids):
+        """Dict ``id -> (name, price)`` of the products that exist"""
+        return self.snapshot(product_ids)[1]
+
+    def snapshot(self, product_ids):
+        """``(version, {id: (name, price)})`` for products that exist; cache misses are loaded first"""
+        with self._lock:
+            found, missing = self._lookup(product_ids)
+            version = self.version
+        if not missing:
+            return version, found
+
+        rows = list(self._load(missing))
+        with self._lock:
+            for product_id, name, price in rows:
+                self._put(product_id, name, price)
+                found[product_id] = (name, price)
+            return self.version, found
+
+    def refresh(self, product_ids):
+        """Reload products from the database, dropping the ones that no longer exist"""
+        rows = list(self._load(list(product_ids)))
+        with self._lock:
+            changed = False
+            loaded = {}
+            for product_id, name, price in rows:
+                loaded[product_id] = (name, price)
+                changed |= self._entries.get(product_id) != (name, price)
+                self._put(product_id, name, price)
+            for product_id in product_ids:
+                if product_id not in loaded and self._entries.pop(product_id, None) is not None:
+                    changed = True
+            if changed:
+                self.version += 1
+            return loaded
+
+    def stats(self):
+        with self._lock:
+            return {
+                "products": len(self._entries),
+                "max_size": self.max_size,
+                "version": self.version,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evicted": self._evicted,
+            }
+
+    def _lookup(self, product_ids):
+        found, missing = {}, []
+        for product_id in product_ids:
+            entry = self._entries.get(product_id)
+            if entry is None:
+                missing.append(product_id)
+            else:
+                self._entries.move_to_end(product_id)
+                found[product_id] = entry
+        self._hits += len(found)
+        self._misses += len(missing)
+        return found, missing
+
+    def _put(self, product_id, name, price):
+        self._entries[product_id] = (name, price)
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evicted += 1
@@ -0,0 +1,347 @@
+"""Database connection pool shared by the lab applications.
+
+Each app creates one ConnectionPool at startup. Handlers borrow a connection
+with ``acquire()`` and hand it back with ``close()``, exactly like a regular
+pyodbc connection, so the handler code does not need to know about the pool.
+
+DB_BACKEND selects the database: ``mssql`` (default, SQL Server via pyodbc)
+or ``sqlite`` (local file, see common/dialect.py).
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from common.metrics import record, timed_cursor
+
+logger = logging.getLogger(__name__)
+
+# Connections borrowed during the current request (see ConnectionPool.scope)
+_scope_connections: ContextVar = ContextVar("db_scope_connections", default=None)
+
+
+class PoolTimeout(Exception):
+    """No connection became available before the checkout timeout"""
+
+
+def db_backend():
+    backend = os.getenv('DB_BACKEND', 'mssql').lower()
+    if backend not in ('mssql', 'sqlite'):
+        raise ValueError(f"Unsupported DB_BACKEND: {backend}")
+    return backend
+
+
+def is_integrity_error(exc):
+    """Constraint violation (UNIQUE, CHECK, FOREIGN KEY) from either backend"""
+    # pyodbc.IntegrityError and sqlite3.IntegrityError, without importing the drivers
+    return type(exc).__name__ == "IntegrityError"
+
+
+def sqlite_path_from_env():
+    return os.getenv('DB_SQLITE_PATH') or f"{os.getenv('DB_DATABASE') or 'app'}.sqlite3"
+
+
+def connection_factory_from_env():
+    """Return a function opening a new connection to the backend selected by DB_BACKEND"""
+    if db_backend() == 'sqlite':
+        from common.dialect import SqliteConnection
+        path = sqlite_path_from_env()
+        timeout = float(os.getenv('DB_SQLITE_TIMEOUT', 30.0))
+        return lambda: SqliteConnection(path, timeout=timeout)
+
+    # Imported lazily so the SQLite backend works without an ODBC driver manager
+    import pyodbc
+    conn_str = connection_string_from_env()
+    return lambda: pyodbc.connect(conn_str)
+
+
+def connect_from_env():
+    """Open a single connection, e.g. for the reset_db.py scripts"""
+    return connection_factory_from_env()()
+
+
+def connection_string_from_env():
+    server = os.getenv('DB_SERVER', None)
+    database = os.getenv('DB_DATABASE', None)
+    driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
+    use_windows_auth = os.getenv('DB_USE_WINDOWS_AUTH', 'True').lower() == 'true'
+
+    if use_windows_auth:
+        # Windows Authentication (Trusted Connection)
+        return f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;TrustServerCertificate=yes;'
+
+    # SQL Server Authentication
+    username = os.getenv('DB_USERNAME', None)
+    password = os.getenv('DB_PASSWORD', None)
+    return f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};TrustServerCertificate=yes;'
+
+
+class PooledConnection:
+    """Borrowed connection; close() returns it to the pool instead of closing it"""
+
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def _raw(self):
+        if self._conn is None:
+            raise RuntimeError("Connection already returned to the pool")
+        return self._conn
+
+    def cursor(self):
+        return timed_cursor(self._raw().cursor())
+
+    def commit(self):
+        self._raw().commit()
+
+    def rollback(self):
+        self._raw().rollback()
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._release(conn)
+
+    def detach(self):
+        """Take the connection out of the current ``pool.scope()``; the caller must close() it"""
+        borrowed = _scope_connections.get()
+        if borrowed is not None and self in borrowed:
+            borrowed.remove(self)
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def __getattr__(self, name):
+        return getattr(self._raw(), name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections.
+
+    - at most ``max_size`` connections are open at the same time,
+    - ``min_size`` connections are opened eagerly by ``open()``,
+    - ``acquire()`` waits up to ``timeout`` seconds for a free connection,
+    - connections idle for longer than ``ping_interval`` are checked with
+      ``SELECT 1`` before being handed out and replaced when broken.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0, ping_interval=30.0, backend='mssql'):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size and max_size >= 1")
+
+        self._connect = connect
+        self.backend = backend
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, last_used) - most recently used at the right
+        self._size = 0        # open connections, idle + in use + being opened
+        self._in_use = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a pool configured by DB_BACKEND and DB_POOL_* environment variables"""
+        return cls(
+            connection_factory_from_env(),
+            min_size=int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+            max_size=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', 5.0)),
+            ping_interval=float(os.getenv('DB_POOL_PING_INTERVAL', 30.0)),
+            backend=db_backend(),
+        )
+
+    def open(self):
+        """Open the first ``min_size`` connections (called once at app startup)"""
+        with self._cond:
+            self._closed = False
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+
+        for _ in range(max(missing, 0)):
+            try:
+                conn = self._new_connection()
+            except Exception as e:
+                # The app can still start, connections will be opened on demand
+                logger.warning(f"Could not pre-open database connection: {str(e)}")
+                with self._cond:
+                    self._size -= 1
+                continue
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+        logger.info(f"Database pool ready (backend={self.backend}, min={self.min_size}, max={self.max_size})")
+
+    def close(self):
+        """Close idle connections; connections still in use are closed when returned"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, waiting up to ``timeout`` seconds for a free one"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        conn = None
+        last_used = 0.0
+
+        with self._cond:
+            wait_started = None
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                now = time.monotonic()
+                if wait_started is None:
+                    wait_started = now
+                    self._waits += 1
+                remaining = wait_started + timeout - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._record_wait(now - wait_started)
+                    raise PoolTimeout(f"No database connection available within {timeout:.1f}s")
+                self._cond.wait(remaining)
+
+            if wait_started is not None:
+                self._record_wait(time.monotonic() - wait_started)
+            self._in_use += 1
+            self._checkouts += 1
+
+        try:
+            if conn is None:
+                conn = self._new_connection()
+            elif time.monotonic() - last_used > self.ping_interval and not self._is_alive(conn):
+                logger.info("Replacing broken pooled database connection")
+                self._discard(conn)
+                conn = self._new_connection()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        record("connect", time.perf_counter() - started)
+        pooled = PooledConnection(self, conn)
+        borrowed = _scope_connections.get()
+        if borrowed is not None:
+            borrowed.append(pooled)
+        return pooled
+
+    @contextmanager
+    def scope(self):
+        """Return every connection borrowed inside the block, even on errors"""
+        borrowed = []
+        token = _scope_connections.set(borrowed)
+        try:
+            yield
+        finally:
+            _scope_connections.reset(token)
+            for pooled in borrowed:
+                pooled.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_ms": round(self._wait_time * 1000, 3),
+                "avg_wait_ms": round(self._wait_time * 1000 / self._waits, 3) if self._waits else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+    def _release(self, conn):
+        # Never hand out a connection with a half-finished transaction
+        try:
+            conn.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+            self._size -= 1
+            self._cond.notify()
+
+        self._discard(conn)
+
+    def _record_wait(self, waited):
+        self._wait_time += waited
+        self._max_wait = max(self._max_wait, waited)
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_alive(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self._cond:
+            self._discarded += 1
+        self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
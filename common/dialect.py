@@ -0,0 +1,174 @@
+"""SQLite stand-in for the SQL Server backend.
+
+The apps are written against SQL Server through pyodbc. With
+``DB_BACKEND=sqlite`` the pool hands out SqliteConnection objects instead:
+they accept the same calls (``cursor.execute(sql, *params)``, ``fetchone``,
+``fetchall`` ...) and translate the T-SQL used by the handlers to SQLite
+before running it. This gives a database that runs anywhere, e.g. for local
+load tests and profiling.
+"""
+import re
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+# pyodbc returns datetime objects for DATETIME2 columns, make sqlite3 do the same
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+_OUTPUT_INSERTED = re.compile(r"\s+OUTPUT\s+(INSERTED\.\w+(?:\s*,\s*INSERTED\.\w+)*)", re.IGNORECASE)
+_CONVERT_DATE = re.compile(r"CONVERT\(\s*VARCHAR\(10\)\s*,\s*([\w.\[\]]+)\s*,\s*23\s*\)", re.IGNORECASE)
+_DATEADD_NOW = re.compile(r"DATEADD\(\s*(day|hour|minute)\s*,\s*(-?\d+)\s*,\s*GETDATE\(\)\s*\)", re.IGNORECASE)
+_DATEDIFF_DAY = re.compile(r"DATEDIFF\(\s*day\s*,\s*([\w.?]+)\s*,\s*([\w.?]+)\s*\)", re.IGNORECASE)
+_SELECT_TOP = re.compile(r"^(\s*SELECT\s+)TOP\s*\(?\s*(\d+)\s*\)?\s+", re.IGNORECASE)
+_TABLE_HINTS = re.compile(r"\s+WITH\s*\(\s*(?:NOLOCK|UPDLOCK|HOLDLOCK|ROWLOCK|XLOCK|READPAST)(?:\s*,\s*(?:NOLOCK|UPDLOCK|HOLDLOCK|ROWLOCK|XLOCK|READPAST))*\s*\)", re.IGNORECASE)
+_OPENJSON = re.compile(r"OPENJSON\(\s*\?\s*\)\s*WITH\s*\(((?:[^()]|\([^()]*\))*)\)", re.IGNORECASE)
+_OPENJSON_COLUMN = re.compile(r"^\s*(\w+)\s+\w+(?:\([\d\s,]*\))?\s+'([^']*)'\s*$")
+_FETCH_NEXT = re.compile(r"OFFSET\s+0\s+ROWS\s+FETCH\s+NEXT\s+(\?|\d+)\s+ROWS\s+ONLY", re.IGNORECASE)
+
+# Simple one-to-one replacements (T-SQL -> SQLite)
+_REPLACEMENTS = [
+    (re.compile(r"\bdbo\.", re.IGNORECASE), ""),
+    (re.compile(r"\bISNULL\(", re.IGNORECASE), "IFNULL("),
+    (re.compile(r"\bSCOPE_IDENTITY\(\)", re.IGNORECASE), "last_insert_rowid()"),
+    (re.compile(r"\bSYSUTCDATETIME\(\)", re.IGNORECASE), "datetime('now')"),
+    (re.compile(r"\bGETDATE\(\)", re.IGNORECASE), "datetime('now', 'localtime')"),
+    (re.compile(r"(?<![\w'])N'"), "'"),
+]
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    """Translate the T-SQL subset used by the apps to SQLite"""
+    returning = None
+    match = _OUTPUT_INSERTED.search(sql)
+    if match:
+        returning = re.sub(r"INSERTED\.", "", match.group(1), flags=re.IGNORECASE)
+        sql = sql[:match.start()] + sql[match.end():]
+
+    limit = None
+    match = _SELECT_TOP.match(sql)
+    if match:
+        limit = match.group(2)
+        sql = match.group(1) + sql[match.end():]
+
+    sql = _OPENJSON.sub(_json_each, sql)
+    sql = _CONVERT_DATE.sub(r"substr(\1, 1, 10)", sql)
+    sql = _DATEADD_NOW.sub(lambda m: f"datetime('now', 'localtime', '{m.group(2)} {m.group(1).lower()}s')", sql)
+    # Day boundaries crossed, like SQL Server
+    sql = _DATEDIFF_DAY.sub(r"CAST(julianday(date(\2)) - julianday(date(\1)) AS INTEGER)", sql)
+    sql = _FETCH_NEXT.sub(r"LIMIT \1", sql)
+    # Locking hints: SQLite locks the whole database for writing instead
+    sql = _TABLE_HINTS.sub("", sql)
+    for pattern, replacement in _REPLACEMENTS:
+        sql = pattern.sub(replacement, sql)
+
+    sql = sql.rstrip().rstrip(";")
+    if limit is not None:
+        sql += f" LIMIT {limit}"
+    if returning is not None:
+        sql += f" RETURNING {returning}"
+    return sql
+
+
+def _json_each(match):
+    # OPENJSON(?) WITH (Name TYPE '$path', ...) -> the same columns read from json_each(?)
+    columns = []
+    for column in re.split(r",(?![^()]*\))", match.group(1)):
+        parsed = _OPENJSON_COLUMN.match(column)
+        if parsed is None:
+            raise ValueError(f"Unsupported OPENJSON column: {column.strip()}")
+        columns.append(f"json_extract(value, '{parsed.group(2)}') AS {parsed.group(1)}")
+    return f"(SELECT {', '.join(columns)} FROM json_each(?))"
+
+
+class SqliteCursor:
+    """pyodbc-style cursor on top of sqlite3"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._buffered = None
+        self.fast_executemany = False  # accepted for pyodbc compatibility
+
+    def execute(self, sql, *params):
+        # pyodbc accepts both execute(sql, a, b) and execute(sql, [a, b])
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        sql = translate(sql)
+        self._cursor.execute(sql, params)
+        # RETURNING rows must be read before the transaction can be committed
+        self._buffered = self._cursor.fetchall() if " RETURNING " in sql else None
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._buffered = None
+        self._cursor.executemany(translate(sql), seq_of_params)
+        return self
+
+    def fetchone(self):
+        if self._buffered is not None:
+            return self._buffered.pop(0) if self._buffered else None
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        if self._buffered is not None:
+            rows, self._buffered = self._buffered, []
+            return rows
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        if self._buffered is not None:
+            rows, self._buffered = self._buffered[:size], self._buffered[size:]
+            return rows
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+class SqliteConnection:
+    """pyodbc-style connection on top of sqlite3"""
+
+    def __init__(self, path, timeout=30.0):
+        self._conn = sqlite3.connect(
+            path,
+            timeout=timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,  # the pool moves connections between threads
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+
+    def cursor(self):
+        return SqliteCursor(self._conn.cursor())
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def executescript(self, script):
+        self._conn.executescript(script)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
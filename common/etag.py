@@ -0,0 +1,145 @@
+"""Conditional GETs (ETag / If-None-Match) driven by per-table change versions.
+
+Every app keeps a TableVersions object. Handlers that write to a table call
+``versions.bump("Table")`` after the commit. Read endpoints depend on
+``versions.etag_for("Table", ...)``: the ETag is built from the versions of
+those tables and when it matches the client's If-None-Match the request is
+answered with 304 before the handler runs, so the database is not touched.
+
+TableVersions keeps the versions in the process. The ETag also contains a
+random token generated at startup, so tags from before a restart (or from
+another worker) never match. Changes made by other processes (a second
+uvicorn worker, reset_db.py, manual SQL) are not seen, so use it with a
+single worker only.
+
+SharedTableVersions keeps them in a SQLite file in WAL mode instead, shared
+by all worker processes on the machine: a bump on one worker changes the
+ETag on every worker. Its random token is replaced whenever a process
+starts, so a restart still invalidates all tags. Changes made outside the
+app (reset_db.py, manual SQL) need a restart as before.
+``TableVersions.from_env()`` picks SharedTableVersions when
+TABLE_VERSIONS_PATH is set.
+"""
+import os
+import uuid
+import sqlite3
+import logging
+import threading
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+
+class TableVersions:
+    def __init__(self):
+        self._epoch = uuid.uuid4().hex[:8]
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """SharedTableVersions in TABLE_VERSIONS_PATH when set, otherwise versions in the process"""
+        path = os.getenv('TABLE_VERSIONS_PATH')
+        return SharedTableVersions(path) if path else cls()
+
+    def bump(self, *tables):
+        """Mark ``tables`` as changed (call after the commit)"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def etag(self, *tables):
+        versions = ".".join(str(self._versions.get(table, 0)) for table in tables)
+        return f'"{self._epoch}.{versions}"'
+
+    def etag_for(self, *tables):
+        """FastAPI dependency: raises 304 when the client's copy is current, otherwise returns the ETag"""
+        async def dependency(request: Request):
+            # Taken before the handler queries the tables: a change committed
+            # meanwhile gives a newer ETag on the next request, never a stale 304
+            etag = self.etag(*tables)
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match and _matches(if_none_match, etag):
+                raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+            return etag
+        return dependency
+
+    def close(self):
+        pass
+
+
+_VERSIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS TableVersions (
+    Name    TEXT PRIMARY KEY,
+    Version INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Name of the row holding the random token of the current start
+_EPOCH = ""
+
+
+class SharedTableVersions(TableVersions):
+    """Table versions in a SQLite file shared by all worker processes"""
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+        conn = self._connection()
+        conn.executescript(_VERSIONS_SCHEMA)
+        # A new token on every process start: tags from before a restart never match
+        conn.execute("""
+            INSERT INTO TableVersions (Name, Version) VALUES (?, ?)
+            ON CONFLICT (Name) DO UPDATE SET Version = excluded.Version
+        """, (_EPOCH, uuid.uuid4().int >> 80))
+        logger.info(f"Table versions: SQLite {path}")
+
+    def bump(self, *tables):
+        self._connection().executemany("""
+            INSERT INTO TableVersions (Name, Version) VALUES (?, 1)
+            ON CONFLICT (Name) DO UPDATE SET Version = Version + 1
+        """, [(table,) for table in tables])
+
+    def etag(self, *tables):
+        names = (_EPOCH,) + tables
+        versions = dict(self._connection().execute(
+            f"SELECT Name, Version FROM TableVersions WHERE Name IN ({', '.join('?' * len(names))})", names
+        ).fetchall())
+        joined = ".".join(str(versions.get(table, 0)) for table in tables)
+        return f'"{versions.get(_EPOCH, 0):x}.{joined}"'
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+
+def _matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,142 @@
+"""Runs blocking database work outside the event loop.
+
+pyodbc calls block the calling thread, so an ``async def`` handler that uses
+them stalls every other request served by the same worker. DbExecutor runs
+such handlers on a dedicated thread pool sized like the connection pool, lets
+at most ``workers`` of them run at once and queues up to ``max_queue`` more.
+When the queue is full the request is rejected straight away with 503 and a
+Retry-After header instead of waiting behind everybody else.
+"""
+import os
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.responses import JSONResponse
+
+from common.metrics import record
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Too many database calls are already running or queued"""
+
+    def __init__(self, retry_after):
+        super().__init__("Server busy")
+        self.retry_after = retry_after
+
+
+class DbExecutor:
+    def __init__(self, pool, workers=None, max_queue=100, queue_timeout=10.0, retry_after=1):
+        self.pool = pool
+        self.workers = workers or pool.max_size
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._executor = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._running = 0
+        self._waiting = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls, pool):
+        """Build an executor configured by DB_WORKERS / DB_QUEUE_* environment variables"""
+        return cls(
+            pool,
+            workers=int(os.getenv('DB_WORKERS', pool.max_size)),
+            max_queue=int(os.getenv('DB_QUEUE_SIZE', 100)),
+            queue_timeout=float(os.getenv('DB_QUEUE_TIMEOUT', 10.0)),
+            retry_after=int(os.getenv('DB_RETRY_AFTER', 1)),
+        )
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="db")
+        logger.info(f"Database executor ready (workers={self.workers}, queue={self.max_queue})")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on a database thread and return its result"""
+        if self._executor is None:
+            raise RuntimeError("DbExecutor.start() was not called")
+        queued_at = time.perf_counter()
+
+        # Admission is decided synchronously, before the first await
+        if self._running + self._waiting >= self.workers + self.max_queue:
+            self._rejected += 1
+            raise Overloaded(self.retry_after)
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise Overloaded(self.retry_after)
+        finally:
+            self._waiting -= 1
+
+        loop = asyncio.get_running_loop()
+        self._running += 1
+        try:
+            # Copy the context so context variables set by middleware are visible in the thread
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, self._call, queued_at, fn, args, kwargs)
+        except BaseException:
+            self._running -= 1
+            self._slots.release()
+            raise
+        # The slot is freed when the thread finishes, even if the client went away meanwhile
+        future.add_done_callback(lambda _: self._release_threadsafe(loop))
+        return await asyncio.wrap_future(future)
+
+    def offload(self, fn):
+        """Decorator turning a blocking handler into an async one that runs via ``run()``"""
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.run(fn, *args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queued": self._waiting,
+            "max_queue": self.max_queue,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
+
+    def _call(self, queued_at, fn, args, kwargs):
+        record("queue", time.perf_counter() - queued_at)
+        with self.pool.scope():
+            return fn(*args, **kwargs)
+
+    def _release_threadsafe(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Event loop already closed during shutdown
+            pass
+
+    def _release(self):
+        self._running -= 1
+        self._completed += 1
+        self._slots.release()
+
+
+async def overloaded_handler(request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, try again later"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
@@ -0,0 +1,280 @@
+"""Per-request timings, the Server-Timing header and Prometheus metrics.
+
+MetricsMiddleware starts a Timings object for every HTTP request and keeps it
+in a context variable. Code running for that request (also on the database
+threads, which copy the context) adds phases to it:
+
+- ``queue``     - waiting for a free database thread (common/executor.py),
+- ``connect``   - borrowing a connection from the pool (common/db.py),
+- ``q1``, ``q2``... - each query, execute + fetch (TimedCursor),
+- ``serialize`` - JSON encoding of the response (common/responses.py).
+
+Whatever is left of the total is reported as ``app`` (validation, row
+mapping, the handler itself). The phases are sent back in a Server-Timing
+header and aggregated into histograms served by ``/metrics``.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Timings of the request being handled, None outside of a request
+_current: ContextVar = ContextVar("request_timings", default=None)
+
+# Histogram buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Individual queries listed in Server-Timing; the rest only count towards "db"
+MAX_TIMED_QUERIES = 20
+
+
+class Timings:
+    """Phase durations (in seconds) collected for a single request"""
+
+    __slots__ = ("started", "phases", "queries")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = []
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def start_query(self):
+        self.queries.append(0.0)
+        return len(self.queries) - 1
+
+    def add_query(self, index, seconds):
+        self.queries[index] += seconds
+
+    def summary(self, total):
+        """Phases of the request plus "db" (all queries) and the "app" remainder"""
+        phases = dict(self.phases)
+        if self.queries:
+            phases["db"] = sum(self.queries)
+        phases["app"] = max(total - sum(phases.values()), 0.0)
+        return phases
+
+    def server_timing(self, total):
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.summary(total).items()]
+        if self.queries:
+            parts[-1:-1] = [
+                f"q{i + 1};dur={seconds * 1000:.2f}" for i, seconds in enumerate(self.queries[:MAX_TIMED_QUERIES])
+            ]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+def current_timings():
+    return _current.get()
+
+
+def record(phase, seconds):
+    """Add ``seconds`` to ``phase`` of the current request (no-op outside of a request)"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+class TimedCursor:
+    """Cursor wrapper timing every execute() and the fetches that follow it"""
+
+    __slots__ = ("_cursor", "_timings", "_query")
+
+    def __init__(self, cursor, timings):
+        self._cursor = cursor
+        self._timings = timings
+        self._query = None
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._query is not None:
+                self._timings.add_query(self._query, time.perf_counter() - started)
+
+    def execute(self, sql, *params):
+        self._query = self._timings.start_query()
+        self._timed(self._cursor.execute, sql, *params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._query = self._timings.start_query()
+        self._timed(self._cursor.executemany, sql, seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def fetchmany(self, size=1):
+        return self._timed(self._cursor.fetchmany, size)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. cursor.fast_executemany = True must reach the real cursor
+        if name in TimedCursor.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+def timed_cursor(cursor):
+    """Wrap ``cursor`` in a TimedCursor when called while handling a request"""
+    timings = _current.get()
+    return cursor if timings is None else TimedCursor(cursor, timings)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Metrics:
+    """Request counters and latency histograms, per route and status.
+
+    Only touched from the event loop thread (by MetricsMiddleware), so no
+    locking is needed.
+    """
+
+    def __init__(self):
+        self._requests = {}  # (method, route, status) -> Histogram of total durations
+        self._phases = {}    # (route, phase) -> Histogram
+        self._collectors = []
+
+    def add_collector(self, prefix, stats):
+        """Export ``stats()`` (a dict of numbers) as gauges named ``<prefix>_<key>``"""
+        self._collectors.append((prefix, stats))
+
+    def observe(self, method, route, status, total, phases):
+        key = (method, route, status)
+        histogram = self._requests.get(key)
+        if histogram is None:
+            histogram = self._requests[key] = Histogram()
+        histogram.observe(total)
+
+        for phase, seconds in phases.items():
+            key = (route, phase)
+            histogram = self._phases.get(key)
+            if histogram is None:
+                histogram = self._phases[key] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP http_requests_total Requests handled, by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), histogram in sorted(self._requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {histogram.count}')
+
+        lines += [
+            "# HELP http_request_duration_seconds Time until the response headers were sent.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), histogram in sorted(self._requests.items()):
+            _render_histogram(lines, "http_request_duration_seconds",
+                              f'method="{method}",route="{route}",status="{status}"', histogram)
+
+        lines += [
+            "# HELP http_request_phase_seconds Time spent per phase (queue, connect, db, serialize, app).",
+            "# TYPE http_request_phase_seconds histogram",
+        ]
+        for (route, phase), histogram in sorted(self._phases.items()):
+            _render_histogram(lines, "http_request_phase_seconds", f'route="{route}",phase="{phase}"', histogram)
+
+        for prefix, stats in self._collectors:
+            for key, value in stats().items():
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(lines, name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+def route_label(scope, root_path):
+    """Route template (``/api/books/{book_id}``), not the raw path, to keep label cardinality low"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    mounted = scope.get("root_path", "")
+    if mounted != root_path:
+        # Request served by a mounted app, e.g. StaticFiles at /static
+        return mounted[len(root_path):] + "/{path}"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request.
+
+    Adds the Server-Timing header when the response starts and records the
+    request in ``metrics`` (total = time until the response headers are sent).
+    """
+
+    def __init__(self, app, metrics, server_timing=True):
+        self.app = app
+        self.metrics = metrics
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = Timings()
+        token = _current.set(timings)
+        root_path = scope.get("root_path", "")
+        recorded = False
+
+        def finish(status):
+            nonlocal recorded
+            recorded = True
+            total = time.perf_counter() - timings.started
+            self.metrics.observe(scope["method"], route_label(scope, root_path), status, total,
+                                 timings.summary(total))
+            return total
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and not recorded:
+                total = finish(message["status"])
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing(total).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException:
+            if not recorded:
+                finish(500)
+            raise
+        finally:
+            _current.reset(token)
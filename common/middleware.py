@@ -0,0 +1,79 @@
+"""Security headers and access logging in one pure ASGI middleware.
+
+``@app.middleware("http")`` wraps every request in Starlette's
+BaseHTTPMiddleware (an extra task plus a response stream per layer). This
+middleware only wraps ``send``: it appends the security headers to the
+``http.response.start`` message and writes one access log line per request.
+
+Log records go to a queue drained by a background thread (see
+``setup_logging``), so the event loop never waits on log I/O. With
+``LOG_SAMPLE_RATE`` below 1 only that fraction of successful requests is
+logged; 4xx/5xx responses are always logged.
+"""
+import os
+import time
+import atexit
+import random
+import logging
+import logging.handlers
+import queue
+
+access_logger = logging.getLogger("access")
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def setup_logging(level=logging.INFO, fmt=LOG_FORMAT):
+    """Send all log records through a queue to a StreamHandler on a background thread"""
+    root = logging.getLogger()
+    if any(isinstance(handler, logging.handlers.QueueHandler) for handler in root.handlers):
+        return  # already configured, e.g. module imported twice
+
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(fmt))
+    listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(listener.stop)
+
+
+class SecurityHeadersMiddleware:
+    """Adds ``headers`` to every HTTP response and logs ``METHOD path status duration``"""
+
+    def __init__(self, app, headers, sample_rate=None):
+        self.app = app
+        self._headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+        self._names = {name for name, _ in self._headers}
+        if sample_rate is None:
+            sample_rate = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Our values replace headers of the same name set by the handler
+                headers = [header for header in message.get("headers", ()) if header[0] not in self._names]
+                headers.extend(self._headers)
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            if status >= 400 or self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+                if access_logger.isEnabledFor(logging.INFO):
+                    access_logger.info("%s %s %d %.1fms", scope["method"], scope["path"], status,
+                                       (time.perf_counter() - started) * 1000)
@@ -0,0 +1,70 @@
+"""Keyset (cursor) pagination for the list endpoints.
+
+A page is requested with ``?limit=N&cursor=...``. The cursor is an opaque
+token holding the sort key of the last row of the previous page (e.g. Name
+and Id). The next page is read with a seek such as
+``WHERE Name > ? OR (Name = ? AND Id > ?)`` on an index over the same
+columns, so every page costs the same no matter how deep it is, unlike
+OFFSET which reads and throws away all the skipped rows.
+
+Handlers ask for ``limit + 1`` rows; the extra row only tells whether there
+is a next page.
+"""
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def encode_cursor(*values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token, *types):
+    """Decode a cursor into values of ``types`` (e.g. ``str, int``); invalid tokens give 400"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("wrong number of values")
+        return tuple(
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for type_, value in zip(types, values)
+        )
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class Page:
+    """``limit`` / ``cursor`` query parameters of a paged endpoint"""
+
+    def __init__(self, limit, cursor):
+        self.limit = limit
+        self.cursor = cursor
+
+    def after(self, *types):
+        """Sort key decoded from the cursor, or None on the first page"""
+        return decode_cursor(self.cursor, *types) if self.cursor else None
+
+    def split(self, rows, key):
+        """Trim the extra row; return ``(rows, next_cursor)`` where ``key(row)`` gives the sort key"""
+        if len(rows) <= self.limit:
+            return rows, None
+        rows = rows[:self.limit]
+        return rows, encode_cursor(*key(rows[-1]))
+
+
+def page_params(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
+):
+    """FastAPI dependency for paged endpoints"""
+    return Page(limit, cursor)
@@ -0,0 +1,152 @@
+"""Response classes used by the lab applications.
+
+JSON is encoded with orjson when it is installed (several times faster than
+the stdlib ``json`` module) and with ``json`` otherwise; the output is the
+same compact UTF-8 JSON in both cases.
+
+``stream_rows()`` turns an executed query into a response that sends the JSON
+array while the rows are still being fetched, ``batch_size`` rows at a time,
+so memory use does not grow with the size of the result. ``stream_csv()``
+does the same for CSV exports. The later batches are fetched through the
+app's DbExecutor like any other database call, so a stream counts against
+its concurrency limit; when a batch is shed with Overloaded the headers are
+already sent and the client gets a truncated body.
+"""
+import io
+import csv
+import json
+import time
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+
+import anyio
+from fastapi.responses import JSONResponse as _JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from common.metrics import record
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the cursor and encoded per chunk of a streamed response
+STREAM_BATCH_SIZE = 500
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(content):
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+else:
+    def dumps(content):
+        return json.dumps(
+            content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+class JSONResponse(_JSONResponse):
+    """JSONResponse using ``dumps()``; reports the encoding time as the ``serialize`` phase"""
+
+    def render(self, content):
+        started = time.perf_counter()
+        try:
+            return dumps(content)
+        finally:
+            record("serialize", time.perf_counter() - started)
+
+
+def stream_rows(conn, cursor, to_item, executor, key=None, batch_size=STREAM_BATCH_SIZE, headers=None):
+    """Stream the rows of an executed query as a JSON array (or ``{key: [...]}``).
+
+    Call it from a handler right after ``cursor.execute()``. The first batch
+    is fetched here, so errors in the query still reach the handler's
+    ``except`` and become a 500. The connection then belongs to the response
+    and is returned to the pool when the last row has been sent. Later
+    batches are fetched with ``executor.run()``.
+    """
+    prefix = b"[" if key is None else b'{' + dumps(key) + b':['
+    suffix = b"]" if key is None else b"]}"
+
+    def encode(rows):
+        return b",".join(dumps(to_item(row)) for row in rows)
+
+    return _stream_batches(conn, cursor, executor, encode, prefix, b",", suffix, batch_size,
+                           media_type="application/json", headers=headers)
+
+
+def stream_csv(conn, cursor, header, executor, to_row=tuple, batch_size=STREAM_BATCH_SIZE, headers=None):
+    """Stream the rows of an executed query as CSV with a ``header`` line; same rules as ``stream_rows()``"""
+    def lines(rows):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\r\n").writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+    return _stream_batches(conn, cursor, executor, lambda rows: lines(map(to_row, rows)), lines([header]), b"", b"",
+                           batch_size, media_type="text/csv", headers=headers)
+
+
+def _stream_batches(conn, cursor, executor, encode_rows, prefix, separator, suffix, batch_size, **kwargs):
+    rows = cursor.fetchmany(batch_size)
+    conn.detach()
+
+    def encode(rows):
+        started = time.perf_counter()
+        chunk = encode_rows(rows)
+        record("serialize", time.perf_counter() - started)
+        return chunk
+
+    def next_chunk():
+        rows = cursor.fetchmany(batch_size)
+        return encode(rows) if rows else None
+
+    def close():
+        try:
+            cursor.close()
+        finally:
+            conn.close()
+
+    async def body():
+        try:
+            yield prefix + encode(rows)
+            if len(rows) == batch_size:
+                while True:
+                    chunk = await executor.run(next_chunk)
+                    if chunk is None:
+                        break
+                    yield separator + chunk
+            yield suffix
+        except Exception as e:
+            # Headers are already sent, the client sees a truncated body
+            logger.error(f"Error streaming rows: {str(e)}")
+            raise
+
+    return RowStreamResponse(body(), close, **kwargs)
+
+
+class RowStreamResponse(StreamingResponse):
+    """StreamingResponse running ``on_close`` (in a thread) once it is done, however it ends"""
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Also when the client disconnected and the stream was cancelled
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self.on_close)
@@ -0,0 +1,170 @@
+"""In-memory text search over a few short fields (e.g. book title and author).
+
+TextIndex keeps every document in memory together with two inverted indexes
+on the folded text (lowercase, Polish diacritics removed, so "wisniewski"
+finds "Wiśniewski"):
+
+- trigrams -> documents, for substring matches of 3+ characters,
+- 1-2 character word prefixes -> documents, for very short queries.
+
+A query is split into terms; the candidates for a term are the intersection
+of the posting sets of its trigrams, checked against the folded text. Every
+term has to match. A lookup touches only the posting sets of the query, not
+the whole catalogue, and never goes to the database.
+
+Ranking, per term and field: whole word > word prefix > substring, weighted
+by the field (first field counts most); ties are ordered by the first field.
+"""
+import re
+import heapq
+import threading
+import unicodedata
+
+# Letters that do not decompose into base letter + combining mark
+_EXTRA_FOLDS = str.maketrans({"ł": "l", "đ": "d", "ø": "o", "ß": "ss"})
+_WORD = re.compile(r"\w+")
+
+GRAM = 3
+
+# Score of a term match (before the field weight)
+WORD_SCORE = 4
+PREFIX_SCORE = 2
+SUBSTRING_SCORE = 1
+
+
+def fold(text):
+    """Lowercase and strip diacritics: "Łódź Wiśniewski" -> "lodz wisniewski" """
+    text = unicodedata.normalize("NFKD", text.lower().translate(_EXTRA_FOLDS))
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def _grams(word):
+    return {word[i:i + GRAM] for i in range(len(word) - GRAM + 1)}
+
+
+class TextIndex:
+    """Search index over documents with the same ``fields``, e.g. ("title", "author")"""
+
+    def __init__(self, fields, weights=None):
+        self.fields = tuple(fields)
+        self.weights = tuple(weights or range(len(self.fields) + 1, 1, -1))
+        self._docs = {}       # id -> original field values
+        self._folded = {}     # id -> folded field values
+        self._words = {}      # id -> words of each folded field
+        self._grams = {}      # trigram -> ids
+        self._prefixes = {}   # 1-2 character word prefix -> ids
+        self._lock = threading.Lock()
+        self._queries = 0
+
+    def add(self, doc_id, **values):
+        """Add a document, or replace the one with the same id"""
+        folded = tuple(fold(values.get(field) or "") for field in self.fields)
+        with self._lock:
+            if doc_id in self._docs:
+                self._unindex(doc_id)
+            self._docs[doc_id] = {field: values.get(field) for field in self.fields}
+            self._folded[doc_id] = folded
+            self._words[doc_id] = tuple(tuple(_WORD.findall(value)) for value in folded)
+            for key, index in self._keys(folded):
+                index.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            if doc_id in self._docs:
+                self._unindex(doc_id)
+                del self._docs[doc_id]
+                del self._folded[doc_id]
+                del self._words[doc_id]
+
+    def rebuild(self, rows):
+        """Replace the contents with ``rows`` of (id, value of each field)"""
+        with self._lock:
+            self._docs.clear()
+            self._folded.clear()
+            self._words.clear()
+            self._grams.clear()
+            self._prefixes.clear()
+        for doc_id, *values in rows:
+            self.add(doc_id, **dict(zip(self.fields, values)))
+
+    def search(self, query, limit=10):
+        """Best ``limit`` matches: list of dicts with ``id``, the fields and ``score``"""
+        terms = _WORD.findall(fold(query))
+        if not terms:
+            return []
+        with self._lock:
+            self._queries += 1
+            candidates = None
+            for term in sorted(terms, key=len, reverse=True):
+                ids = self._candidates(term)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+
+            scored = []
+            for doc_id in candidates:
+                score = self._score(self._folded[doc_id], self._words[doc_id], terms)
+                if score:
+                    scored.append((score, doc_id))
+            best = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], self._folded[item[1]]))
+            return [{"id": doc_id, **self._docs[doc_id], "score": score} for score, doc_id in best]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "grams": len(self._grams),
+                "prefixes": len(self._prefixes),
+                "queries": self._queries,
+            }
+
+    def _keys(self, folded):
+        for value in folded:
+            for word in _WORD.findall(value):
+                for gram in _grams(word):
+                    yield gram, self._grams
+                for size in range(1, min(GRAM, len(word) + 1)):
+                    yield word[:size], self._prefixes
+
+    def _unindex(self, doc_id):
+        for key, index in self._keys(self._folded[doc_id]):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del index[key]
+
+    def _candidates(self, term):
+        if len(term) < GRAM:
+            return set(self._prefixes.get(term, ()))
+        postings = [self._grams.get(gram) for gram in _grams(term)]
+        if not all(postings):
+            return set()
+        # Start from the rarest trigram, the intersection only shrinks
+        postings.sort(key=len)
+        ids = set(postings[0])
+        for posting in postings[1:]:
+            ids &= posting
+            if not ids:
+                break
+        return ids
+
+    def _score(self, folded, words_per_field, terms):
+        total = 0
+        for term in terms:
+            best = 0
+            for weight, value, words in zip(self.weights, folded, words_per_field):
+                if term not in value:
+                    continue
+                if term in words:
+                    score = WORD_SCORE
+                elif any(word.startswith(term) for word in words):
+                    score = PREFIX_SCORE
+                else:
+                    score = SUBSTRING_SCORE
+                best = max(best, score * weight)
+            if not best:
+                # A trigram candidate whose grams are not contiguous
+                return 0
+            total += best
+        return total
@@ -0,0 +1,74 @@
+"""Anonymous client sessions identified by a cookie.
+
+SessionMiddleware reads the session cookie into ``request.state.session_id``
+(None when the client has none or it is malformed). Handlers that need a
+session depend on ``session_id``: it creates a random id when there is none
+and the middleware sends it back as an HttpOnly cookie with the response.
+Requests that never ask for a session (pages, static files) do not get one.
+"""
+import os
+import re
+import secrets
+from http.cookies import SimpleCookie
+
+from fastapi import Request
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{32}$")
+
+
+class SessionMiddleware:
+    def __init__(self, app, cookie_name="session_id", max_age=None, secure=None):
+        self.app = app
+        self.cookie_name = cookie_name
+        if max_age is None:
+            max_age = int(os.getenv('SESSION_MAX_AGE', 30 * 24 * 3600))
+        if secure is None:
+            secure = os.getenv('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
+        self.max_age = max_age
+        self.secure = secure
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current = self._read_cookie(scope)
+        state = scope.setdefault("state", {})
+        state["session_id"] = current
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                session_id = state.get("session_id")
+                if session_id and session_id != current:
+                    headers = list(message.get("headers", ()))
+                    headers.append((b"set-cookie", self._cookie(session_id).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+    def _read_cookie(self, scope):
+        for name, value in scope.get("headers", ()):
+            if name == b"cookie":
+                cookie = SimpleCookie()
+                try:
+                    cookie.load(value.decode("latin-1"))
+                except Exception:
+                    return None
+                morsel = cookie.get(self.cookie_name)
+                if morsel is not None and _SESSION_ID.match(morsel.value):
+                    return morsel.value
+        return None
+
+    def _cookie(self, session_id):
+        cookie = f"{self.cookie_name}={session_id}; Path=/; Max-Age={self.max_age}; HttpOnly; SameSite=Lax"
+        return f"{cookie}; Secure" if self.secure else cookie
+
+
+def session_id(request: Request):
+    """FastAPI dependency: the client's session id, created (and sent as a cookie) when missing"""
+    current = getattr(request.state, "session_id", None)
+    if current is None:
+        current = secrets.token_urlsafe(24)
+        request.state.session_id = current
+    return current
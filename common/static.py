@@ -0,0 +1,187 @@
+"""Static files and HTML pages served from memory.
+
+StaticAssets loads the ``static/`` directory once at startup:
+
+- every asset gets a fingerprinted name with a content hash
+  (``style.css`` -> ``style.3f2a9c1b.css``); those URLs never change content,
+  so they are served with ``Cache-Control: immutable`` for a year,
+- text assets are compressed ahead of time with gzip and, when the
+  ``brotli`` package is installed, brotli; the encoding is chosen from
+  Accept-Encoding,
+- ``/static/...`` references in the HTML pages are rewritten to the
+  fingerprinted names and the pages are kept in memory, revalidated with
+  ETag (``no-cache``) so a deploy is picked up immediately.
+
+No file is read from disk after startup. The original, unfingerprinted names
+keep working (with ``no-cache``).
+"""
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Files smaller than this are sent as they are
+MIN_COMPRESS_SIZE = 512
+
+_STATIC_REF = re.compile(r'''(["'(])/static/([^"'()?#\s]+)''')
+
+
+class Asset:
+    __slots__ = ("content_type", "etag", "bodies")
+
+    def __init__(self, content, content_type):
+        self.content_type = content_type
+        self.etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        # Content-Encoding -> body; "identity" is always present
+        self.bodies = {"identity": content}
+        if len(content) >= MIN_COMPRESS_SIZE and _is_compressible(content_type):
+            if brotli is not None:
+                self._add("br", brotli.compress(content, quality=11))
+            self._add("gzip", gzip.compress(content, compresslevel=9, mtime=0))
+
+    def _add(self, encoding, body):
+        if len(body) < len(self.bodies["identity"]):
+            self.bodies[encoding] = body
+
+    def response(self, request_headers, cache_control, method="GET"):
+        encoding = _pick_encoding(request_headers.get("accept-encoding", ""), self.bodies)
+        # Each encoding is a different representation and gets its own strong ETag
+        etag = self.etag if encoding == "identity" else f'{self.etag[:-1]}-{encoding}"'
+        headers = {"Cache-Control": cache_control, "ETag": etag}
+        if len(self.bodies) > 1:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and etag in if_none_match:
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        body = self.bodies[encoding]
+        if method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        # Set as a header, not media_type: starlette would append a second charset to text/* types
+        headers["Content-Type"] = self.content_type
+        return Response(body, headers=headers)
+
+
+class StaticAssets:
+    """In-memory static files; mount the instance at ``prefix`` and serve pages with ``page()``"""
+
+    def __init__(self, directory, prefix="/static"):
+        self.directory = directory
+        self.prefix = prefix
+        self._assets = {}    # URL path below prefix (original and fingerprinted) -> (Asset, cache control)
+        self._urls = {}      # original name -> fingerprinted name
+        self._pages = {}     # HTML file name -> Asset with rewritten references
+        self.load()
+
+    def load(self):
+        """(Re)load all files from ``directory``"""
+        assets, urls, pages, html = {}, {}, {}, {}
+        for root, _, files in os.walk(self.directory):
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    content = f.read()
+                if name.endswith(".html"):
+                    html[name] = content
+                    continue
+                asset = Asset(content, _content_type(name))
+                stem, ext = os.path.splitext(name)
+                fingerprinted = f"{stem}.{asset.etag.strip(chr(34))[:8]}{ext}"
+                urls[name] = fingerprinted
+                assets[name] = (asset, REVALIDATE)
+                assets[fingerprinted] = (asset, IMMUTABLE)
+
+        def rewrite(match):
+            fingerprinted = urls.get(match.group(2))
+            if fingerprinted is None:
+                return match.group(0)
+            return f"{match.group(1)}{self.prefix}/{fingerprinted}"
+
+        for name, content in html.items():
+            text = _STATIC_REF.sub(rewrite, content.decode("utf-8"))
+            page = Asset(text.encode("utf-8"), "text/html; charset=utf-8")
+            pages[name] = page
+            assets[name] = (page, REVALIDATE)
+
+        self._assets, self._urls, self._pages = assets, urls, pages
+        logger.info(
+            f"Static assets loaded from {self.directory}: {len(urls)} files, {len(pages)} pages, "
+            f"brotli {'on' if brotli is not None else 'off'}"
+        )
+
+    def url(self, name):
+        """Fingerprinted URL of an asset, e.g. url("style.css")"""
+        return f"{self.prefix}/{self._urls.get(name, name)}"
+
+    def page(self, name, request):
+        """Response with the HTML page ``name`` for a route handler"""
+        return self._pages[name].response(request.headers, REVALIDATE, request.method)
+
+    async def __call__(self, scope, receive, send):
+        # ASGI app for app.mount(prefix, ...)
+        if scope["type"] != "http":
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            response = Response(status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            path = scope["path"]
+            root_path = scope.get("root_path", "")
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            entry = self._assets.get(path.lstrip("/"))
+            if entry is None:
+                response = Response("Not Found", status_code=404, media_type="text/plain")
+            else:
+                asset, cache_control = entry
+                response = asset.response(Headers(scope=scope), cache_control, scope["method"])
+        await response(scope, receive, send)
+
+
+def _content_type(name):
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def _is_compressible(content_type):
+    return any(content_type.startswith(prefix) for prefix in ("text/", "application/javascript", "application/json", "image/svg"))
+
+
+def _pick_encoding(accept_encoding, bodies):
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+
+    for encoding in ("br", "gzip"):
+        if encoding in bodies and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
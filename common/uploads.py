@@ -0,0 +1,98 @@
+"""Record-by-record reading of uploaded CSV / NDJSON files.
+
+``read_records(request, fmt)`` parses the request body while it is still being
+received, so an import of any size needs memory only for the rows of the
+current batch. The format is taken from Content-Type:
+
+- ``text/csv``: the first line is the header with the field names,
+- ``application/x-ndjson`` (also ``application/jsonl``): one JSON object per line.
+
+Every record is yielded as ``(row, values, error)``; ``row`` counts data
+records from 1. A record that cannot be parsed has ``values=None`` and the
+reason in ``error``, so the caller can report it and go on.
+"""
+import csv
+import json
+import codecs
+
+from fastapi import HTTPException
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines")
+
+
+def upload_format(request):
+    """"csv" or "ndjson" from the Content-Type header; 415 for anything else"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in CSV_TYPES:
+        return "csv"
+    if content_type in NDJSON_TYPES:
+        return "ndjson"
+    raise HTTPException(
+        status_code=415,
+        detail=f"Unsupported Content-Type, use one of: {', '.join(CSV_TYPES + NDJSON_TYPES)}"
+    )
+
+
+async def _lines(request):
+    # UTF-8, a BOM (as written by Excel) is dropped
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def read_records(request, fmt):
+    """Async iterator of ``(row, values, error)`` for an upload in format ``fmt`` (see upload_format())"""
+    records = _csv_records(request) if fmt == "csv" else _ndjson_records(request)
+    async for record in records:
+        yield record
+
+
+async def _ndjson_records(request):
+    row = 0
+    async for line in _lines(request):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            values = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(values, dict):
+            yield row, None, "Expected a JSON object"
+            continue
+        yield row, values, None
+
+
+async def _csv_records(request):
+    header = None
+    row = 0
+    record = ""
+    async for line in _lines(request):
+        # A quoted field may contain line breaks: collect lines until the quotes are balanced
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        text, record = record.rstrip("\r"), ""
+        if not text.strip():
+            continue
+        fields = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip().lower() for name in fields]
+            continue
+        row += 1
+        if len(fields) != len(header):
+            yield row, None, f"Expected {len(header)} fields ({', '.join(header)}), got {len(fields)}"
+            continue
+        yield row, dict(zip(header, fields)), None
+    if record:
+        row += 1
+        yield row, None, "Unterminated quoted field"
@@ -0,0 +1,40 @@
+/* Library schema for the SQLite backend (DB_BACKEND=sqlite)
+   Odpowiednik schematu T-SQL z reset_db.py, dane wstawia seed_data()
+*/
+PRAGMA foreign_keys = ON;
+
+DROP TABLE IF EXISTS Loans;
+DROP TABLE IF EXISTS Books;
+DROP TABLE IF EXISTS Members;
+
+CREATE TABLE Members (
+  Id    INTEGER PRIMARY KEY AUTOINCREMENT,
+  Name  NVARCHAR(100) NOT NULL,
+  Email NVARCHAR(200) NOT NULL UNIQUE
+);
+
+CREATE TABLE Books (
+  Id     INTEGER PRIMARY KEY AUTOINCREMENT,
+  Title  NVARCHAR(200) NOT NULL,
+  Author NVARCHAR(120) NOT NULL,
+  Copies INT NOT NULL CONSTRAINT CK_Books_Copies CHECK (Copies >= 0),
+  OnLoan INT NOT NULL DEFAULT 0,
+  CONSTRAINT CK_Books_OnLoan CHECK (OnLoan >= 0 AND OnLoan <= Copies)
+);
+
+CREATE TABLE Loans (
+  Id         INTEGER PRIMARY KEY AUTOINCREMENT,
+  MemberId   INT NOT NULL CONSTRAINT FK_Loans_Members REFERENCES Members(Id) ON DELETE CASCADE,
+  BookId     INT NOT NULL CONSTRAINT FK_Loans_Books   REFERENCES Books(Id)   ON DELETE CASCADE,
+  LoanDate   DATETIME NOT NULL DEFAULT (datetime('now')),
+  DueDate    DATETIME NOT NULL,
+  ReturnDate DATETIME NULL
+);
+
+CREATE INDEX IX_Loans_Member ON Loans(MemberId, LoanDate DESC, Id DESC);
+CREATE INDEX IX_Loans_Book ON Loans(BookId, LoanDate DESC, Id DESC);
+CREATE INDEX IX_Members_Name ON Members(Name, Id);
+CREATE INDEX IX_Loans_LoanDate ON Loans(LoanDate DESC, Id DESC);
+CREATE INDEX IX_Loans_Open_LoanDate ON Loans(LoanDate DESC, Id DESC) WHERE ReturnDate IS NULL;
+CREATE INDEX IX_Loans_Open_DueDate ON Loans(DueDate) WHERE ReturnDate IS NULL;
+CREATE INDEX IX_Books_Title ON Books(Title, Author, Copies, OnLoan);
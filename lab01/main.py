@@ -1,44 +1,87 @@
 import os
-import pyodbc
-from datetime import datetime, timedelta
-from typing import Optional, List
-from fastapi import FastAPI, HTTPException, status, Request
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, status, Depends, Request, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, EmailStr, Field, ValidationError, validator
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+
+# Shared helpers (common/) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.db import ConnectionPool, PoolTimeout, db_backend, is_integrity_error
+from common.etag import TableVersions
+from common.executor import DbExecutor, Overloaded, overloaded_handler
+from common.metrics import Metrics, MetricsMiddleware
+from common.middleware import SecurityHeadersMiddleware, setup_logging
+from common.pagination import Page, page_params
+from common.responses import JSONResponse, stream_csv
+from common.search import TextIndex
+from common.static import StaticAssets
+from common.uploads import read_records, upload_format
 import logging
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Log records are written by a background thread, see common/middleware.py
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Database connection pool and the threads running queries, created once at startup
+db_pool = ConnectionPool.from_env()
+db_executor = DbExecutor.from_env(db_pool)
+
+# Request latency histograms and pool/executor gauges served by /metrics
+metrics = Metrics()
+metrics.add_collector("db_pool", db_pool.stats)
+metrics.add_collector("db_executor", db_executor.stats)
+
+# Change versions of the tables behind the cacheable GETs (ETag / 304)
+table_versions = TableVersions()
+
+# HTML pages and static files, read and compressed once at startup
+static_assets = StaticAssets("static")
+
+# Title/author search served from memory, loaded at startup and kept current by create_book
+book_index = TextIndex(("title", "author"))
+metrics.add_collector("book_search", book_index.stats)
+
+def load_book_index():
+    conn = db_pool.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT Id, Title, Author FROM dbo.Books")
+        book_index.rebuild(cursor.fetchall())
+    finally:
+        conn.close()
+    logger.info(f"Book search index loaded: {book_index.stats()['documents']} books")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db_pool.open()
+    db_executor.start()
+    load_book_index()
+    yield
+    db_executor.shutdown()
+    db_pool.close()
+
 # FastAPI app
-app = FastAPI(title="Library Management API")
-
-# Security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["Content-Security-Policy"] = "default-src 'self' 'unsafe-inline'"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    return response
-
-# Logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"{request.method} {request.url.path}")
-    response = await call_next(request)
-    logger.info(f"Status: {response.status_code}")
-    return response
+app = FastAPI(title="Library Management API", default_response_class=JSONResponse, lifespan=lifespan)
+
+# Security headers + access log (one pure ASGI layer)
+app.add_middleware(
+    SecurityHeadersMiddleware,
+    headers={
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "default-src 'self' 'unsafe-inline'",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+    },
+)
 
 # CORS
 app.add_middleware(
@@ -49,25 +92,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shed load with 503 + Retry-After when the database queue is full
+app.add_exception_handler(Overloaded, overloaded_handler)
+
+# Timing of every request (Server-Timing header + /metrics); added last so it wraps all other middleware
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Database connection
 def get_db_connection():
-    server = os.getenv('DB_SERVER', None)
-    database = os.getenv('DB_DATABASE', None)
-    driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
-    use_windows_auth = os.getenv('DB_USE_WINDOWS_AUTH', 'True').lower() == 'true'
-    
-    if use_windows_auth:
-        # Windows Authentication (Trusted Connection)
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;TrustServerCertificate=yes;'
-    else:
-        # SQL Server Authentication
-        username = os.getenv('DB_USERNAME', None)
-        password = os.getenv('DB_PASSWORD', None)
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};TrustServerCertificate=yes;'
-    
     try:
-        conn = pyodbc.connect(conn_str)
-        return conn
+        return db_pool.acquire()
+    except PoolTimeout as e:
+        logger.warning(f"Database pool exhausted: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database busy, try again later")
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -96,6 +133,15 @@ class LoanBorrow(BaseModel):
 class LoanReturn(BaseModel):
     loan_id: int = Field(..., gt=0)
 
+# Bulk operations: at most 4 parameters per loan, well below SQL Server's 2100 limit
+MAX_BULK_ITEMS = 500
+
+class BulkBorrow(BaseModel):
+    items: List[LoanBorrow] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkReturn(BaseModel):
+    items: List[LoanReturn] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
 class Loan(BaseModel):
     id: int
     member_id: int
@@ -107,35 +153,128 @@ class Loan(BaseModel):
 # API Endpoints
 
 @app.get("/")
-async def serve_index():
-    return FileResponse("static/index.html")
+async def serve_index(request: Request):
+    return static_assets.page("index.html", request)
 
 @app.get("/members")
-async def serve_members():
-    return FileResponse("static/members.html")
+async def serve_members(request: Request):
+    return static_assets.page("members.html", request)
 
 @app.get("/loans")
-async def serve_loans():
-    return FileResponse("static/loans.html")
+async def serve_loans(request: Request):
+    return static_assets.page("loans.html", request)
+
+# Bulk import: rows are validated while the upload is still streaming in and
+# written in batches with one parameter array per batch (fast_executemany);
+# each batch is its own transaction
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+def insert_rows(batch, sql, to_params, conflict):
+    """Insert validated ``[(row, model)]``; returns the rows rejected by a constraint as [(row, detail)]"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    params = [to_params(item) for _, item in batch]
+    try:
+        cursor.fast_executemany = True
+        cursor.executemany(sql, params)
+        conn.commit()
+        conn.close()
+        return []
+    except Exception as e:
+        if not is_integrity_error(e):
+            raise
+        conn.rollback()
+    
+    # Some row violates a constraint: find it row by row (a failed INSERT
+    # undoes only itself, the rest of the batch is kept)
+    cursor.fast_executemany = False
+    rejected = []
+    for (row, _), row_params in zip(batch, params):
+        try:
+            cursor.execute(sql, *row_params)
+        except Exception as e:
+            if not is_integrity_error(e):
+                raise
+            rejected.append((row, conflict))
+    conn.commit()
+    conn.close()
+    return rejected
+
+async def run_import(request, model, insert_batch):
+    """Import an uploaded CSV / NDJSON file of ``model`` rows with ``insert_batch``"""
+    fmt = upload_format(request)
+    started = time.perf_counter()
+    report = {"format": fmt, "rows": 0, "imported": 0, "failed": 0, "errors": []}
+    batch = []
+    
+    def reject(row, detail):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row, "detail": detail})
+    
+    async def flush():
+        rejected = await db_executor.run(insert_batch, batch[:])
+        report["imported"] += len(batch) - len(rejected)
+        for row, detail in rejected:
+            reject(row, detail)
+        batch.clear()
+    
+    async for row, values, error in read_records(request, fmt):
+        report["rows"] = row
+        if error:
+            reject(row, error)
+            continue
+        try:
+            batch.append((row, model(**values)))
+        except ValidationError as e:
+            reject(row, "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()))
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    
+    elapsed = time.perf_counter() - started
+    report["errors"].sort(key=lambda error: error["row"])
+    report["errors_truncated"] = report["failed"] > len(report["errors"])
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed > 0 else None
+    return report
 
 # Members API
-@app.get("/api/members", response_model=List[Member])
-async def get_members():
+@app.get("/api/members")
+@db_executor.offload
+def get_members(page: Page = Depends(page_params)):
+    after = page.after(str, int)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT Id, Name, Email FROM dbo.Members ORDER BY Name")
-        rows = cursor.fetchall()
+        
+        # Keyset seek on IX_Members_Name (Name, Id)
+        seek = "WHERE Name > ? OR (Name = ? AND Id > ?)" if after else ""
+        params = [after[0], after[0], after[1]] if after else []
+        cursor.execute(f"""
+            SELECT Id, Name, Email FROM dbo.Members
+            {seek}
+            ORDER BY Name, Id
+            OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+        """, *params, page.limit + 1)
+        rows, next_cursor = page.split(cursor.fetchall(), lambda row: (row[1], row[0]))
         conn.close()
         
         members = [{"id": row[0], "name": row[1], "email": row[2]} for row in rows]
-        return JSONResponse(content=members, headers={"Cache-Control": "no-cache"})
+        return JSONResponse(
+            content={"items": members, "next_cursor": next_cursor},
+            headers={"Cache-Control": "no-cache"}
+        )
     except Exception as e:
         logger.error(f"Error fetching members: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/members", status_code=status.HTTP_201_CREATED)
-async def create_member(member: MemberCreate):
+@db_executor.offload
+def create_member(member: MemberCreate):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -169,48 +308,99 @@ async def create_member(member: MemberCreate):
         logger.error(f"Error creating member: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.post("/api/members/import")
+async def import_members(request: Request):
+    """CSV (name,email) or NDJSON upload"""
+    def insert_members(batch):
+        # Duplicate e-mails are left to the UNIQUE constraint, no SELECT per row
+        return insert_rows(
+            batch,
+            "INSERT INTO dbo.Members (Name, Email) VALUES (?, ?)",
+            lambda member: (member.name, member.email),
+            "Email already exists"
+        )
+    
+    try:
+        report = await run_import(request, MemberCreate, insert_members)
+        return JSONResponse(content=report)
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        logger.error(f"Error importing members: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/api/members/{member_id}/loans")
+@db_executor.offload
+def get_member_loans(member_id: int, page: Page = Depends(page_params)):
+    after = page.after(datetime, int)
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Seek on IX_Loans_Member (MemberId, LoanDate, Id), newest first
+        loans, next_cursor = select_loans(cursor, ["l.MemberId = ?"], [member_id], page, after, datetime.now())
+        if not loans and after is None:
+            # An empty history or no such member
+            cursor.execute("SELECT Id FROM dbo.Members WHERE Id = ?", member_id)
+            if not cursor.fetchone():
+                conn.close()
+                raise HTTPException(status_code=404, detail="Member not found")
+        conn.close()
+        
+        return JSONResponse(
+            content={"items": loans, "next_cursor": next_cursor},
+            headers={"Cache-Control": "no-cache"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching member loans: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 # Books API
 @app.get("/api/books")
-async def get_books():
+@db_executor.offload
+def get_books(etag: str = Depends(table_versions.etag_for("Books"))):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        # OnLoan is maintained by borrow/return, so this is one scan of IX_Books_Title
         query = """
-            SELECT Id, Title, Author, Copies 
+            SELECT Id, Title, Author, Copies, Copies - OnLoan AS Available
             FROM dbo.Books 
             ORDER BY Title
         """
         cursor.execute(query)
         rows = cursor.fetchall()
+        conn.close()
         
-        # Get available copies for each book
         books = []
         for row in rows:
-            book_id = row[0]
-            cursor.execute(
-                "SELECT COUNT(*) FROM dbo.Loans WHERE BookId = ? AND ReturnDate IS NULL",
-                book_id
-            )
-            borrowed = cursor.fetchone()[0] # type: ignore
-            available = row[3] - borrowed
-            
             books.append({
-                "id": book_id,
+                "id": row[0],
                 "title": row[1],
                 "author": row[2],
                 "copies": row[3],
-                "available": available
+                "available": row[4]
             })
         
-        conn.close()
-        return JSONResponse(content=books, headers={"Cache-Control": "public, max-age=60"})
+        return JSONResponse(content=books, headers={"Cache-Control": "no-cache", "ETag": etag})
     except Exception as e:
         logger.error(f"Error fetching books: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.get("/api/books/search")
+async def search_books(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    # In-memory index, no database round trip
+    return JSONResponse(content=book_index.search(q, limit), headers={"Cache-Control": "no-cache"})
+
 @app.post("/api/books", status_code=status.HTTP_201_CREATED)
-async def create_book(book: BookCreate):
+@db_executor.offload
+def create_book(book: BookCreate):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -221,6 +411,8 @@ async def create_book(book: BookCreate):
         )
         book_id = cursor.fetchone()[0] # type: ignore
         conn.commit()
+        table_versions.bump("Books")
+        book_index.add(book_id, title=book.title, author=book.author)
         conn.close()
         
         return JSONResponse(
@@ -235,92 +427,221 @@ async def create_book(book: BookCreate):
         logger.error(f"Error creating book: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.post("/api/books/import")
+async def import_books(request: Request):
+    """CSV (title,author,copies) or NDJSON upload"""
+    def insert_books(batch):
+        return insert_rows(
+            batch,
+            "INSERT INTO dbo.Books (Title, Author, Copies) VALUES (?, ?, ?)",
+            lambda book: (book.title, book.author, book.copies),
+            "Constraint violation"
+        )
+    
+    def last_book_id():
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT ISNULL(MAX(Id), 0) FROM dbo.Books")
+        book_id = cursor.fetchone()[0] # type: ignore
+        conn.close()
+        return book_id
+    
+    def index_books_after(book_id):
+        # executemany returns no ids: pick up the new rows for the search index
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT Id, Title, Author FROM dbo.Books WHERE Id > ?", book_id)
+        for row in cursor.fetchall():
+            book_index.add(row[0], title=row[1], author=row[2])
+        conn.close()
+    
+    try:
+        since = await db_executor.run(last_book_id)
+        try:
+            report = await run_import(request, BookCreate, insert_books)
+        finally:
+            # Also after a failure: the batches committed so far are visible
+            table_versions.bump("Books")
+            await db_executor.run(index_books_after, since)
+        return JSONResponse(content=report)
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        logger.error(f"Error importing books: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 # Loans API
+
+# A copy is reserved with a conditional UPDATE of the book's OnLoan counter;
+# the row lock it takes makes concurrent borrowers of the same title wait for
+# each other, so copies are never oversubscribed. The loan is inserted only
+# when the reservation succeeded.
+RESERVE_COPY_SQL = """
+    UPDATE dbo.Books SET OnLoan = OnLoan + 1
+    WHERE Id = ? AND OnLoan < Copies
+      AND EXISTS (SELECT 1 FROM dbo.Members WHERE Id = ?)
+"""
+
+# SQL Server: reservation and insert as one batch, i.e. one round trip
+BORROW_BATCH_SQL = f"""
+    SET NOCOUNT ON;
+    DECLARE @LoanId INT = NULL;
+    {RESERVE_COPY_SQL};
+    IF @@ROWCOUNT = 1
+    BEGIN
+        INSERT INTO dbo.Loans (MemberId, BookId, LoanDate, DueDate) VALUES (?, ?, ?, ?);
+        SET @LoanId = SCOPE_IDENTITY();
+    END
+    SELECT @LoanId;
+"""
+
+def insert_loan(cursor, member_id, book_id, loan_date, due_date):
+    """Reserve a copy and insert the loan (not committed); None when the member
+    or book does not exist or no copy is available"""
+    if db_backend() == 'sqlite':
+        # Writers are serialized by the database lock taken by the UPDATE
+        cursor.execute(RESERVE_COPY_SQL, book_id, member_id)
+        if cursor.rowcount != 1:
+            return None
+        cursor.execute(
+            """INSERT INTO dbo.Loans (MemberId, BookId, LoanDate, DueDate) 
+               OUTPUT INSERTED.Id 
+               VALUES (?, ?, ?, ?)""",
+            member_id, book_id, loan_date, due_date
+        )
+        return cursor.fetchone()[0] # type: ignore
+    
+    cursor.execute(BORROW_BATCH_SQL, book_id, member_id, member_id, book_id, loan_date, due_date)
+    return cursor.fetchone()[0] # type: ignore
+
+def select_loans(cursor, conditions, params, page, after, now):
+    """One page of loans matching ``conditions`` (SQL with ``params``), newest first; returns (loans, next_cursor)"""
+    conditions = list(conditions)
+    params = list(params)
+    # Keyset seek on (LoanDate, Id), newest first
+    if after:
+        conditions.append("(l.LoanDate < ? OR (l.LoanDate = ? AND l.Id < ?))")
+        params.extend([after[0], after[0], after[1]])
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    
+    query = f"""
+        SELECT 
+            l.Id, l.MemberId, l.BookId, 
+            CONVERT(VARCHAR(10), l.LoanDate, 23) as LoanDate,
+            CONVERT(VARCHAR(10), l.DueDate, 23) as DueDate,
+            CONVERT(VARCHAR(10), l.ReturnDate, 23) as ReturnDate,
+            m.Name as MemberName,
+            b.Title as BookTitle,
+            l.LoanDate as LoanTime,
+            CASE WHEN l.ReturnDate IS NULL AND l.DueDate < ? THEN 1
+                 WHEN l.ReturnDate > l.DueDate THEN 1
+                 ELSE 0 END as Overdue
+        FROM dbo.Loans l
+        JOIN dbo.Members m ON l.MemberId = m.Id
+        JOIN dbo.Books b ON l.BookId = b.Id
+        {where}
+        ORDER BY l.LoanDate DESC, l.Id DESC
+        OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+    """
+    cursor.execute(query, now, *params, page.limit + 1)
+    rows, next_cursor = page.split(cursor.fetchall(), lambda row: (row[8], row[0]))
+    
+    loans = []
+    for row in rows:
+        loans.append({
+            "id": row[0],
+            "member_id": row[1],
+            "book_id": row[2],
+            "loan_date": row[3],
+            "due_date": row[4],
+            "return_date": row[5] if row[5] else None,
+            "member_name": row[6],
+            "book_title": row[7],
+            # Open and past the due date, or returned after it
+            "overdue": bool(row[9])
+        })
+    return loans, next_cursor
+
 @app.get("/api/loans")
-async def get_loans():
+@db_executor.offload
+def get_loans(
+    loan_status: Optional[str] = Query(None, alias="status", pattern="^(active|returned|overdue)$"),
+    member_id: Optional[int] = Query(None, gt=0),
+    book_id: Optional[int] = Query(None, gt=0),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    page: Page = Depends(page_params),
+):
+    after = page.after(datetime, int)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        query = """
-            SELECT 
-                l.Id, l.MemberId, l.BookId, 
-                CONVERT(VARCHAR(10), l.LoanDate, 23) as LoanDate,
-                CONVERT(VARCHAR(10), l.DueDate, 23) as DueDate,
-                CONVERT(VARCHAR(10), l.ReturnDate, 23) as ReturnDate,
-                m.Name as MemberName,
-                b.Title as BookTitle
-            FROM dbo.Loans l
-            JOIN dbo.Members m ON l.MemberId = m.Id
-            JOIN dbo.Books b ON l.BookId = b.Id
-            ORDER BY l.LoanDate DESC
-        """
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
+        now = datetime.now()
+        # Filters are evaluated in SQL; the open-loan ones match the filtered
+        # indexes IX_Loans_Open_LoanDate / IX_Loans_Open_DueDate
+        conditions = []
+        params = []
+        if loan_status == "active":
+            conditions.append("l.ReturnDate IS NULL")
+        elif loan_status == "returned":
+            conditions.append("l.ReturnDate IS NOT NULL")
+        elif loan_status == "overdue":
+            conditions.append("l.ReturnDate IS NULL AND l.DueDate < ?")
+            params.append(now)
+        if member_id is not None:
+            conditions.append("l.MemberId = ?")
+            params.append(member_id)
+        if book_id is not None:
+            conditions.append("l.BookId = ?")
+            params.append(book_id)
+        if date_from is not None:
+            conditions.append("l.LoanDate >= ?")
+            params.append(datetime.combine(date_from, datetime.min.time()))
+        if date_to is not None:
+            # Inclusive: everything before the start of the next day
+            conditions.append("l.LoanDate < ?")
+            params.append(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
         
-        loans = []
-        for row in rows:
-            loans.append({
-                "id": row[0],
-                "member_id": row[1],
-                "book_id": row[2],
-                "loan_date": row[3],
-                "due_date": row[4],
-                "return_date": row[5] if row[5] else None,
-                "member_name": row[6],
-                "book_title": row[7]
-            })
+        loans, next_cursor = select_loans(cursor, conditions, params, page, after, now)
+        conn.close()
         
-        return JSONResponse(content=loans, headers={"Cache-Control": "no-cache"})
+        return JSONResponse(
+            content={"items": loans, "next_cursor": next_cursor},
+            headers={"Cache-Control": "no-cache"}
+        )
     except Exception as e:
         logger.error(f"Error fetching loans: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/loans/borrow", status_code=status.HTTP_201_CREATED)
-async def borrow_book(loan: LoanBorrow):
+@db_executor.offload
+def borrow_book(loan: LoanBorrow):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Check if member exists
-        cursor.execute("SELECT Id FROM dbo.Members WHERE Id = ?", loan.member_id)
-        if not cursor.fetchone():
-            conn.close()
-            raise HTTPException(status_code=404, detail="Member not found")
-        
-        # Check if book exists
-        cursor.execute("SELECT Copies FROM dbo.Books WHERE Id = ?", loan.book_id)
-        book_row = cursor.fetchone()
-        if not book_row:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Book not found")
-        
-        total_copies = book_row[0]
-        
-        # Check availability
-        cursor.execute(
-            "SELECT COUNT(*) FROM dbo.Loans WHERE BookId = ? AND ReturnDate IS NULL",
-            loan.book_id
-        )
-        borrowed_count = cursor.fetchone()[0] # type: ignore
+        loan_date = datetime.now()
+        due_date = loan_date + timedelta(days=loan.days)
         
-        if borrowed_count >= total_copies:
+        loan_id = insert_loan(cursor, loan.member_id, loan.book_id, loan_date, due_date)
+        if loan_id is None:
+            # Nothing was written; find out why (only on this path)
+            cursor.execute(
+                """SELECT (SELECT COUNT(*) FROM dbo.Members WHERE Id = ?),
+                          (SELECT COUNT(*) FROM dbo.Books WHERE Id = ?)""",
+                loan.member_id, loan.book_id
+            )
+            member_found, book_found = cursor.fetchone() # type: ignore
             conn.close()
+            if not member_found:
+                raise HTTPException(status_code=404, detail="Member not found")
+            if not book_found:
+                raise HTTPException(status_code=404, detail="Book not found")
             raise HTTPException(status_code=409, detail="No copies available")
         
-        # Create loan
-        loan_date = datetime.now()
-        due_date = loan_date + timedelta(days=loan.days)
-        
-        cursor.execute(
-            """INSERT INTO dbo.Loans (MemberId, BookId, LoanDate, DueDate) 
-               OUTPUT INSERTED.Id 
-               VALUES (?, ?, ?, ?)""",
-            loan.member_id, loan.book_id, loan_date, due_date
-        )
-        loan_id = cursor.fetchone()[0] # type: ignore
-        conn.commit() 
+        conn.commit()
+        table_versions.bump("Loans", "Books")
         conn.close()
         
         return JSONResponse(
@@ -344,14 +665,15 @@ async def borrow_book(loan: LoanBorrow):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/loans/return")
-async def return_book(loan_return: LoanReturn):
+@db_executor.offload
+def return_book(loan_return: LoanReturn):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
         # Check if loan exists and is not returned
         cursor.execute(
-            "SELECT Id, ReturnDate FROM dbo.Loans WHERE Id = ?",
+            "SELECT Id, ReturnDate, BookId FROM dbo.Loans WHERE Id = ?",
             loan_return.loan_id
         )
         loan_row = cursor.fetchone()
@@ -367,10 +689,16 @@ async def return_book(loan_return: LoanReturn):
         # Update return date
         return_date = datetime.now()
         cursor.execute(
-            "UPDATE dbo.Loans SET ReturnDate = ? WHERE Id = ?",
+            "UPDATE dbo.Loans SET ReturnDate = ? WHERE Id = ? AND ReturnDate IS NULL",
             return_date, loan_return.loan_id
         )
+        if cursor.rowcount == 0:
+            # Returned by a concurrent request in the meantime
+            conn.close()
+            raise HTTPException(status_code=409, detail="Book already returned")
+        cursor.execute("UPDATE dbo.Books SET OnLoan = OnLoan - 1 WHERE Id = ?", loan_row[2])
         conn.commit()
+        table_versions.bump("Loans", "Books")
         conn.close()
         
         return JSONResponse(
@@ -387,8 +715,218 @@ async def return_book(loan_return: LoanReturn):
         logger.error(f"Error returning book: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Bulk circulation: the whole batch is one transaction with a fixed number of
+# statements (lock/read, one multi-row write, one counter update, commit);
+# items that cannot be applied are reported and skipped, the rest is committed
+
+def placeholders(values):
+    return ", ".join("?" * len(values))
+
+def on_loan_delta_sql(deltas):
+    """UPDATE adding ``deltas`` ({book id: change}) to the OnLoan counters, with its parameters"""
+    cases = " ".join("WHEN ? THEN ?" for _ in deltas)
+    params = [value for item in deltas.items() for value in item]
+    return (
+        f"UPDATE dbo.Books SET OnLoan = OnLoan + CASE Id {cases} ELSE 0 END WHERE Id IN ({placeholders(deltas)})",
+        params + list(deltas)
+    )
+
+def bulk_result(results):
+    succeeded = sum(1 for result in results if result["status"] < 400)
+    return JSONResponse(
+        content={"results": results, "succeeded": succeeded, "failed": len(results) - succeeded},
+        headers={"Content-Type": "application/json"}
+    )
+
+@app.post("/api/loans/borrow/bulk")
+@db_executor.offload
+def borrow_books_bulk(bulk: BulkBorrow):
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        member_ids = sorted({item.member_id for item in bulk.items})
+        book_ids = sorted({item.book_id for item in bulk.items})
+        
+        if db_backend() == 'sqlite':
+            # Take the write lock before reading the counters
+            cursor.execute("BEGIN IMMEDIATE")
+        # The book rows stay locked until the commit, so no concurrent borrow
+        # can take the copies counted here
+        cursor.execute(
+            f"SELECT Id, Copies - OnLoan FROM dbo.Books WITH (UPDLOCK, HOLDLOCK) WHERE Id IN ({placeholders(book_ids)})",
+            *book_ids
+        )
+        available = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.execute(f"SELECT Id FROM dbo.Members WHERE Id IN ({placeholders(member_ids)})", *member_ids)
+        members = {row[0] for row in cursor.fetchall()}
+        
+        # Copies are granted in request order. Whole seconds, so the dates
+        # read back from DATETIME2(0) compare equal
+        loan_date = datetime.now().replace(microsecond=0)
+        results = []
+        granted = []
+        for index, item in enumerate(bulk.items):
+            if item.member_id not in members:
+                results.append({"index": index, "status": 404, "detail": "Member not found"})
+            elif item.book_id not in available:
+                results.append({"index": index, "status": 404, "detail": "Book not found"})
+            elif available[item.book_id] <= 0:
+                results.append({"index": index, "status": 409, "detail": "No copies available"})
+            else:
+                available[item.book_id] -= 1
+                due_date = loan_date + timedelta(days=item.days)
+                results.append({
+                    "index": index,
+                    "status": 201,
+                    "member_id": item.member_id,
+                    "book_id": item.book_id,
+                    "loan_date": loan_date.strftime("%Y-%m-%d"),
+                    "due_date": due_date.strftime("%Y-%m-%d")
+                })
+                granted.append((results[-1], item, due_date))
+        
+        if granted:
+            values = ", ".join("(?, ?, ?, ?)" for _ in granted)
+            params = [value for _, item, due_date in granted for value in (item.member_id, item.book_id, loan_date, due_date)]
+            cursor.execute(
+                f"""INSERT INTO dbo.Loans (MemberId, BookId, LoanDate, DueDate) 
+                    OUTPUT INSERTED.Id, INSERTED.MemberId, INSERTED.BookId, INSERTED.DueDate 
+                    VALUES {values}""",
+                *params
+            )
+            # The order of OUTPUT rows is not guaranteed; rows with the same
+            # member, book and due date are interchangeable
+            loan_ids = {}
+            for row in cursor.fetchall():
+                loan_ids.setdefault((row[1], row[2], row[3]), []).append(row[0])
+            
+            deltas = {}
+            for result, item, due_date in granted:
+                result["id"] = loan_ids[(item.member_id, item.book_id, due_date)].pop()
+                deltas[item.book_id] = deltas.get(item.book_id, 0) + 1
+            cursor.execute(*on_loan_delta_sql(deltas))
+            conn.commit()
+            table_versions.bump("Loans", "Books")
+        conn.close()
+        
+        return bulk_result(results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error borrowing books in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/api/loans/return/bulk")
+@db_executor.offload
+def return_books_bulk(bulk: BulkReturn):
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Close all open loans of the batch at once; the UPDATE reports which ones it closed
+        loan_ids = sorted({item.loan_id for item in bulk.items})
+        return_date = datetime.now()
+        cursor.execute(
+            f"""UPDATE dbo.Loans SET ReturnDate = ? 
+                OUTPUT INSERTED.Id, INSERTED.BookId 
+                WHERE Id IN ({placeholders(loan_ids)}) AND ReturnDate IS NULL""",
+            return_date, *loan_ids
+        )
+        returned = {row[0]: row[1] for row in cursor.fetchall()}
+        
+        # Tell "already returned" from "not found" for the rest
+        existing = set()
+        missing = [loan_id for loan_id in loan_ids if loan_id not in returned]
+        if missing:
+            cursor.execute(f"SELECT Id FROM dbo.Loans WHERE Id IN ({placeholders(missing)})", *missing)
+            existing = {row[0] for row in cursor.fetchall()}
+        
+        results = []
+        seen = set()
+        deltas = {}
+        for index, item in enumerate(bulk.items):
+            if item.loan_id in returned and item.loan_id not in seen:
+                seen.add(item.loan_id)
+                book_id = returned[item.loan_id]
+                deltas[book_id] = deltas.get(book_id, 0) - 1
+                results.append({
+                    "index": index,
+                    "status": 200,
+                    "id": item.loan_id,
+                    "return_date": return_date.strftime("%Y-%m-%d")
+                })
+            elif item.loan_id in returned or item.loan_id in existing:
+                results.append({"index": index, "status": 409, "detail": "Book already returned"})
+            else:
+                results.append({"index": index, "status": 404, "detail": "Loan not found"})
+        
+        if deltas:
+            cursor.execute(*on_loan_delta_sql(deltas))
+            conn.commit()
+            table_versions.bump("Loans", "Books")
+        conn.close()
+        
+        return bulk_result(results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error returning books in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Reports
+@app.get("/api/reports/overdue")
+@db_executor.offload
+def get_overdue_report():
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Aggregated from IX_Loans_Open_DueDate (open loans only, MemberId included)
+        today = datetime.now()
+        cursor.execute(
+            """SELECT m.Id, m.Name, m.Email,
+                      COUNT(*) AS OverdueLoans,
+                      SUM(DATEDIFF(day, l.DueDate, ?)) AS DaysLateTotal,
+                      MAX(DATEDIFF(day, l.DueDate, ?)) AS DaysLateMax,
+                      MIN(CONVERT(VARCHAR(10), l.DueDate, 23)) AS OldestDueDate
+               FROM dbo.Loans l
+               JOIN dbo.Members m ON m.Id = l.MemberId
+               WHERE l.ReturnDate IS NULL AND l.DueDate < ?
+               GROUP BY m.Id, m.Name, m.Email
+               ORDER BY DaysLateMax DESC, m.Id""",
+            today, today, today
+        )
+        
+        # Sent while it is being read, the report is never held in memory as a whole
+        return stream_csv(
+            conn, cursor,
+            header=("member_id", "name", "email", "overdue_loans", "days_late_total", "days_late_max", "oldest_due_date"),
+            executor=db_executor,
+            headers={
+                "Cache-Control": "no-store",
+                "Content-Disposition": f'attachment; filename="overdue-{today.strftime("%Y-%m-%d")}.csv"'
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error building overdue report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Diagnostics
+@app.get("/api/db/pool")
+async def get_pool_stats():
+    return JSONResponse(content=db_pool.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/api/db/executor")
+async def get_executor_stats():
+    return JSONResponse(content=db_executor.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), headers={"Cache-Control": "no-store"})
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", static_assets, name="static")
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,8 +1,12 @@
 import os
-import pyodbc
+import sys
 from dotenv import load_dotenv
 import logging
 
+# Shared helpers (common/) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.db import connect_from_env, db_backend
+
 # Load environment variables
 load_dotenv()
 
@@ -14,21 +18,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def get_db_connection():
-    server = os.getenv('DB_SERVER', None)
-    database = os.getenv('DB_DATABASE', None)
-    driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
-    use_windows_auth = os.getenv('DB_USE_WINDOWS_AUTH', 'True').lower() == 'true'
-    
-    if use_windows_auth:
-        # Windows Authentication (Trusted Connection)
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;TrustServerCertificate=yes;'
-    else:
-        # SQL Server Authentication
-        username = os.getenv('DB_USERNAME', None)
-        password = os.getenv('DB_PASSWORD', None)
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};TrustServerCertificate=yes;'
-    
-    return pyodbc.connect(conn_str)
+    return connect_from_env()
 
 def create_schema():
     """Create database schema"""
@@ -37,6 +27,14 @@ def create_schema():
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    if db_backend() == 'sqlite':
+        # SQLite version of the schema below
+        with open('Library_Schema.sqlite.sql', 'r', encoding='utf-8') as f:
+            conn.executescript(f.read())
+        conn.close()
+        logger.info("Schema created successfully!")
+        return
+    
     # Drop tables if exist (in reverse order due to foreign keys)
     logger.info("Dropping existing tables...")
     cursor.execute("IF OBJECT_ID('dbo.Loans', 'U') IS NOT NULL DROP TABLE dbo.Loans")
@@ -62,7 +60,10 @@ def create_schema():
             Id       INT IDENTITY(1,1) PRIMARY KEY,
             Title    NVARCHAR(200) NOT NULL,
             Author   NVARCHAR(120) NOT NULL,
-            Copies   INT NOT NULL CONSTRAINT CK_Books_Copies CHECK (Copies >= 0)
+            Copies   INT NOT NULL CONSTRAINT CK_Books_Copies CHECK (Copies >= 0),
+            -- Open loans of the book, kept up to date by borrow/return
+            OnLoan   INT NOT NULL CONSTRAINT DF_Books_OnLoan DEFAULT (0),
+            CONSTRAINT CK_Books_OnLoan CHECK (OnLoan >= 0 AND OnLoan <= Copies)
         )
     """)
     conn.commit()
@@ -83,8 +84,16 @@ def create_schema():
     
     # Create indexes
     logger.info("Creating indexes...")
-    cursor.execute("CREATE INDEX IX_Loans_Member ON dbo.Loans(MemberId)")
-    cursor.execute("CREATE INDEX IX_Loans_Book ON dbo.Loans(BookId) INCLUDE(ReturnDate)")
+    cursor.execute("CREATE INDEX IX_Loans_Member ON dbo.Loans(MemberId, LoanDate DESC, Id DESC)")
+    cursor.execute("CREATE INDEX IX_Loans_Book ON dbo.Loans(BookId, LoanDate DESC, Id DESC) INCLUDE(ReturnDate)")
+    # Keyset pagination: sort columns + Id tiebreaker
+    cursor.execute("CREATE INDEX IX_Members_Name ON dbo.Members(Name, Id)")
+    cursor.execute("CREATE INDEX IX_Loans_LoanDate ON dbo.Loans(LoanDate DESC, Id DESC)")
+    # Loan filters: open loans only (status=active / overdue), small compared to the history
+    cursor.execute("CREATE INDEX IX_Loans_Open_LoanDate ON dbo.Loans(LoanDate DESC, Id DESC) WHERE ReturnDate IS NULL")
+    cursor.execute("CREATE INDEX IX_Loans_Open_DueDate ON dbo.Loans(DueDate) INCLUDE(MemberId, BookId, LoanDate) WHERE ReturnDate IS NULL")
+    # Book list: one ordered scan, availability is Copies - OnLoan
+    cursor.execute("CREATE INDEX IX_Books_Title ON dbo.Books(Title) INCLUDE(Author, Copies, OnLoan)")
     conn.commit()
     
     conn.close()
@@ -145,6 +154,12 @@ def seed_data():
         INSERT INTO dbo.Loans (MemberId, BookId, LoanDate, DueDate) 
         VALUES (3, 8, DATEADD(day, -5, GETDATE()), DATEADD(day, 9, GETDATE()))
     """)
+    # Loans were inserted directly, bring the OnLoan counters in line
+    cursor.execute("""
+        UPDATE dbo.Books SET OnLoan = (
+            SELECT COUNT(*) FROM dbo.Loans l WHERE l.BookId = dbo.Books.Id AND l.ReturnDate IS NULL
+        )
+    """)
     conn.commit()
     
     conn.close()
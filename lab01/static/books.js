@@ -1,15 +1,39 @@
+let booksData = [];
+let searchTimer = null;
+
 async function loadBooks() {
     try {
         const response = await fetch('/api/books');
         if (!response.ok) throw new Error('Nie udało się pobrać książek');
         
-        const books = await response.json();
-        displayBooks(books);
+        booksData = await response.json();
+        searchBooks();
     } catch (error) {
         showNotification('Błąd podczas ładowania książek: ' + error.message, 'error');
     }
 }
 
+// Matching is done by the server (diacritics are ignored: "wisniewski" finds "Wiśniewski")
+async function searchBooks() {
+    const query = document.getElementById('bookSearch').value.trim();
+    if (query.length < 2) {
+        displayBooks(booksData);
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/api/books/search?q=${encodeURIComponent(query)}&limit=50`);
+        if (!response.ok) throw new Error('Wyszukiwanie nie powiodło się');
+        
+        const results = await response.json();
+        // Copies and availability come from the full list
+        const byId = new Map(booksData.map(book => [book.id, book]));
+        displayBooks(results.map(result => byId.get(result.id)).filter(Boolean));
+    } catch (error) {
+        showNotification('Błąd: ' + error.message, 'error');
+    }
+}
+
 function displayBooks(books) {
     const container = document.getElementById('booksContainer');
     
@@ -34,10 +58,19 @@ function displayBooks(books) {
 
 async function loadMembers() {
     try {
-        const response = await fetch('/api/members');
-        if (!response.ok) throw new Error('Nie udało się pobrać członków');
+        // The select needs every member: walk all pages, 500 at a time
+        let members = [];
+        let cursor = null;
+        do {
+            const url = '/api/members?limit=500' + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+            const response = await fetch(url);
+            if (!response.ok) throw new Error('Nie udało się pobrać członków');
+            
+            const page = await response.json();
+            members = members.concat(page.items);
+            cursor = page.next_cursor;
+        } while (cursor);
         
-        const members = await response.json();
         const select = document.getElementById('borrowMember');
         
         select.innerHTML = '<option value="">Wybierz członka...</option>' +
@@ -65,6 +98,11 @@ async function loadBooksForBorrow() {
     }
 }
 
+document.getElementById('bookSearch').addEventListener('input', () => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(searchBooks, 150);
+});
+
 document.getElementById('addBookForm').addEventListener('submit', async (e) => {
     e.preventDefault();
     
@@ -1,17 +1,38 @@
-async function loadActiveLoans() {
+// Each list is filtered and paged by the server
+const lists = {
+    active: { items: [], nextCursor: null, display: displayActiveLoans },
+    returned: { items: [], nextCursor: null, display: displayReturnedLoans }
+};
+
+// Loads the first page of a list, or the next one when called with a cursor
+async function loadLoanList(status, cursor = null) {
+    const list = lists[status];
     try {
-        const response = await fetch('/api/loans');
+        let url = `/api/loans?status=${status}`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+        const response = await fetch(url);
         if (!response.ok) throw new Error('Nie udało się pobrać wypożyczeń');
         
-        const loans = await response.json();
-        const activeLoans = loans.filter(l => !l.return_date);
-        
-        displayActiveLoans(activeLoans);
+        const page = await response.json();
+        list.items = cursor ? list.items.concat(page.items) : page.items;
+        list.nextCursor = page.next_cursor;
+        list.display(list.items);
     } catch (error) {
-        showNotification('Błąd podczas ładowania aktywnych wypożyczeń: ' + error.message, 'error');
+        showNotification('Błąd podczas ładowania wypożyczeń: ' + error.message, 'error');
     }
 }
 
+function loadLoans() {
+    loadLoanList('active');
+    loadLoanList('returned');
+}
+
+function loadMoreButton(status) {
+    return lists[status].nextCursor
+        ? `<div class="load-more"><button class="btn btn-secondary" onclick="loadLoanList('${status}', lists.${status}.nextCursor)">Pokaż więcej</button></div>`
+        : '';
+}
+
 function displayActiveLoans(loans) {
     const container = document.getElementById('activeLoansContainer');
     
@@ -41,7 +62,11 @@ function displayActiveLoans(loans) {
                         <td>${escapeHtml(loan.book_title)}</td>
                         <td>${loan.loan_date}</td>
                         <td>${loan.due_date}</td>
-                        <td><span class="badge badge-active">Aktywne</span></td>
+                        <td>
+                            <span class="badge ${loan.overdue ? 'badge-overdue' : 'badge-active'}">
+                                ${loan.overdue ? 'Przeterminowane' : 'Aktywne'}
+                            </span>
+                        </td>
                         <td>
                             <button onclick="returnBook(${loan.id})" class="btn btn-success btn-small">
                                 Zwróć
@@ -51,22 +76,10 @@ function displayActiveLoans(loans) {
                 `).join('')}
             </tbody>
         </table>
+        ${loadMoreButton('active')}
     `;
 }
 
-async function loadReturnedLoans() {
-    try {
-        const response = await fetch('/api/loans');
-        if (!response.ok) throw new Error('Nie udało się pobrać wypożyczeń');
-        
-        const loans = await response.json();
-        const returnedLoans = loans.filter(l => l.return_date);
-        displayReturnedLoans(returnedLoans);
-    } catch (error) {
-        showNotification('Błąd podczas ładowania zwróconych wypożyczeń: ' + error.message, 'error');
-    }
-}
-
 function displayReturnedLoans(loans) {
     const container = document.getElementById('returnedLoansContainer');
     
@@ -90,7 +103,7 @@ function displayReturnedLoans(loans) {
             </thead>
             <tbody>
                 ${loans.map(loan => {
-                    const wasLate = loan.return_date > loan.due_date;
+                    const wasLate = loan.overdue;
                     return `
                         <tr>
                             <td>${loan.id}</td>
@@ -109,6 +122,7 @@ function displayReturnedLoans(loans) {
                 }).join('')}
             </tbody>
         </table>
+        ${loadMoreButton('returned')}
     `;
 }
 
@@ -130,8 +144,7 @@ async function returnBook(loanId) {
         }
         
         showNotification('Książka została zwrócona pomyślnie!', 'success');
-        loadActiveLoans();
-        loadReturnedLoans();
+        loadLoans();
     } catch (error) {
         showNotification('Błąd: ' + error.message, 'error');
     }
@@ -154,5 +167,4 @@ function escapeHtml(text) {
 }
 
 // Initialize
-loadActiveLoans();
-loadReturnedLoans();
+loadLoans();
@@ -1,10 +1,17 @@
-async function loadMembers() {
+let membersData = [];
+let nextCursor = null;
+
+// Loads the first page, or the next one when called with a cursor
+async function loadMembers(cursor = null) {
     try {
-        const response = await fetch('/api/members');
+        const url = cursor ? `/api/members?cursor=${encodeURIComponent(cursor)}` : '/api/members';
+        const response = await fetch(url);
         if (!response.ok) throw new Error('Nie udało się pobrać członków');
         
-        const members = await response.json();
-        displayMembers(members);
+        const page = await response.json();
+        membersData = cursor ? membersData.concat(page.items) : page.items;
+        nextCursor = page.next_cursor;
+        displayMembers(membersData);
     } catch (error) {
         showNotification('Błąd podczas ładowania członków: ' + error.message, 'error');
     }
@@ -37,6 +44,7 @@ function displayMembers(members) {
                 `).join('')}
             </tbody>
         </table>
+        ${nextCursor ? `<div class="load-more"><button class="btn btn-secondary" onclick="loadMembers(nextCursor)">Pokaż więcej</button></div>` : ''}
     `;
 }
 
@@ -3,6 +3,8 @@
 */
 SET NOCOUNT ON;
 
+IF OBJECT_ID('dbo.ProductSales', 'U') IS NOT NULL DROP TABLE dbo.ProductSales;
+IF OBJECT_ID('dbo.SalesDaily', 'U') IS NOT NULL DROP TABLE dbo.SalesDaily;
 IF OBJECT_ID('dbo.OrderItems', 'U') IS NOT NULL DROP TABLE dbo.OrderItems;
 IF OBJECT_ID('dbo.Orders', 'U') IS NOT NULL DROP TABLE dbo.Orders;
 IF OBJECT_ID('dbo.Products', 'U') IS NOT NULL DROP TABLE dbo.Products;
@@ -10,12 +12,14 @@ IF OBJECT_ID('dbo.Products', 'U') IS NOT NULL DROP TABLE dbo.Products;
 CREATE TABLE dbo.Products (
   Id    INT IDENTITY(1,1) PRIMARY KEY,
   Name  NVARCHAR(120) NOT NULL,
-  Price DECIMAL(12,2) NOT NULL CONSTRAINT CK_Products_Price CHECK (Price >= 0)
+  Price DECIMAL(12,2) NOT NULL CONSTRAINT CK_Products_Price CHECK (Price >= 0),
+  Stock INT NULL CONSTRAINT CK_Products_Stock CHECK (Stock >= 0)
 );
 
 CREATE TABLE dbo.Orders (
   Id        INT IDENTITY(1,1) PRIMARY KEY,
-  CreatedAt DATETIME2(0) NOT NULL CONSTRAINT DF_Orders_CreatedAt DEFAULT (SYSUTCDATETIME())
+  CreatedAt DATETIME2(0) NOT NULL CONSTRAINT DF_Orders_CreatedAt DEFAULT (SYSUTCDATETIME()),
+  Total     DECIMAL(14,2) NOT NULL CONSTRAINT DF_Orders_Total DEFAULT (0)
 );
 
 CREATE TABLE dbo.OrderItems (
@@ -26,7 +30,29 @@ CREATE TABLE dbo.OrderItems (
   Price     DECIMAL(12,2) NOT NULL
 );
 
+-- Rollups for the reports, updated by checkout in the order's transaction.
+-- SalesDaily: up to 8 rows per day (Bucket = order id % 8) to spread the row locks
+CREATE TABLE dbo.SalesDaily (
+  Day        DATE NOT NULL,
+  Bucket     TINYINT NOT NULL,
+  OrderCount INT NOT NULL,
+  Units      INT NOT NULL,
+  Revenue    DECIMAL(16,2) NOT NULL,
+  CONSTRAINT PK_SalesDaily PRIMARY KEY (Day, Bucket)
+);
+
+CREATE TABLE dbo.ProductSales (
+  ProductId INT NOT NULL CONSTRAINT PK_ProductSales PRIMARY KEY
+            CONSTRAINT FK_ProductSales_Products FOREIGN KEY REFERENCES dbo.Products(Id),
+  Units     INT NOT NULL,
+  Revenue   DECIMAL(16,2) NOT NULL
+);
+
 CREATE INDEX IX_OrderItems_Order ON dbo.OrderItems(OrderId) INCLUDE(Qty, Price);
+CREATE INDEX IX_Products_Name ON dbo.Products(Name, Id) INCLUDE(Price, Stock);
+CREATE INDEX IX_Products_Price ON dbo.Products(Price, Id) INCLUDE(Name, Stock);
+CREATE INDEX IX_ProductSales_Units ON dbo.ProductSales(Units DESC, ProductId) INCLUDE(Revenue);
+CREATE INDEX IX_ProductSales_Revenue ON dbo.ProductSales(Revenue DESC, ProductId) INCLUDE(Units);
 
 -- Seed
 INSERT INTO dbo.Products(Name, Price) VALUES
@@ -52,6 +78,20 @@ FROM @Cart AS c
 JOIN dbo.Products AS p ON p.Id = c.ProductId;
 
 -- Total
-SELECT OrderId = @Id, Total = SUM(Qty*Price) FROM dbo.OrderItems WHERE OrderId = @Id;
+UPDATE dbo.Orders SET Total = (SELECT SUM(Qty*Price) FROM dbo.OrderItems WHERE OrderId = @Id) WHERE Id = @Id;
+SELECT OrderId = Id, Total FROM dbo.Orders WHERE Id = @Id;
 
 COMMIT;
+
+-- Rollups of the orders above (also rebuilds them for an existing database)
+DELETE FROM dbo.SalesDaily;
+DELETE FROM dbo.ProductSales;
+
+INSERT INTO dbo.SalesDaily(Day, Bucket, OrderCount, Units, Revenue)
+SELECT CAST(o.CreatedAt AS DATE), o.Id % 8, COUNT(*), SUM(i.Units), SUM(o.Total)
+FROM dbo.Orders AS o
+JOIN (SELECT OrderId, SUM(Qty) AS Units FROM dbo.OrderItems GROUP BY OrderId) AS i ON i.OrderId = o.Id
+GROUP BY CAST(o.CreatedAt AS DATE), o.Id % 8;
+
+INSERT INTO dbo.ProductSales(ProductId, Units, Revenue)
+SELECT ProductId, SUM(Qty), SUM(Qty*Price) FROM dbo.OrderItems GROUP BY ProductId;
@@ -0,0 +1,87 @@
+/* Shop schema for the SQLite backend (DB_BACKEND=sqlite)
+   Sklep – schema + seed + przykladowe zamowienie
+*/
+PRAGMA foreign_keys = ON;
+
+DROP TABLE IF EXISTS ProductSales;
+DROP TABLE IF EXISTS SalesDaily;
+DROP TABLE IF EXISTS OrderItems;
+DROP TABLE IF EXISTS Orders;
+DROP TABLE IF EXISTS Products;
+
+CREATE TABLE Products (
+  Id    INTEGER PRIMARY KEY AUTOINCREMENT,
+  -- NOCASE like the SQL Server collation: name search (LIKE 'prefix%') can seek IX_Products_Name
+  Name  NVARCHAR(120) COLLATE NOCASE NOT NULL,
+  Price DECIMAL(12,2) NOT NULL CONSTRAINT CK_Products_Price CHECK (Price >= 0),
+  Stock INT NULL CONSTRAINT CK_Products_Stock CHECK (Stock >= 0)
+);
+
+CREATE TABLE Orders (
+  Id        INTEGER PRIMARY KEY AUTOINCREMENT,
+  CreatedAt DATETIME NOT NULL DEFAULT (datetime('now')),
+  Total     DECIMAL(14,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE OrderItems (
+  Id        INTEGER PRIMARY KEY AUTOINCREMENT,
+  OrderId   INT NOT NULL CONSTRAINT FK_OrderItems_Orders   REFERENCES Orders(Id) ON DELETE CASCADE,
+  ProductId INT NOT NULL CONSTRAINT FK_OrderItems_Products REFERENCES Products(Id),
+  Qty       INT NOT NULL CONSTRAINT CK_OrderItems_Qty CHECK (Qty > 0),
+  Price     DECIMAL(12,2) NOT NULL
+);
+
+-- Rollups for the reports, updated by checkout in the order's transaction.
+-- SalesDaily: up to 8 rows per day (Bucket = order id % 8)
+CREATE TABLE SalesDaily (
+  Day        DATE NOT NULL,
+  Bucket     INT NOT NULL,
+  OrderCount INT NOT NULL,
+  Units      INT NOT NULL,
+  Revenue    DECIMAL(16,2) NOT NULL,
+  CONSTRAINT PK_SalesDaily PRIMARY KEY (Day, Bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE ProductSales (
+  ProductId INTEGER PRIMARY KEY CONSTRAINT FK_ProductSales_Products REFERENCES Products(Id),
+  Units     INT NOT NULL,
+  Revenue   DECIMAL(16,2) NOT NULL
+);
+
+CREATE INDEX IX_OrderItems_Order ON OrderItems(OrderId, Qty, Price);
+CREATE INDEX IX_Products_Name ON Products(Name, Id, Price, Stock);
+CREATE INDEX IX_Products_Price ON Products(Price, Id, Name, Stock);
+CREATE INDEX IX_ProductSales_Units ON ProductSales(Units DESC, ProductId, Revenue);
+CREATE INDEX IX_ProductSales_Revenue ON ProductSales(Revenue DESC, ProductId, Units);
+
+-- Seed
+INSERT INTO Products(Name, Price) VALUES
+('Kawa ziarnista 1kg', 79.90),
+('Kubek porcelanowy', 24.50),
+('Notes A5 kropki', 12.00),
+('Długopis żelowy', 5.99),
+('Herbata Earl Grey 100g', 18.50),
+('Termos stalowy 0.5L', 45.00);
+
+-- Checkout demo
+INSERT INTO Orders DEFAULT VALUES;
+
+INSERT INTO OrderItems(OrderId, ProductId, Qty, Price)
+SELECT last_insert_rowid(), p.Id, c.Qty, p.Price
+FROM (SELECT 1 AS ProductId, 2 AS Qty UNION ALL SELECT 3, 1) AS c
+JOIN Products AS p ON p.Id = c.ProductId;
+
+UPDATE Orders SET Total = (SELECT SUM(Qty*Price) FROM OrderItems WHERE OrderId = Orders.Id);
+
+-- Rollups of the orders above (also rebuilds them for an existing database)
+DELETE FROM SalesDaily;
+DELETE FROM ProductSales;
+
+INSERT INTO SalesDaily(Day, Bucket, OrderCount, Units, Revenue)
+SELECT date(o.CreatedAt), o.Id % 8, COUNT(*), SUM(i.Units), SUM(o.Total)
+FROM Orders AS o
+JOIN (SELECT OrderId, SUM(Qty) AS Units FROM OrderItems GROUP BY OrderId) AS i ON i.OrderId = o.Id
+GROUP BY date(o.CreatedAt), o.Id % 8;
+
+INSERT INTO ProductSales(ProductId, Units, Revenue)
+SELECT ProductId, SUM(Qty), SUM(Qty*Price) FROM OrderItems GROUP BY ProductId;
@@ -1,47 +1,114 @@
 import os
+import re
+import sys
+import json
 import logging
-import pyodbc
-from typing import Dict
-from fastapi import FastAPI, HTTPException, status, Request
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, status, Depends, Request, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+
+# Shared helpers (common/) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.carts import CartItemMissing, CartLimitError, backend_from_env
+from common.catalog import ProductCatalog
+from common.db import ConnectionPool, PoolTimeout, is_integrity_error
+from common.etag import TableVersions
+from common.executor import DbExecutor, Overloaded, overloaded_handler
+from common.metrics import Metrics, MetricsMiddleware
+from common.middleware import SecurityHeadersMiddleware, setup_logging
+from common.pagination import Page, page_params
+from common.responses import JSONResponse
+from common.sessions import SessionMiddleware, session_id
+from common.static import StaticAssets
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Log records are written by a background thread, see common/middleware.py
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Database connection pool and the threads running queries, created once at startup
+db_pool = ConnectionPool.from_env()
+db_executor = DbExecutor.from_env(db_pool)
+
+# Request latency histograms and pool/executor gauges served by /metrics
+metrics = Metrics()
+metrics.add_collector("db_pool", db_pool.stats)
+metrics.add_collector("db_executor", db_executor.stats)
+
+# Carts of all sessions: in memory or in a SQLite file shared by all workers (CART_* variables)
+cart_store = backend_from_env()
+metrics.add_collector("carts", cart_store.stats)
+
+# Change versions of the tables behind the cacheable GETs (ETag / 304):
+# in memory or in a SQLite file shared by all workers (TABLE_VERSIONS_PATH)
+table_versions = TableVersions.from_env()
+
+# HTML pages and static files, read and compressed once at startup
+static_assets = StaticAssets("static")
+
+def load_products(product_ids):
+    # Constant SQL text for any number of ids: the ids are one JSON parameter
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT p.Id, p.Name, p.Price
+            FROM dbo.Products AS p
+            JOIN OPENJSON(?) WITH (Id INT '$') AS c ON c.Id = p.Id
+        """, json.dumps(list(product_ids)))
+        return [(row[0], row[1], float(row[2])) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+# Product names and prices for the cart and checkout, bounded by CATALOG_MAX_SIZE
+product_catalog = ProductCatalog(load_products, max_size=int(os.getenv('CATALOG_MAX_SIZE', 10000)))
+metrics.add_collector("catalog", product_catalog.stats)
+
+def warm_catalog():
+    conn = db_pool.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT TOP {product_catalog.max_size} Id, Name, Price FROM dbo.Products ORDER BY Id DESC")
+        product_catalog.warm((row[0], row[1], float(row[2])) for row in cursor.fetchall())
+    finally:
+        conn.close()
+    logger.info(f"Product catalog loaded: {product_catalog.stats()['products']} products")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db_pool.open()
+    db_executor.start()
+    warm_catalog()
+    yield
+    db_executor.shutdown()
+    db_pool.close()
+    cart_store.close()
+    table_versions.close()
+
 # FastAPI app
-app = FastAPI(title="Shop API")
-
-# In-memory cart storage (per session - simplified version)
-# In production, use Redis or database with session management
-cart_storage: Dict[str, Dict[int, int]] = {"default": {}}
-
-# Security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["Content-Security-Policy"] = "default-src 'self' 'unsafe-inline'"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    return response
-
-# Logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"{request.method} {request.url.path}")
-    response = await call_next(request)
-    logger.info(f"Status: {response.status_code}")
-    return response
+app = FastAPI(title="Shop API", default_response_class=JSONResponse, lifespan=lifespan)
+
+# Security headers + access log (one pure ASGI layer)
+app.add_middleware(
+    SecurityHeadersMiddleware,
+    headers={
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "default-src 'self' 'unsafe-inline'",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+    },
+)
+
+# Session cookie identifying the cart of each client
+app.add_middleware(SessionMiddleware)
 
 # CORS - tylko localhost
 app.add_middleware(
@@ -52,23 +119,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shed load with 503 + Retry-After when the database queue is full
+app.add_exception_handler(Overloaded, overloaded_handler)
+
+# Timing of every request (Server-Timing header + /metrics); added last so it wraps all other middleware
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Database connection
 def get_db_connection():
-    server = os.getenv('DB_SERVER', None)
-    database = os.getenv('DB_DATABASE', None)
-    driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
-    use_windows_auth = os.getenv('DB_USE_WINDOWS_AUTH', 'True').lower() == 'true'
-    
-    if use_windows_auth:
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;TrustServerCertificate=yes;'
-    else:
-        username = os.getenv('DB_USERNAME', None)
-        password = os.getenv('DB_PASSWORD', None)
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};TrustServerCertificate=yes;'
-    
     try:
-        conn = pyodbc.connect(conn_str)
-        return conn
+        return db_pool.acquire()
+    except PoolTimeout as e:
+        logger.warning(f"Database pool exhausted: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database busy, try again later")
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -77,6 +140,8 @@ def get_db_connection():
 class ProductCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=120)
     price: float = Field(..., ge=0)
+    # None: not tracked, the product can always be ordered
+    stock: Optional[int] = Field(None, ge=0)
 
 class Product(ProductCreate):
     id: int
@@ -89,51 +154,134 @@ class CartUpdateItem(BaseModel):
     product_id: int = Field(..., gt=0)
     qty: int = Field(..., gt=0)
 
-# Helper functions
-def get_cart_session():
-    return "default"
+class CartReplace(BaseModel):
+    items: List[CartAddItem] = Field(..., max_length=1000)
+
+class CartOp(BaseModel):
+    op: str = Field(..., pattern="^(add|set|remove)$")
+    product_id: int = Field(..., gt=0)
+    # Required for add and set
+    qty: Optional[int] = Field(None, gt=0)
+
+class CartBatch(BaseModel):
+    ops: List[CartOp] = Field(..., min_length=1, max_length=1000)
+
+# Cart lines are sent as one JSON parameter ([[product_id, qty, price], ...]) read
+# with OPENJSON, so an order of any size takes the same few statements
+CART_LINES_SQL = "OPENJSON(?) WITH (ProductId INT '$[0]', Qty INT '$[1]', Price DECIMAL(12,2) '$[2]')"
+
+# Product list sorts: sort parameter -> (column, cursor value type, descending)
+PRODUCT_SORTS = {
+    "name": ("Name", str, False),
+    "-name": ("Name", str, True),
+    "price": ("Price", float, False),
+    "-price": ("Price", float, True),
+}
+
+# Sales rollups: every day has up to ROLLUP_BUCKETS rows in SalesDaily (by order
+# id), so concurrent checkouts seldom wait for the lock on the same row
+ROLLUP_BUCKETS = 8
+REPORT_DEFAULT_DAYS = 30
+REPORT_MAX_DAYS = 366
+TOP_PRODUCTS_ORDER = {
+    "quantity": "s.Units DESC, s.ProductId",
+    "revenue": "s.Revenue DESC, s.ProductId",
+}
 
 # API Endpoints
 
 @app.get("/")
-async def serve_index():
-    return FileResponse("static/index.html")
+async def serve_index(request: Request):
+    return static_assets.page("index.html", request)
 
 @app.get("/cart")
-async def serve_cart():
-    return FileResponse("static/cart.html")
+async def serve_cart(request: Request):
+    return static_assets.page("cart.html", request)
 
 @app.get("/api/products")
-async def get_products():
+@db_executor.offload
+def get_products(
+    q: Optional[str] = Query(None, min_length=1, max_length=120),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: str = Query("name", pattern="^-?(name|price)$"),
+    etag: str = Depends(table_versions.etag_for("Products")),
+    page: Page = Depends(page_params),
+):
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price must not be greater than max_price")
+    column, value_type, descending = PRODUCT_SORTS[sort]
+    # The cursor carries the sort it was made for
+    after = page.after(str, value_type, int)
+    if after and after[0] != sort:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort")
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT Id, Name, Price FROM dbo.Products ORDER BY Name")
-        rows = cursor.fetchall()
+        
+        # Name prefix and price range are seeks on IX_Products_Name / IX_Products_Price
+        conditions = []
+        params = []
+        if q is not None:
+            conditions.append("Name LIKE ? ESCAPE '\\'")
+            params.append(re.sub(r"([\\%_\[])", r"\\\1", q) + "%")
+        if min_price is not None:
+            conditions.append("Price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("Price <= ?")
+            params.append(max_price)
+        # Keyset seek on (column, Id), written so both engines use it as an index range
+        if after:
+            op = "<" if descending else ">"
+            conditions.append(f"{column} {op}= ? AND ({column} {op} ? OR Id {op} ?)")
+            params += [after[1], after[1], after[2]]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if descending else "ASC"
+        cursor.execute(f"""
+            SELECT Id, Name, Price, Stock FROM dbo.Products
+            {where}
+            ORDER BY {column} {direction}, Id {direction}
+            OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+        """, *params, page.limit + 1)
+        key_index = 1 if column == "Name" else 2
+        rows, next_cursor = page.split(
+            cursor.fetchall(), lambda row: (sort, value_type(row[key_index]), row[0])
+        )
         conn.close()
         
-        products = [{"id": row[0], "name": row[1], "price": float(row[2])} for row in rows]
-        return JSONResponse(content=products, headers={"Cache-Control": "public, max-age=60"})
+        products = [{"id": row[0], "name": row[1], "price": float(row[2]), "stock": row[3]} for row in rows]
+        return JSONResponse(
+            content={"items": products, "next_cursor": next_cursor},
+            headers={"Cache-Control": "no-cache", "ETag": etag}
+        )
     except Exception as e:
         logger.error(f"Error fetching products: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/products", status_code=status.HTTP_201_CREATED)
-async def create_product(product: ProductCreate):
+@db_executor.offload
+def create_product(product: ProductCreate):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        # Rounded to the cents of DECIMAL(12,2) here: SQLite would store the value as given
+        price = Decimal(str(product.price)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         cursor.execute(
-            "INSERT INTO dbo.Products (Name, Price) OUTPUT INSERTED.Id VALUES (?, ?)",
-            product.name, product.price
+            "INSERT INTO dbo.Products (Name, Price, Stock) OUTPUT INSERTED.Id, INSERTED.Price VALUES (?, ?, ?)",
+            product.name, price, product.stock
         )
-        product_id = cursor.fetchone()[0] # type: ignore
+        product_id, price = cursor.fetchone() # type: ignore
         conn.commit()
+        table_versions.bump("Products")
+        # The price as stored, so the response, the catalog and checkout all see the same value
+        price = float(price)
+        product_catalog.put(product_id, product.name, price)
         conn.close()
         
         return JSONResponse(
-            content={"id": product_id, "name": product.name, "price": product.price},
+            content={"id": product_id, "name": product.name, "price": price, "stock": product.stock},
             status_code=201,
             headers={
                 "Location": f"/api/products/{product_id}",
@@ -144,72 +292,110 @@ async def create_product(product: ProductCreate):
         logger.error(f"Error creating product: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def priced_cart(cart):
+    """Cart contents with names and prices from the catalog, as returned by the cart endpoints"""
+    products = product_catalog.get_many(list(cart)) if cart else {}
+    
+    items = []
+    total = 0
+    for product_id, qty in cart.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        name, price = product
+        subtotal = price * qty
+        total += subtotal
+        
+        items.append({
+            "product_id": product_id,
+            "product_name": name,
+            "price": price,
+            "qty": qty,
+            "subtotal": subtotal
+        })
+    return {"items": items, "total": round(total, 2)}
+
+def check_products(product_ids):
+    """404 unless all products exist (one catalog lookup, one query for the misses)"""
+    products = product_catalog.get_many(product_ids)
+    missing = sorted(set(product_ids) - products.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Products not found: {', '.join(map(str, missing))}")
+
 @app.get("/api/cart")
-async def get_cart():
+@db_executor.offload
+def get_cart(session: str = Depends(session_id)):
     try:
-        session_id = get_cart_session()
-        cart = cart_storage.get(session_id, {})
+        # Snapshot - the cart may be changed by another request while we query
+        cart = cart_store.get(session)
         
-        if not cart:
-            return JSONResponse(content={"items": [], "total": 0})
+        return JSONResponse(content=priced_cart(cart), headers={"Cache-Control": "no-cache"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching cart: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.put("/api/cart")
+@db_executor.offload
+def replace_cart(body: CartReplace, session: str = Depends(session_id)):
+    try:
+        items = {}
+        for item in body.items:
+            if item.product_id in items:
+                raise HTTPException(status_code=422, detail=f"Duplicate product_id: {item.product_id}")
+            items[item.product_id] = item.qty
+        check_products(list(items))
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        try:
+            cart = cart_store.replace(session, items)
+        except CartLimitError as e:
+            raise HTTPException(status_code=409, detail=str(e))
         
-        product_ids = list(cart.keys())
-        placeholders = ','.join('?' * len(product_ids))
-        query = f"SELECT Id, Name, Price FROM dbo.Products WHERE Id IN ({placeholders})"
-        cursor.execute(query, product_ids)
-        rows = cursor.fetchall()
-        conn.close()
+        return JSONResponse(content=priced_cart(cart), headers={"Cache-Control": "no-cache"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error replacing cart: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/api/cart/batch")
+@db_executor.offload
+def update_cart_batch(body: CartBatch, session: str = Depends(session_id)):
+    try:
+        if any(op.op != "remove" and op.qty is None for op in body.ops):
+            raise HTTPException(status_code=422, detail="qty is required for add and set")
+        # Removing needs no lookup: a product that no longer exists can still leave the cart
+        check_products(list({op.product_id for op in body.ops if op.op != "remove"}))
         
-        items = []
-        total = 0
-        for row in rows:
-            product_id = row[0]
-            qty = cart[product_id]
-            price = float(row[2])
-            subtotal = price * qty
-            total += subtotal
-            
-            items.append({
-                "product_id": product_id,
-                "product_name": row[1],
-                "price": price,
-                "qty": qty,
-                "subtotal": subtotal
-            })
+        try:
+            cart = cart_store.apply(session, [(op.op, op.product_id, op.qty) for op in body.ops])
+        except CartItemMissing as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except CartLimitError as e:
+            raise HTTPException(status_code=409, detail=str(e))
         
-        return JSONResponse(
-            content={"items": items, "total": round(total, 2)},
-            headers={"Cache-Control": "no-cache"}
-        )
+        return JSONResponse(content=priced_cart(cart), headers={"Cache-Control": "no-cache"})
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching cart: {str(e)}")
+        logger.error(f"Error updating cart: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/cart/add", status_code=status.HTTP_201_CREATED)
-async def add_to_cart(item: CartAddItem):
+@db_executor.offload
+def add_to_cart(item: CartAddItem, session: str = Depends(session_id)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT Id FROM dbo.Products WHERE Id = ?", item.product_id)
-        if not cursor.fetchone():
-            conn.close()
+        if product_catalog.get(item.product_id) is None:
             raise HTTPException(status_code=404, detail="Product not found")
-        conn.close()
-        
-        session_id = get_cart_session()
-        if session_id not in cart_storage:
-            cart_storage[session_id] = {}
         
-        if item.product_id in cart_storage[session_id]:
-            cart_storage[session_id][item.product_id] += item.qty
-        else:
-            cart_storage[session_id][item.product_id] = item.qty
+        try:
+            qty = cart_store.add(session, item.product_id, item.qty)
+        except CartLimitError as e:
+            raise HTTPException(status_code=409, detail=str(e))
         
         return JSONResponse(
-            content={"message": "Product added to cart", "product_id": item.product_id, "qty": cart_storage[session_id][item.product_id]},
+            content={"message": "Product added to cart", "product_id": item.product_id, "qty": qty},
             status_code=201
         )
     except HTTPException:
@@ -219,18 +405,18 @@ async def add_to_cart(item: CartAddItem):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.patch("/api/cart/item")
-async def update_cart_item(item: CartUpdateItem):
+@db_executor.offload
+def update_cart_item(item: CartUpdateItem, session: str = Depends(session_id)):
     try:
-        session_id = get_cart_session()
-        cart = cart_storage.get(session_id, {})
-        
-        if item.product_id not in cart:
-            raise HTTPException(status_code=404, detail="Product not in cart")
-        
         if item.qty <= 0:
             raise HTTPException(status_code=422, detail="Quantity must be greater than 0")
         
-        cart_storage[session_id][item.product_id] = item.qty
+        try:
+            updated = cart_store.set(session, item.product_id, item.qty)
+        except CartLimitError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if not updated:
+            raise HTTPException(status_code=404, detail="Product not in cart")
         
         return JSONResponse(
             content={"message": "Cart item updated", "product_id": item.product_id, "qty": item.qty}
@@ -242,16 +428,12 @@ async def update_cart_item(item: CartUpdateItem):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.delete("/api/cart/item/{product_id}")
-async def remove_from_cart(product_id: int):
+@db_executor.offload
+def remove_from_cart(product_id: int, session: str = Depends(session_id)):
     try:
-        session_id = get_cart_session()
-        cart = cart_storage.get(session_id, {})
-        
-        if product_id not in cart:
+        if not cart_store.remove(session, product_id):
             raise HTTPException(status_code=404, detail="Product not in cart")
         
-        del cart_storage[session_id][product_id]
-        
         return JSONResponse(
             content={"message": "Product removed from cart", "product_id": product_id}
         )
@@ -261,52 +443,130 @@ async def remove_from_cart(product_id: int):
         logger.error(f"Error removing from cart: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def out_of_stock(cursor, lines):
+    """Ids of the cart products with less stock than ordered"""
+    cursor.execute(f"""
+        SELECT p.Id FROM {CART_LINES_SQL} AS c
+        JOIN dbo.Products AS p ON p.Id = c.ProductId
+        WHERE p.Stock < c.Qty
+        ORDER BY p.Id
+    """, lines)
+    return [row[0] for row in cursor.fetchall()]
+
+def update_rollups(cursor, order_id, day, lines, units, revenue):
+    """Add an order to SalesDaily and ProductSales (four statements for any number of lines)"""
+    bucket = order_id % ROLLUP_BUCKETS
+    # Missing rows are created empty first, then every row is incremented.
+    # UPDLOCK, HOLDLOCK keep two checkouts from inserting the same key
+    cursor.execute("""
+        INSERT INTO dbo.SalesDaily (Day, Bucket, OrderCount, Units, Revenue)
+        SELECT ?, ?, 0, 0, 0
+        WHERE NOT EXISTS (SELECT 1 FROM dbo.SalesDaily WITH (UPDLOCK, HOLDLOCK) WHERE Day = ? AND Bucket = ?)
+    """, day, bucket, day, bucket)
+    cursor.execute("""
+        UPDATE dbo.SalesDaily
+        SET OrderCount = OrderCount + 1, Units = Units + ?, Revenue = Revenue + ?
+        WHERE Day = ? AND Bucket = ?
+    """, units, revenue, day, bucket)
+
+    cursor.execute(f"""
+        INSERT INTO dbo.ProductSales (ProductId, Units, Revenue)
+        SELECT c.ProductId, 0, 0
+        FROM {CART_LINES_SQL} AS c
+        WHERE NOT EXISTS (SELECT 1 FROM dbo.ProductSales AS s WITH (UPDLOCK, HOLDLOCK) WHERE s.ProductId = c.ProductId)
+    """, lines)
+    cursor.execute(f"""
+        UPDATE dbo.ProductSales
+        SET Units = Units + c.Qty, Revenue = Revenue + c.Qty * c.Price
+        FROM {CART_LINES_SQL} AS c
+        WHERE c.ProductId = dbo.ProductSales.ProductId
+    """, lines)
+
 @app.post("/api/checkout", status_code=status.HTTP_201_CREATED)
-async def checkout():
+@db_executor.offload
+def checkout(session: str = Depends(session_id)):
     try:
-        session_id = get_cart_session()
-        cart = cart_storage.get(session_id, {})
+        cart = cart_store.get(session)
         
         if not cart:
             raise HTTPException(status_code=400, detail="Cart is empty")
         
+        # Prices shown to the client, read together at one catalog version
+        version, products = product_catalog.snapshot(list(cart))
+        if len(products) != len(cart):
+            raise HTTPException(status_code=400, detail="Some products in cart no longer exist")
+        lines = json.dumps([[product_id, qty, products[product_id][1]] for product_id, qty in cart.items()])
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        product_ids = list(cart.keys())
-        placeholders = ','.join('?' * len(product_ids))
-        query = f"SELECT Id, Price FROM dbo.Products WHERE Id IN ({placeholders})"
-        cursor.execute(query, product_ids)
-        rows = cursor.fetchall()
-        
-        price_map = {row[0]: float(row[1]) for row in rows}
+        # CreatedAt set here (UTC, whole seconds) so the order and its SalesDaily row agree on the day
+        created_at = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        cursor.execute("INSERT INTO dbo.Orders (CreatedAt) OUTPUT INSERTED.Id VALUES (?)", created_at)
+        order_id = int(cursor.fetchone()[0]) # type: ignore
         
-        if len(price_map) != len(cart):
+        # All lines at once, priced from Products. A line is left out when its
+        # product is gone or its price differs from the cached one
+        cursor.execute(f"""
+            INSERT INTO dbo.OrderItems (OrderId, ProductId, Qty, Price)
+            SELECT ?, p.Id, c.Qty, p.Price
+            FROM {CART_LINES_SQL} AS c
+            JOIN dbo.Products AS p ON p.Id = c.ProductId AND p.Price = c.Price
+        """, order_id, lines)
+        if cursor.rowcount != len(cart):
+            conn.rollback()
             conn.close()
-            raise HTTPException(status_code=400, detail="Some products in cart no longer exist")
+            current = product_catalog.refresh(list(cart))
+            if len(current) != len(cart):
+                raise HTTPException(status_code=400, detail="Some products in cart no longer exist")
+            logger.warning(f"Checkout: prices changed since catalog version {version}, cache refreshed")
+            raise HTTPException(status_code=409, detail="Prices have changed, please review your cart")
         
-        cursor.execute("INSERT INTO dbo.Orders DEFAULT VALUES")
-        cursor.execute("SELECT SCOPE_IDENTITY()")
-        order_id = int(cursor.fetchone()[0]) # type: ignore
+        # Total of the lines just written, in the same transaction
+        cursor.execute("""
+            UPDATE dbo.Orders
+            SET Total = (SELECT SUM(Qty * Price) FROM dbo.OrderItems WHERE OrderId = ?)
+            OUTPUT INSERTED.Total
+            WHERE Id = ?
+        """, order_id, order_id)
+        total = cursor.fetchone()[0] # type: ignore
         
-        total = 0
-        for product_id, qty in cart.items():
-            price = price_map[product_id]
-            subtotal = price * qty
-            total += subtotal
-            
-            cursor.execute(
-                "INSERT INTO dbo.OrderItems (OrderId, ProductId, Qty, Price) VALUES (?, ?, ?, ?)",
-                order_id, product_id, qty, price
+        # Stock of all tracked lines in one statement, after the order rows so the
+        # hot rows stay locked for the shortest time. CK_Products_Stock fails the
+        # whole statement when any line would go below zero
+        try:
+            cursor.execute(f"""
+                UPDATE dbo.Products
+                SET Stock = Stock - c.Qty
+                FROM {CART_LINES_SQL} AS c
+                WHERE c.ProductId = dbo.Products.Id AND dbo.Products.Stock IS NOT NULL
+            """, lines)
+        except Exception as e:
+            if not is_integrity_error(e):
+                raise
+            conn.rollback()
+            short = out_of_stock(cursor, lines)
+            conn.close()
+            raise HTTPException(
+                status_code=409,
+                detail=f"Not enough stock for products: {', '.join(map(str, short))}"
             )
+        stock_changed = cursor.rowcount > 0
+        
+        # Reports read the rollups, never OrderItems. Written last: a checkout
+        # refused for stock never touches them, and the ProductSales rows of
+        # hot products are locked only for the final statements
+        update_rollups(cursor, order_id, created_at.date(), lines, sum(cart.values()), total)
         
         conn.commit()
+        if stock_changed:
+            table_versions.bump("Products")
         conn.close()
         
-        cart_storage[session_id] = {}
+        cart_store.clear(session)
         
         return JSONResponse(
-            content={"order_id": order_id, "total": round(total, 2)},
+            content={"order_id": order_id, "total": round(float(total), 2)},
             status_code=201,
             headers={
                 "Location": f"/api/orders/{order_id}",
@@ -319,8 +579,189 @@ async def checkout():
         logger.error(f"Error during checkout: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@app.get("/api/orders")
+@db_executor.offload
+def get_orders(page: Page = Depends(page_params)):
+    after = page.after(int)
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Newest first, keyset seek on the primary key; line counts from IX_OrderItems_Order
+        seek = "WHERE o.Id < ?" if after else ""
+        params = [after[0]] if after else []
+        cursor.execute(f"""
+            SELECT o.Id, o.CreatedAt, o.Total,
+                   (SELECT COUNT(*) FROM dbo.OrderItems AS i WHERE i.OrderId = o.Id) AS Lines
+            FROM dbo.Orders AS o
+            {seek}
+            ORDER BY o.Id DESC
+            OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+        """, *params, page.limit + 1)
+        rows, next_cursor = page.split(cursor.fetchall(), lambda row: (row[0],))
+        conn.close()
+        
+        orders = [
+            {"id": row[0], "created_at": row[1], "total": round(float(row[2]), 2), "lines": row[3]}
+            for row in rows
+        ]
+        return JSONResponse(
+            content={"items": orders, "next_cursor": next_cursor},
+            headers={"Cache-Control": "no-cache"}
+        )
+    except Exception as e:
+        logger.error(f"Error fetching orders: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/api/orders/{order_id}")
+@db_executor.offload
+def get_order(order_id: int):
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # The order and its lines in one round trip
+        cursor.execute("""
+            SELECT o.Id, o.CreatedAt, o.Total, i.ProductId, p.Name, i.Qty, i.Price
+            FROM dbo.Orders AS o
+            LEFT JOIN dbo.OrderItems AS i ON i.OrderId = o.Id
+            LEFT JOIN dbo.Products AS p ON p.Id = i.ProductId
+            WHERE o.Id = ?
+            ORDER BY i.Id
+        """, order_id)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        if not rows:
+            raise HTTPException(status_code=404, detail="Order not found")
+        
+        items = [
+            {
+                "product_id": row[3],
+                "product_name": row[4],
+                "price": float(row[6]),
+                "qty": row[5],
+                "subtotal": round(float(row[6]) * row[5], 2)
+            }
+            for row in rows if row[3] is not None
+        ]
+        return JSONResponse(
+            content={"id": rows[0][0], "created_at": rows[0][1], "total": round(float(rows[0][2]), 2), "items": items},
+            headers={"Cache-Control": "no-cache"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching order: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Reports (served from the SalesDaily / ProductSales rollups)
+
+@app.get("/api/reports/revenue")
+@db_executor.offload
+def get_revenue_report(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+):
+    # Days in UTC, like Orders.CreatedAt; the last REPORT_DEFAULT_DAYS days by default
+    if date_to is None:
+        date_to = datetime.now(timezone.utc).date()
+    if date_from is None:
+        date_from = date_to - timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    if (date_to - date_from).days >= REPORT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"A report covers at most {REPORT_MAX_DAYS} days")
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # At most ROLLUP_BUCKETS rows per day, however many orders there were
+        cursor.execute("""
+            SELECT Day, SUM(OrderCount), SUM(Units), SUM(Revenue)
+            FROM dbo.SalesDaily
+            WHERE Day >= ? AND Day <= ?
+            GROUP BY Day
+            ORDER BY Day
+        """, date_from, date_to)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        days = [
+            {"day": row[0], "orders": row[1], "units": row[2], "revenue": round(float(row[3]), 2)}
+            for row in rows
+        ]
+        totals = {
+            "orders": sum(day["orders"] for day in days),
+            "units": sum(day["units"] for day in days),
+            "revenue": round(sum(float(row[3]) for row in rows), 2),
+        }
+        return JSONResponse(
+            content={"date_from": date_from, "date_to": date_to, "items": days, "totals": totals},
+            headers={"Cache-Control": "no-cache"}
+        )
+    except Exception as e:
+        logger.error(f"Error fetching revenue report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/api/reports/top-products")
+@db_executor.offload
+def get_top_products(
+    by: str = Query("revenue", pattern="^(quantity|revenue)$"),
+    limit: int = Query(10, ge=1, le=100),
+):
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # The first rows of IX_ProductSales_Units / IX_ProductSales_Revenue
+        cursor.execute(f"""
+            SELECT s.ProductId, p.Name, s.Units, s.Revenue
+            FROM dbo.ProductSales AS s
+            JOIN dbo.Products AS p ON p.Id = s.ProductId
+            ORDER BY {TOP_PRODUCTS_ORDER[by]}
+            OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+        """, limit)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        products = [
+            {"product_id": row[0], "product_name": row[1], "units": row[2], "revenue": round(float(row[3]), 2)}
+            for row in rows
+        ]
+        return JSONResponse(
+            content={"by": by, "items": products},
+            headers={"Cache-Control": "no-cache"}
+        )
+    except Exception as e:
+        logger.error(f"Error fetching top products: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Diagnostics
+@app.get("/api/db/pool")
+async def get_pool_stats():
+    return JSONResponse(content=db_pool.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/api/db/executor")
+async def get_executor_stats():
+    return JSONResponse(content=db_executor.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/api/carts/stats")
+@db_executor.offload
+def get_cart_stats():
+    return JSONResponse(content=cart_store.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/api/catalog/stats")
+async def get_catalog_stats():
+    return JSONResponse(content=product_catalog.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), headers={"Cache-Control": "no-store"})
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", static_assets, name="static")
 
 if __name__ == "__main__":
     import uvicorn
@@ -5,17 +5,38 @@ async function loadCart() {
         
         const cart = await response.json();
         displayCart(cart);
-        updateCartCount();
     } catch (error) {
         showNotification('Błąd podczas ładowania koszyka: ' + error.message, 'error');
     }
 }
 
+// Sends a change of the cart; the response is the whole priced cart, so no reload is needed
+async function sendCart(url, method, body, errorMessage) {
+    const response = await fetch(url, {
+        method: method,
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(body)
+    });
+    
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || errorMessage);
+    }
+    
+    const cart = await response.json();
+    displayCart(cart);
+    return cart;
+}
+
 function displayCart(cart) {
     const container = document.getElementById('cartContainer');
     const summary = document.getElementById('cartSummary');
     const totalElement = document.getElementById('cartTotal');
     
+    setCartCount(cart);
+    
     if (cart.items.length === 0) {
         container.innerHTML = '<div class="empty-state"><p>Koszyk jest pusty</p><a href="/" class="btn btn-primary">Przejdź do produktów</a></div>';
         summary.style.display = 'none';
@@ -58,23 +79,9 @@ async function updateQuantity(productId, newQty) {
     }
     
     try {
-        const response = await fetch('/api/cart/item', {
-            method: 'PATCH',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                product_id: productId,
-                qty: newQty
-            })
-        });
-        
-        if (!response.ok) {
-            const error = await response.json();
-            throw new Error(error.detail || 'Błąd aktualizacji ilości');
-        }
-        
-        loadCart();
+        await sendCart('/api/cart/batch', 'POST', {
+            ops: [{ op: 'set', product_id: productId, qty: newQty }]
+        }, 'Błąd aktualizacji ilości');
     } catch (error) {
         showNotification(error.message, 'error');
         loadCart();
@@ -87,17 +94,23 @@ async function removeFromCart(productId) {
     }
     
     try {
-        const response = await fetch(`/api/cart/item/${productId}`, {
-            method: 'DELETE'
-        });
-        
-        if (!response.ok) {
-            const error = await response.json();
-            throw new Error(error.detail || 'Błąd usuwania produktu');
-        }
-        
+        await sendCart('/api/cart/batch', 'POST', {
+            ops: [{ op: 'remove', product_id: productId }]
+        }, 'Błąd usuwania produktu');
         showNotification('Produkt usunięty z koszyka', 'success');
-        loadCart();
+    } catch (error) {
+        showNotification(error.message, 'error');
+    }
+}
+
+async function clearCart() {
+    if (!confirm('Czy na pewno chcesz opróżnić koszyk?')) {
+        return;
+    }
+    
+    try {
+        await sendCart('/api/cart', 'PUT', { items: [] }, 'Błąd opróżniania koszyka');
+        showNotification('Koszyk opróżniony', 'success');
     } catch (error) {
         showNotification(error.message, 'error');
     }
@@ -129,17 +142,9 @@ async function checkout() {
     }
 }
 
-async function updateCartCount() {
-    try {
-        const response = await fetch('/api/cart');
-        if (response.ok) {
-            const cart = await response.json();
-            const count = cart.items.reduce((sum, item) => sum + item.qty, 0);
-            document.getElementById('cartCount').textContent = count;
-        }
-    } catch (error) {
-        console.error('Error updating cart count:', error);
-    }
+function setCartCount(cart) {
+    const count = cart.items.reduce((sum, item) => sum + item.qty, 0);
+    document.getElementById('cartCount').textContent = count;
 }
 
 function showNotification(message, type = 'info') {
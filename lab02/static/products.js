@@ -1,21 +1,56 @@
-async function loadProducts() {
+let productsData = [];
+let nextCursor = null;
+let reloadTimer = null;
+let loadSeq = 0;
+
+// Query parameters from the search and filter bar
+function productFilters() {
+    const params = new URLSearchParams();
+    const query = document.getElementById('filterQuery').value.trim();
+    const minPrice = document.getElementById('filterMinPrice').value;
+    const maxPrice = document.getElementById('filterMaxPrice').value;
+    if (query) params.set('q', query);
+    if (minPrice !== '') params.set('min_price', minPrice);
+    if (maxPrice !== '') params.set('max_price', maxPrice);
+    params.set('sort', document.getElementById('filterSort').value);
+    return params;
+}
+
+// Loads the first page, or the next one when called with a cursor
+async function loadProducts(cursor = null) {
+    const seq = ++loadSeq;
     try {
-        const response = await fetch('/api/products');
-        if (!response.ok) throw new Error('Nie udało się pobrać produktów');
+        const params = productFilters();
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/api/products?${params}`);
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Nie udało się pobrać produktów');
+        }
         
-        const products = await response.json();
-        displayProducts(products);
-        updateCartCount();
+        const page = await response.json();
+        // A newer search was started meanwhile
+        if (seq !== loadSeq) return;
+        productsData = cursor ? productsData.concat(page.items) : page.items;
+        nextCursor = page.next_cursor;
+        displayProducts(productsData);
     } catch (error) {
         showNotification('Błąd podczas ładowania produktów: ' + error.message, 'error');
     }
 }
 
+// Search while typing, once the user pauses
+function scheduleReload() {
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(() => loadProducts(), 300);
+}
+
 function displayProducts(products) {
     const container = document.getElementById('productsContainer');
     
     if (products.length === 0) {
-        container.innerHTML = '<div class="empty-state"><p>Brak produktów w sklepie</p></div>';
+        const filtered = productFilters().toString() !== 'sort=name';
+        container.innerHTML = `<div class="empty-state"><p>${filtered ? 'Brak produktów spełniających kryteria' : 'Brak produktów w sklepie'}</p></div>`;
         return;
     }
     
@@ -24,21 +59,23 @@ function displayProducts(products) {
             <div class="product-icon">📦</div>
             <h3>${escapeHtml(product.name)}</h3>
             <p class="product-price">${product.price.toFixed(2)} PLN</p>
-            <button class="btn btn-primary" onclick="addToCart(${product.id})">Dodaj do koszyka</button>
+            ${product.stock === null ? '' : `<p class="product-stock">${product.stock > 0 ? `Dostępne: ${product.stock} szt.` : 'Brak w magazynie'}</p>`}
+            <button class="btn btn-primary" onclick="addToCart(${product.id})" ${product.stock === 0 ? 'disabled' : ''}>Dodaj do koszyka</button>
         </div>
-    `).join('');
+    `).join('') + (nextCursor
+        ? `<div class="load-more"><button class="btn btn-secondary" onclick="loadProducts(nextCursor)">Pokaż więcej</button></div>`
+        : '');
 }
 
 async function addToCart(productId) {
     try {
-        const response = await fetch('/api/cart/add', {
+        const response = await fetch('/api/cart/batch', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                product_id: productId,
-                qty: 1
+                ops: [{ op: 'add', product_id: productId, qty: 1 }]
             })
         });
         
@@ -47,8 +84,9 @@ async function addToCart(productId) {
             throw new Error(error.detail || 'Błąd dodawania do koszyka');
         }
         
+        // The response is the updated cart: the badge needs no extra request
+        setCartCount(await response.json());
         showNotification('Produkt dodany do koszyka!', 'success');
-        updateCartCount();
     } catch (error) {
         showNotification(error.message, 'error');
     }
@@ -58,15 +96,18 @@ async function updateCartCount() {
     try {
         const response = await fetch('/api/cart');
         if (response.ok) {
-            const cart = await response.json();
-            const count = cart.items.reduce((sum, item) => sum + item.qty, 0);
-            document.getElementById('cartCount').textContent = count;
+            setCartCount(await response.json());
         }
     } catch (error) {
         console.error('Error updating cart count:', error);
     }
 }
 
+function setCartCount(cart) {
+    const count = cart.items.reduce((sum, item) => sum + item.qty, 0);
+    document.getElementById('cartCount').textContent = count;
+}
+
 function showAddProductModal() {
     document.getElementById('addProductModal').style.display = 'block';
 }
@@ -82,9 +123,11 @@ async function addProduct(event) {
     const form = event.target;
     const formData = new FormData(form);
     
+    const stock = formData.get('stock');
     const product = {
         name: formData.get('name'),
-        price: parseFloat(formData.get('price'))
+        price: parseFloat(formData.get('price')),
+        stock: stock === '' ? null : parseInt(stock)
     };
     
     try {
@@ -134,4 +177,7 @@ window.onclick = function(event) {
 }
 
 // Load products on page load
-document.addEventListener('DOMContentLoaded', loadProducts);
+document.addEventListener('DOMContentLoaded', () => {
+    loadProducts();
+    updateCartCount();
+});
@@ -25,6 +25,8 @@ CREATE TABLE dbo.Comments (
 GO
 
 CREATE INDEX IX_Comments_Post ON dbo.Comments(PostId) INCLUDE(Approved, CreatedAt);
+CREATE INDEX IX_Posts_CreatedAt ON dbo.Posts(CreatedAt DESC, Id DESC);
+CREATE INDEX IX_Comments_Pending ON dbo.Comments(CreatedAt DESC, Id DESC) WHERE Approved = 0;
 GO
 
 -- Seed
@@ -0,0 +1,36 @@
+/* Blog schema for the SQLite backend (DB_BACKEND=sqlite) */
+PRAGMA foreign_keys = ON;
+
+DROP TABLE IF EXISTS Comments;
+DROP TABLE IF EXISTS Posts;
+
+CREATE TABLE Posts (
+  Id        INTEGER PRIMARY KEY AUTOINCREMENT,
+  Title     NVARCHAR(200) NOT NULL,
+  Body      TEXT NOT NULL,
+  CreatedAt DATETIME NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE TABLE Comments (
+  Id        INTEGER PRIMARY KEY AUTOINCREMENT,
+  PostId    INT NOT NULL CONSTRAINT FK_Comments_Posts REFERENCES Posts(Id) ON DELETE CASCADE,
+  Author    NVARCHAR(100) NOT NULL,
+  Body      NVARCHAR(1000) NOT NULL,
+  CreatedAt DATETIME NOT NULL DEFAULT (datetime('now')),
+  Approved  BIT NOT NULL DEFAULT (0)
+);
+
+CREATE INDEX IX_Comments_Post ON Comments(PostId, Approved, CreatedAt);
+CREATE INDEX IX_Posts_CreatedAt ON Posts(CreatedAt DESC, Id DESC);
+CREATE INDEX IX_Comments_Pending ON Comments(CreatedAt DESC, Id DESC) WHERE Approved = 0;
+
+-- Seed
+INSERT INTO Posts(Title, Body) VALUES
+('Witaj w blogu!', 'To jest pierwszy post na naszym blogu. Możesz dodawać komentarze, które zostaną zatwierdzone przez moderatora.'),
+('Jak działa moderacja?', 'Każdy komentarz jest domyślnie niezatwierdzony. Moderator musi go zaakceptować, aby był widoczny dla innych użytkowników.');
+
+-- Add sample comments
+INSERT INTO Comments(PostId, Author, Body, Approved) VALUES
+(1, 'Jan Kowalski', 'Super blog!', 1),
+(1, 'Anna Nowak', 'Czekam na więcej postów', 0),
+(2, 'Piotr Wiśniewski', 'Świetnie wyjaśnione', 1);
@@ -1,39 +1,65 @@
 import os
+import sys
 import logging
-import pyodbc
-from fastapi import FastAPI, HTTPException, status, Request
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, status, Depends, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+
+# Shared helpers (common/) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.db import ConnectionPool, PoolTimeout
+from common.etag import TableVersions
+from common.executor import DbExecutor, Overloaded, overloaded_handler
+from common.metrics import Metrics, MetricsMiddleware
+from common.middleware import SecurityHeadersMiddleware, setup_logging
+from common.pagination import Page, page_params
+from common.responses import JSONResponse
+from common.static import StaticAssets
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Log records are written by a background thread, see common/middleware.py
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Blog API")
+# Database connection pool and the threads running queries, created once at startup
+db_pool = ConnectionPool.from_env()
+db_executor = DbExecutor.from_env(db_pool)
+
+# Request latency histograms and pool/executor gauges served by /metrics
+metrics = Metrics()
+metrics.add_collector("db_pool", db_pool.stats)
+metrics.add_collector("db_executor", db_executor.stats)
+
+# Change versions of the tables behind the cacheable GETs (ETag / 304)
+table_versions = TableVersions()
+
+# HTML pages and static files, read and compressed once at startup
+static_assets = StaticAssets("static")
 
-# Security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["Content-Security-Policy"] = "default-src 'self' 'unsafe-inline'"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    return response
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db_pool.open()
+    db_executor.start()
+    yield
+    db_executor.shutdown()
+    db_pool.close()
 
-# Logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"{request.method} {request.url.path}")
-    response = await call_next(request)
-    logger.info(f"Status: {response.status_code}")
-    return response
+app = FastAPI(title="Blog API", default_response_class=JSONResponse, lifespan=lifespan)
+
+# Security headers + access log (one pure ASGI layer)
+app.add_middleware(
+    SecurityHeadersMiddleware,
+    headers={
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "default-src 'self' 'unsafe-inline'",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+    },
+)
 
 # CORS - tylko localhost
 app.add_middleware(
@@ -44,23 +70,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shed load with 503 + Retry-After when the database queue is full
+app.add_exception_handler(Overloaded, overloaded_handler)
+
+# Timing of every request (Server-Timing header + /metrics); added last so it wraps all other middleware
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Database connection
 def get_db_connection():
-    server = os.getenv('DB_SERVER', None)
-    database = os.getenv('DB_DATABASE', None)
-    driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
-    use_windows_auth = os.getenv('DB_USE_WINDOWS_AUTH', 'True').lower() == 'true'
-    
-    if use_windows_auth:
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;TrustServerCertificate=yes;'
-    else:
-        username = os.getenv('DB_USERNAME', None)
-        password = os.getenv('DB_PASSWORD', None)
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};TrustServerCertificate=yes;'
-    
     try:
-        conn = pyodbc.connect(conn_str)
-        return conn
+        return db_pool.acquire()
+    except PoolTimeout as e:
+        logger.warning(f"Database pool exhausted: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database busy, try again later")
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -76,25 +98,39 @@ class CommentCreate(BaseModel):
 
 # HTML routes
 @app.get("/")
-async def serve_index():
-    return FileResponse("static/index.html")
+async def serve_index(request: Request):
+    return static_assets.page("index.html", request)
 
 @app.get("/post/{post_id}")
-async def serve_post():
-    return FileResponse("static/post.html")
+async def serve_post(request: Request):
+    return static_assets.page("post.html", request)
 
 @app.get("/moderate")
-async def serve_moderate():
-    return FileResponse("static/moderate.html")
+async def serve_moderate(request: Request):
+    return static_assets.page("moderate.html", request)
 
 # Posts API
 @app.get("/api/posts")
-async def get_posts():
+@db_executor.offload
+def get_posts(
+    etag: str = Depends(table_versions.etag_for("Posts")),
+    page: Page = Depends(page_params),
+):
+    after = page.after(datetime, int)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT Id, Title, Body, CreatedAt FROM dbo.Posts ORDER BY CreatedAt DESC")
-        rows = cursor.fetchall()
+        
+        # Keyset seek on IX_Posts_CreatedAt (CreatedAt, Id), newest first
+        seek = "WHERE CreatedAt < ? OR (CreatedAt = ? AND Id < ?)" if after else ""
+        params = [after[0], after[0], after[1]] if after else []
+        cursor.execute(f"""
+            SELECT Id, Title, Body, CreatedAt FROM dbo.Posts
+            {seek}
+            ORDER BY CreatedAt DESC, Id DESC
+            OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+        """, *params, page.limit + 1)
+        rows, next_cursor = page.split(cursor.fetchall(), lambda row: (row[3], row[0]))
         conn.close()
         
         posts = [{
@@ -104,13 +140,45 @@ async def get_posts():
             "created_at": row[3].isoformat() if row[3] else None
         } for row in rows]
         
-        return JSONResponse(content=posts, headers={"Cache-Control": "public, max-age=60"})
+        return JSONResponse(
+            content={"items": posts, "next_cursor": next_cursor},
+            headers={"Cache-Control": "no-cache", "ETag": etag}
+        )
     except Exception as e:
         logger.error(f"Error fetching posts: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.get("/api/posts/{post_id}")
+@db_executor.offload
+def get_post(post_id: int):
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT Id, Title, Body, CreatedAt FROM dbo.Posts WHERE Id = ?", post_id)
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            raise HTTPException(status_code=404, detail="Post not found")
+        
+        return JSONResponse(
+            content={
+                "id": row[0],
+                "title": row[1],
+                "body": row[2],
+                "created_at": row[3].isoformat() if row[3] else None
+            },
+            headers={"Cache-Control": "no-cache"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching post: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.post("/api/posts", status_code=status.HTTP_201_CREATED)
-async def create_post(post: PostCreate):
+@db_executor.offload
+def create_post(post: PostCreate):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -121,6 +189,7 @@ async def create_post(post: PostCreate):
         )
         post_id = cursor.fetchone()[0] # type: ignore
         conn.commit()
+        table_versions.bump("Posts")
         conn.close()
         
         return JSONResponse(
@@ -137,7 +206,8 @@ async def create_post(post: PostCreate):
 
 # Comments API
 @app.get("/api/posts/{post_id}/comments")
-async def get_comments(post_id: int):
+@db_executor.offload
+def get_comments(post_id: int):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -176,7 +246,8 @@ async def get_comments(post_id: int):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/posts/{post_id}/comments", status_code=status.HTTP_201_CREATED)
-async def create_comment(post_id: int, comment: CommentCreate):
+@db_executor.offload
+def create_comment(post_id: int, comment: CommentCreate):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -217,19 +288,26 @@ async def create_comment(post_id: int, comment: CommentCreate):
 
 # Moderation API
 @app.get("/api/comments/pending")
-async def get_pending_comments():
+@db_executor.offload
+def get_pending_comments(page: Page = Depends(page_params)):
+    after = page.after(datetime, int)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        # Keyset seek on IX_Comments_Pending (CreatedAt, Id) WHERE Approved = 0
+        seek = "AND (c.CreatedAt < ? OR (c.CreatedAt = ? AND c.Id < ?))" if after else ""
+        params = [after[0], after[0], after[1]] if after else []
         cursor.execute(
-            """SELECT c.Id, c.PostId, p.Title, c.Author, c.Body, c.CreatedAt 
+            f"""SELECT c.Id, c.PostId, p.Title, c.Author, c.Body, c.CreatedAt 
                FROM dbo.Comments c
                JOIN dbo.Posts p ON c.PostId = p.Id
-               WHERE c.Approved = 0 
-               ORDER BY c.CreatedAt DESC"""
+               WHERE c.Approved = 0 {seek}
+               ORDER BY c.CreatedAt DESC, c.Id DESC
+               OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY""",
+            *params, page.limit + 1
         )
-        rows = cursor.fetchall()
+        rows, next_cursor = page.split(cursor.fetchall(), lambda row: (row[5], row[0]))
         conn.close()
         
         comments = [{
@@ -241,13 +319,17 @@ async def get_pending_comments():
             "created_at": row[5].isoformat() if row[5] else None
         } for row in rows]
         
-        return JSONResponse(content=comments, headers={"Cache-Control": "no-cache"})
+        return JSONResponse(
+            content={"items": comments, "next_cursor": next_cursor},
+            headers={"Cache-Control": "no-cache"}
+        )
     except Exception as e:
         logger.error(f"Error fetching pending comments: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/comments/{comment_id}/approve")
-async def approve_comment(comment_id: int):
+@db_executor.offload
+def approve_comment(comment_id: int):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -268,8 +350,21 @@ async def approve_comment(comment_id: int):
         logger.error(f"Error approving comment: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Diagnostics
+@app.get("/api/db/pool")
+async def get_pool_stats():
+    return JSONResponse(content=db_pool.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/api/db/executor")
+async def get_executor_stats():
+    return JSONResponse(content=db_executor.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), headers={"Cache-Control": "no-store"})
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", static_assets, name="static")
 
 if __name__ == "__main__":
     import uvicorn
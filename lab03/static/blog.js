@@ -1,10 +1,17 @@
-async function loadPosts() {
+let postsData = [];
+let nextCursor = null;
+
+// Loads the first page, or the next one when called with a cursor
+async function loadPosts(cursor = null) {
     try {
-        const response = await fetch('/api/posts');
+        const url = cursor ? `/api/posts?cursor=${encodeURIComponent(cursor)}` : '/api/posts';
+        const response = await fetch(url);
         if (!response.ok) throw new Error('Nie udało się pobrać postów');
         
-        const posts = await response.json();
-        displayPosts(posts);
+        const page = await response.json();
+        postsData = cursor ? postsData.concat(page.items) : page.items;
+        nextCursor = page.next_cursor;
+        displayPosts(postsData);
     } catch (error) {
         showNotification('Błąd podczas ładowania postów: ' + error.message, 'error');
     }
@@ -27,7 +34,9 @@ function displayPosts(posts) {
                 <a href="/post/${post.id}" class="btn btn-primary btn-small">Zobacz komentarze</a>
             </div>
         </div>
-    `).join('');
+    `).join('') + (nextCursor
+        ? `<div class="load-more"><button class="btn btn-secondary" onclick="loadPosts(nextCursor)">Pokaż więcej</button></div>`
+        : '');
 }
 
 function showAddPostModal() {
@@ -101,4 +110,4 @@ window.onclick = function(event) {
     }
 }
 
-document.addEventListener('DOMContentLoaded', loadPosts);
+document.addEventListener('DOMContentLoaded', () => loadPosts());
@@ -1,10 +1,17 @@
-async function loadPendingComments() {
+let commentsData = [];
+let nextCursor = null;
+
+// Loads the first page, or the next one when called with a cursor
+async function loadPendingComments(cursor = null) {
     try {
-        const response = await fetch('/api/comments/pending');
+        const url = cursor ? `/api/comments/pending?cursor=${encodeURIComponent(cursor)}` : '/api/comments/pending';
+        const response = await fetch(url);
         if (!response.ok) throw new Error('Nie udało się pobrać komentarzy');
         
-        const comments = await response.json();
-        displayPendingComments(comments);
+        const page = await response.json();
+        commentsData = cursor ? commentsData.concat(page.items) : page.items;
+        nextCursor = page.next_cursor;
+        displayPendingComments(commentsData);
     } catch (error) {
         showNotification('Błąd podczas ładowania komentarzy: ' + error.message, 'error');
     }
@@ -30,7 +37,9 @@ function displayPendingComments(comments) {
             <p class="post-reference">Post: <em>${escapeHtml(comment.post_title)}</em></p>
             <p class="comment-body">${escapeHtml(comment.body)}</p>
         </div>
-    `).join('');
+    `).join('') + (nextCursor
+        ? `<div class="load-more"><button class="btn btn-secondary" onclick="loadPendingComments(nextCursor)">Pokaż więcej</button></div>`
+        : '');
 }
 
 async function approveComment(commentId) {
@@ -77,4 +86,4 @@ function escapeHtml(text) {
     return div.innerHTML;
 }
 
-document.addEventListener('DOMContentLoaded', loadPendingComments);
+document.addEventListener('DOMContentLoaded', () => loadPendingComments());
@@ -6,15 +6,11 @@ async function loadPost() {
     currentPostId = parseInt(postId);
     
     try {
-        const response = await fetch('/api/posts');
+        const response = await fetch(`/api/posts/${currentPostId}`);
+        if (response.status === 404) throw new Error('Post nie został znaleziony');
         if (!response.ok) throw new Error('Nie udało się pobrać posta');
         
-        const posts = await response.json();
-        const post = posts.find(p => p.id === currentPostId);
-        
-        if (!post) {
-            throw new Error('Post nie został znaleziony');
-        }
+        const post = await response.json();
         
         displayPost(post);
         loadComments();
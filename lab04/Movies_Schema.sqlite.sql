@@ -0,0 +1,47 @@
+/* Movies schema for the SQLite backend (DB_BACKEND=sqlite)
+   Ranking filmów z głosowaniem
+*/
+PRAGMA foreign_keys = ON;
+
+DROP VIEW IF EXISTS vMoviesRanking;
+DROP TABLE IF EXISTS Ratings;
+DROP TABLE IF EXISTS Movies;
+
+CREATE TABLE Movies (
+  Id     INTEGER PRIMARY KEY AUTOINCREMENT,
+  Title  NVARCHAR(200) NOT NULL,
+  [Year] INT NOT NULL
+);
+
+CREATE TABLE Ratings (
+  Id      INTEGER PRIMARY KEY AUTOINCREMENT,
+  MovieId INT NOT NULL CONSTRAINT FK_Ratings_Movies REFERENCES Movies(Id) ON DELETE CASCADE,
+  Score   INT NOT NULL CONSTRAINT CK_Ratings_Score CHECK (Score BETWEEN 1 AND 5)
+);
+
+CREATE INDEX IX_Ratings_Movie ON Ratings(MovieId, Score);
+
+-- Ranking view
+CREATE VIEW vMoviesRanking AS
+SELECT m.Id, m.Title, m.[Year],
+       ROUND(AVG(r.Score), 2) AS AvgScore,
+       COUNT(r.Id) AS Votes
+FROM Movies m
+LEFT JOIN Ratings r ON r.MovieId = m.Id
+GROUP BY m.Id, m.Title, m.[Year];
+
+-- Seed
+INSERT INTO Movies(Title, [Year]) VALUES
+('The Matrix', 1999),
+('Inception', 2010),
+('Interstellar', 2014),
+('Blade Runner 2049', 2017),
+('Arrival', 2016),
+('Tenet', 2020);
+
+INSERT INTO Ratings(MovieId, Score) VALUES
+(1, 5), (1, 4), (1, 5),
+(2, 5), (2, 4),
+(3, 5), (3, 5), (3, 4),
+(4, 4),
+(5, 4), (5, 5);
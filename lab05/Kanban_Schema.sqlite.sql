@@ -0,0 +1,35 @@
+/* Kanban schema for the SQLite backend (DB_BACKEND=sqlite)
+   Tablica Kanban z kolumnami i zadaniami
+*/
+PRAGMA foreign_keys = ON;
+
+DROP TABLE IF EXISTS Tasks;
+DROP TABLE IF EXISTS Columns;
+
+CREATE TABLE Columns (
+  Id   INTEGER PRIMARY KEY AUTOINCREMENT,
+  Name NVARCHAR(50) NOT NULL,
+  Ord  INT NOT NULL
+);
+
+CREATE TABLE Tasks (
+  Id    INTEGER PRIMARY KEY AUTOINCREMENT,
+  Title NVARCHAR(200) NOT NULL,
+  ColId INT NOT NULL CONSTRAINT FK_Tasks_Columns REFERENCES Columns(Id),
+  Ord   INT NOT NULL
+);
+
+CREATE INDEX IX_Tasks_Column ON Tasks(ColId, Ord);
+
+-- Seed: Predefiniowane kolumny
+INSERT INTO Columns(Name, Ord) VALUES
+('Todo', 1),
+('Doing', 2),
+('Done', 3);
+
+-- Seed: Przykładowe zadania
+INSERT INTO Tasks(Title, ColId, Ord) VALUES
+('Zaprojektować UI', 1, 1),
+('Napisać backend', 1, 2),
+('Stworzyć bazę danych', 2, 1),
+('Dodać testy', 1, 3);
@@ -1,39 +1,63 @@
 import os
+import sys
 import logging
-import pyodbc
-from fastapi import FastAPI, HTTPException, status, Request
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, status, Depends, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+
+# Shared helpers (common/) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.db import ConnectionPool, PoolTimeout
+from common.etag import TableVersions
+from common.executor import DbExecutor, Overloaded, overloaded_handler
+from common.metrics import Metrics, MetricsMiddleware
+from common.middleware import SecurityHeadersMiddleware, setup_logging
+from common.responses import JSONResponse
+from common.static import StaticAssets
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Log records are written by a background thread, see common/middleware.py
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Kanban Board API")
-
-# Security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["Content-Security-Policy"] = "default-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://fonts.gstatic.com"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    return response
-
-# Logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"{request.method} {request.url.path}")
-    response = await call_next(request)
-    logger.info(f"Status: {response.status_code}")
-    return response
+# Database connection pool and the threads running queries, created once at startup
+db_pool = ConnectionPool.from_env()
+db_executor = DbExecutor.from_env(db_pool)
+
+# Request latency histograms and pool/executor gauges served by /metrics
+metrics = Metrics()
+metrics.add_collector("db_pool", db_pool.stats)
+metrics.add_collector("db_executor", db_executor.stats)
+
+# Change versions of the tables behind the cacheable GETs (ETag / 304)
+table_versions = TableVersions()
+
+# HTML pages and static files, read and compressed once at startup
+static_assets = StaticAssets("static")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db_pool.open()
+    db_executor.start()
+    yield
+    db_executor.shutdown()
+    db_pool.close()
+
+app = FastAPI(title="Kanban Board API", default_response_class=JSONResponse, lifespan=lifespan)
+
+# Security headers + access log (one pure ASGI layer)
+app.add_middleware(
+    SecurityHeadersMiddleware,
+    headers={
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "default-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://fonts.gstatic.com",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+    },
+)
 
 # CORS - tylko localhost
 app.add_middleware(
@@ -44,23 +68,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shed load with 503 + Retry-After when the database queue is full
+app.add_exception_handler(Overloaded, overloaded_handler)
+
+# Timing of every request (Server-Timing header + /metrics); added last so it wraps all other middleware
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Database connection
 def get_db_connection():
-    server = os.getenv('DB_SERVER', None)
-    database = os.getenv('DB_DATABASE', None)
-    driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
-    use_windows_auth = os.getenv('DB_USE_WINDOWS_AUTH', 'True').lower() == 'true'
-    
-    if use_windows_auth:
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;TrustServerCertificate=yes;'
-    else:
-        username = os.getenv('DB_USERNAME', None)
-        password = os.getenv('DB_PASSWORD', None)
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};TrustServerCertificate=yes;'
-    
     try:
-        conn = pyodbc.connect(conn_str)
-        return conn
+        return db_pool.acquire()
+    except PoolTimeout as e:
+        logger.warning(f"Database pool exhausted: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database busy, try again later")
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -76,12 +96,13 @@ class TaskMove(BaseModel):
 
 # HTML routes
 @app.get("/")
-async def serve_index():
-    return FileResponse("static/index.html")
+async def serve_index(request: Request):
+    return static_assets.page("index.html", request)
 
 # Board API
 @app.get("/api/board")
-async def get_board():
+@db_executor.offload
+def get_board(etag: str = Depends(table_versions.etag_for("Columns", "Tasks"))):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -111,7 +132,7 @@ async def get_board():
         
         return JSONResponse(
             content={"cols": cols, "tasks": tasks},
-            headers={"Cache-Control": "no-cache"}
+            headers={"Cache-Control": "no-cache", "ETag": etag}
         )
     except Exception as e:
         logger.error(f"Error fetching board: {str(e)}")
@@ -119,7 +140,8 @@ async def get_board():
 
 # Tasks API
 @app.post("/api/tasks", status_code=status.HTTP_201_CREATED)
-async def create_task(task: TaskCreate):
+@db_executor.offload
+def create_task(task: TaskCreate):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -141,6 +163,7 @@ async def create_task(task: TaskCreate):
         )
         task_id = cursor.fetchone()[0] # type: ignore
         conn.commit()
+        table_versions.bump("Tasks")
         conn.close()
         
         return JSONResponse(
@@ -158,7 +181,8 @@ async def create_task(task: TaskCreate):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/tasks/{task_id}/move")
-async def move_task(task_id: int, move: TaskMove):
+@db_executor.offload
+def move_task(task_id: int, move: TaskMove):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -199,6 +223,7 @@ async def move_task(task_id: int, move: TaskMove):
         )
         
         conn.commit()
+        table_versions.bump("Tasks")
         conn.close()
         
         return JSONResponse(
@@ -210,8 +235,21 @@ async def move_task(task_id: int, move: TaskMove):
         logger.error(f"Error moving task: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Diagnostics
+@app.get("/api/db/pool")
+async def get_pool_stats():
+    return JSONResponse(content=db_pool.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/api/db/executor")
+async def get_executor_stats():
+    return JSONResponse(content=db_executor.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), headers={"Cache-Control": "no-store"})
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", static_assets, name="static")
 
 if __name__ == "__main__":
     import uvicorn
@@ -31,7 +31,7 @@ CREATE TABLE dbo.NoteTags (
 GO
 
 CREATE INDEX IX_Notes_Title ON dbo.Notes(Title);
-CREATE INDEX IX_Notes_CreatedAt ON dbo.Notes(CreatedAt DESC);
+CREATE INDEX IX_Notes_CreatedAt ON dbo.Notes(CreatedAt DESC, Id DESC);
 CREATE INDEX IX_Tags_Name ON dbo.Tags(Name);
 GO
 
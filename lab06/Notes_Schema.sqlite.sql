@@ -0,0 +1,55 @@
+/* Notes schema for the SQLite backend (DB_BACKEND=sqlite)
+   Notatnik z tagowaniem i wyszukiwaniem
+*/
+PRAGMA foreign_keys = ON;
+
+DROP TABLE IF EXISTS NoteTags;
+DROP TABLE IF EXISTS Notes;
+DROP TABLE IF EXISTS Tags;
+
+CREATE TABLE Notes (
+  Id        INTEGER PRIMARY KEY AUTOINCREMENT,
+  Title     NVARCHAR(200) NOT NULL,
+  Body      TEXT NOT NULL,
+  CreatedAt DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE Tags (
+  Id   INTEGER PRIMARY KEY AUTOINCREMENT,
+  Name NVARCHAR(50) NOT NULL UNIQUE
+);
+
+CREATE TABLE NoteTags (
+  NoteId INT NOT NULL CONSTRAINT FK_NoteTags_Notes REFERENCES Notes(Id) ON DELETE CASCADE,
+  TagId  INT NOT NULL CONSTRAINT FK_NoteTags_Tags REFERENCES Tags(Id),
+  CONSTRAINT PK_NoteTags PRIMARY KEY (NoteId, TagId)
+);
+
+CREATE INDEX IX_Notes_Title ON Notes(Title);
+CREATE INDEX IX_Notes_CreatedAt ON Notes(CreatedAt DESC, Id DESC);
+CREATE INDEX IX_Tags_Name ON Tags(Name);
+
+-- Seed: Przykładowe tagi
+INSERT INTO Tags(Name) VALUES
+('work'),
+('home'),
+('ideas'),
+('shopping'),
+('urgent');
+
+-- Seed: Przykładowe notatki
+INSERT INTO Notes(Title, Body, CreatedAt) VALUES
+('Spotkanie z zespołem', 'Omówić postępy w projekcie i zaplanować następne kroki. Przygotować prezentację dla klienta.', datetime('now', 'localtime', '-2 days')),
+('Lista zakupów', 'Kupić mleko, chleb, masło, jajka, ser żółty, pomidory i sałatę.', datetime('now', 'localtime', '-1 days')),
+('Pomysł na aplikację', 'Stworzyć aplikację do śledzenia nawyków. Użyć React i Firebase. Dodać powiadomienia push.', datetime('now', 'localtime', '-5 hours')),
+('Naprawa rowerem', 'Oddać rower do serwisu - trzeba naprawić hamulce i wymienić oponę tylną.', datetime('now', 'localtime'));
+
+-- Seed: Przypisania tagów
+INSERT INTO NoteTags(NoteId, TagId) VALUES
+(1, 1), -- Spotkanie = work
+(1, 5), -- Spotkanie = urgent
+(2, 2), -- Lista zakupów = home
+(2, 4), -- Lista zakupów = shopping
+(3, 1), -- Pomysł = work
+(3, 3), -- Pomysł = ideas
+(4, 2); -- Naprawa = home
@@ -1,41 +1,66 @@
 import os
+import sys
 import logging
-import pyodbc
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, status, Request, Query
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, status, Depends, Request, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+
+# Shared helpers (common/) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.db import ConnectionPool, PoolTimeout
+from common.etag import TableVersions
+from common.executor import DbExecutor, Overloaded, overloaded_handler
+from common.metrics import Metrics, MetricsMiddleware
+from common.middleware import SecurityHeadersMiddleware, setup_logging
+from common.pagination import Page, page_params
+from common.responses import JSONResponse
+from common.static import StaticAssets
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Log records are written by a background thread, see common/middleware.py
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Notes API")
+# Database connection pool and the threads running queries, created once at startup
+db_pool = ConnectionPool.from_env()
+db_executor = DbExecutor.from_env(db_pool)
+
+# Request latency histograms and pool/executor gauges served by /metrics
+metrics = Metrics()
+metrics.add_collector("db_pool", db_pool.stats)
+metrics.add_collector("db_executor", db_executor.stats)
+
+# Change versions of the tables behind the cacheable GETs (ETag / 304)
+table_versions = TableVersions()
+
+# HTML pages and static files, read and compressed once at startup
+static_assets = StaticAssets("static")
 
-# Security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["Content-Security-Policy"] = "default-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://fonts.gstatic.com"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    return response
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db_pool.open()
+    db_executor.start()
+    yield
+    db_executor.shutdown()
+    db_pool.close()
 
-# Logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"{request.method} {request.url.path}")
-    response = await call_next(request)
-    logger.info(f"Status: {response.status_code}")
-    return response
+app = FastAPI(title="Notes API", default_response_class=JSONResponse, lifespan=lifespan)
+
+# Security headers + access log (one pure ASGI layer)
+app.add_middleware(
+    SecurityHeadersMiddleware,
+    headers={
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "default-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://fonts.gstatic.com",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+    },
+)
 
 # CORS - tylko localhost
 app.add_middleware(
@@ -46,23 +71,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shed load with 503 + Retry-After when the database queue is full
+app.add_exception_handler(Overloaded, overloaded_handler)
+
+# Timing of every request (Server-Timing header + /metrics); added last so it wraps all other middleware
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Database connection
 def get_db_connection():
-    server = os.getenv('DB_SERVER', None)
-    database = os.getenv('DB_DATABASE', None)
-    driver = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
-    use_windows_auth = os.getenv('DB_USE_WINDOWS_AUTH', 'True').lower() == 'true'
-    
-    if use_windows_auth:
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;TrustServerCertificate=yes;'
-    else:
-        username = os.getenv('DB_USERNAME', None)
-        password = os.getenv('DB_PASSWORD', None)
-        conn_str = f'DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};TrustServerCertificate=yes;'
-    
     try:
-        conn = pyodbc.connect(conn_str)
-        return conn
+        return db_pool.acquire()
+    except PoolTimeout as e:
+        logger.warning(f"Database pool exhausted: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database busy, try again later")
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -77,59 +98,66 @@ class NoteTagsAssign(BaseModel):
 
 # HTML routes
 @app.get("/")
-async def serve_index():
-    return FileResponse("static/index.html")
+async def serve_index(request: Request):
+    return static_assets.page("index.html", request)
 
 # Notes API
 @app.get("/api/notes")
-async def get_notes(q: Optional[str] = Query(None)):
+@db_executor.offload
+def get_notes(q: Optional[str] = Query(None), page: Page = Depends(page_params)):
+    after = page.after(datetime, int)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        conditions = []
+        params = []
         if q and q.strip():
             search_term = f"%{q}%"
-            cursor.execute("""
-                SELECT Id, Title, Body, CreatedAt 
-                FROM dbo.Notes 
-                WHERE Title LIKE ? OR Body LIKE ?
-                ORDER BY CreatedAt DESC
-            """, search_term, search_term)
-        else:
-            cursor.execute("""
-                SELECT Id, Title, Body, CreatedAt 
-                FROM dbo.Notes 
-                ORDER BY CreatedAt DESC
-            """)
+            conditions.append("(Title LIKE ? OR Body LIKE ?)")
+            params += [search_term, search_term]
+        if after:
+            # Keyset seek on IX_Notes_CreatedAt (CreatedAt, Id), newest first
+            conditions.append("(CreatedAt < ? OR (CreatedAt = ? AND Id < ?))")
+            params += [after[0], after[0], after[1]]
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
         
-        notes_rows = cursor.fetchall()
+        # One page of notes with their tags (one row per note/tag pair)
+        cursor.execute(f"""
+            SELECT n.Id, n.Title, n.Body, n.CreatedAt, t.Name
+            FROM (
+                SELECT Id, Title, Body, CreatedAt
+                FROM dbo.Notes
+                {where}
+                ORDER BY CreatedAt DESC, Id DESC
+                OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+            ) n
+            LEFT JOIN dbo.NoteTags nt ON nt.NoteId = n.Id
+            LEFT JOIN dbo.Tags t ON t.Id = nt.TagId
+            ORDER BY n.CreatedAt DESC, n.Id DESC
+        """, *params, page.limit + 1)
         
-        notes = []
-        for row in notes_rows:
-            note_id = row[0]
-            
-            # Get tags for this note
-            cursor.execute("""
-                SELECT t.Name 
-                FROM dbo.Tags t
-                JOIN dbo.NoteTags nt ON t.Id = nt.TagId
-                WHERE nt.NoteId = ?
-            """, note_id)
-            
-            tags = [tag_row[0] for tag_row in cursor.fetchall()]
-            
-            notes.append({
-                "id": note_id,
-                "title": row[1],
-                "body": row[2],
-                "created_at": row[3].isoformat() if row[3] else None,
-                "tags": tags
-            })
+        notes_by_id = {}
+        created = {}
+        for row in cursor.fetchall():
+            note = notes_by_id.get(row[0])
+            if note is None:
+                note = notes_by_id[row[0]] = {
+                    "id": row[0],
+                    "title": row[1],
+                    "body": row[2],
+                    "created_at": row[3].isoformat() if row[3] else None,
+                    "tags": []
+                }
+                created[row[0]] = row[3]
+            if row[4] is not None:
+                note["tags"].append(row[4])
+        notes, next_cursor = page.split(list(notes_by_id.values()), lambda note: (created[note["id"]], note["id"]))
         
         conn.close()
         
         return JSONResponse(
-            content={"notes": notes},
+            content={"notes": notes, "next_cursor": next_cursor},
             headers={"Cache-Control": "no-cache"}
         )
     except Exception as e:
@@ -137,7 +165,8 @@ async def get_notes(q: Optional[str] = Query(None)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/notes", status_code=status.HTTP_201_CREATED)
-async def create_note(note: NoteCreate):
+@db_executor.offload
+def create_note(note: NoteCreate):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -173,7 +202,8 @@ async def create_note(note: NoteCreate):
 
 # Tags API
 @app.get("/api/tags")
-async def get_tags():
+@db_executor.offload
+def get_tags(etag: str = Depends(table_versions.etag_for("Tags"))):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -187,14 +217,15 @@ async def get_tags():
         
         return JSONResponse(
             content={"tags": tags},
-            headers={"Cache-Control": "no-cache"}
+            headers={"Cache-Control": "no-cache", "ETag": etag}
         )
     except Exception as e:
         logger.error(f"Error fetching tags: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/api/notes/{note_id}/tags")
-async def assign_tags(note_id: int, assignment: NoteTagsAssign):
+@db_executor.offload
+def assign_tags(note_id: int, assignment: NoteTagsAssign):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -236,6 +267,7 @@ async def assign_tags(note_id: int, assignment: NoteTagsAssign):
                 assigned_tags.append(tag_name)
         
         conn.commit()
+        table_versions.bump("Tags")
         conn.close()
         
         return JSONResponse(
@@ -250,8 +282,21 @@ async def assign_tags(note_id: int, assignment: NoteTagsAssign):
         logger.error(f"Error assigning tags: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Diagnostics
+@app.get("/api/db/pool")
+async def get_pool_stats():
+    return JSONResponse(content=db_pool.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/api/db/executor")
+async def get_executor_stats():
+    return JSONResponse(content=db_executor.stats(), headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), headers={"Cache-Control": "no-store"})
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", static_assets, name="static")
 
 if __name__ == "__main__":
     import uvicorn
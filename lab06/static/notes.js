@@ -1,14 +1,26 @@
 let notesData = [];
 let searchTimeout = null;
+let currentQuery = '';
+let nextCursor = null;
 
 async function loadNotes(query = '') {
+    currentQuery = query;
+    await fetchNotes(null);
+}
+
+// Loads the first page for currentQuery, or the next one when called with a cursor
+async function fetchNotes(cursor) {
     try {
-        const url = query ? `/api/notes?q=${encodeURIComponent(query)}` : '/api/notes';
+        const params = new URLSearchParams();
+        if (currentQuery) params.set('q', currentQuery);
+        if (cursor) params.set('cursor', cursor);
+        const url = params.toString() ? `/api/notes?${params}` : '/api/notes';
         const response = await fetch(url);
         if (!response.ok) throw new Error('Nie udało się pobrać notatek');
         
         const data = await response.json();
-        notesData = data.notes;
+        notesData = cursor ? notesData.concat(data.notes) : data.notes;
+        nextCursor = data.next_cursor;
         displayNotes();
     } catch (error) {
         showNotification('Błąd podczas ładowania notatek: ' + error.message, 'error');
@@ -46,7 +58,9 @@ function displayNotes() {
                 </div>
             </div>
         `;
-    }).join('');
+    }).join('') + (nextCursor
+        ? `<div class="load-more"><button class="btn btn-secondary" onclick="fetchNotes(nextCursor)">Pokaż więcej</button></div>`
+        : '');
 }
 
 function searchNotes() {
@@ -173,4 +187,4 @@ window.onclick = function(event) {
     }
 }
 
-document.addEventListener('DOMContentLoaded', loadNotes);
+document.addEventListener('DOMContentLoaded', () => loadNotes());